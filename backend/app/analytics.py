@@ -1,26 +1,130 @@
 from fastapi import APIRouter, Depends, HTTPException
-from .db import get_db
+from typing import Optional
+from datetime import date, datetime, timedelta
+from .cache import TTLCache
+from .core.config import settings
+from .db import get_analytics_db, get_db
+from . import attendance_days, stats
 
 router = APIRouter(tags=["Analytics"])
 
+SUMMARY_MODES = ("counters", "estimated", "exact")
+DEFAULT_RANGE_DAYS = 30
+
+
+# ------------------------------------------------
+# Date-range breakdown cache, keyed by (start, end).
+# Writes invalidate every cached range covering the written day.
+# ------------------------------------------------
+range_cache = TTLCache(
+    maxsize=settings.ANALYTICS_CACHE_SIZE,
+    ttl=settings.ANALYTICS_CACHE_TTL_SECONDS,
+)
+
+
+def invalidate_days(days):
+    """Drop cached breakdowns whose range includes any of `days`."""
+    days = set(days)
+    for start, end in range_cache.keys():
+        if any(start <= day <= end for day in days):
+            range_cache.invalidate((start, end))
+
+
+def _breakdown_pipeline(start: date, end: date):
+    start_dt = datetime(start.year, start.month, start.day)
+    end_dt = datetime(end.year, end.month, end.day) + timedelta(days=1)
+    if attendance_days.enabled():
+        records = attendance_days.flat_pipeline({"date": {"$gte": start_dt, "$lt": end_dt}})
+    else:
+        records = [{"$match": {"timestamp": {"$gte": start_dt, "$lt": end_dt}}}]
+    return records + [
+        {"$facet": {
+            "per_day": [
+                {"$group": {
+                    "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+                    "count": {"$sum": 1},
+                    "students": {"$addToSet": "$student_id"},
+                }},
+                {"$project": {"_id": 0, "date": "$_id", "count": 1, "unique_students": {"$size": "$students"}}},
+                {"$sort": {"date": 1}},
+            ],
+            "per_status": [
+                {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+                {"$project": {"_id": 0, "status": "$_id", "count": 1}},
+                {"$sort": {"count": -1}},
+            ],
+            # Attendance has no class_name: collapse to one row per student
+            # first, so the students lookup runs once per student, not per mark
+            "per_class": [
+                {"$group": {"_id": "$student_id", "count": {"$sum": 1}}},
+                {"$lookup": {"from": "students", "localField": "_id", "foreignField": "_id", "as": "student"}},
+                {"$group": {
+                    "_id": {"$ifNull": [{"$arrayElemAt": ["$student.class_name", 0]}, "Unknown"]},
+                    "count": {"$sum": "$count"},
+                    "students": {"$sum": 1},
+                }},
+                {"$project": {"_id": 0, "class_name": "$_id", "count": 1, "students": 1}},
+                {"$sort": {"class_name": 1}},
+            ],
+        }},
+    ]
+
+
+async def attendance_breakdown(db, start: Optional[date], end: Optional[date]):
+    """Per-day, per-class and per-status counts for [start, end], memoized."""
+    end = end or date.today()
+    start = start or end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+
+    key = (start, end)
+    cached = range_cache.get(key)
+    if cached is not None:
+        return cached
+
+    result = {"per_day": [], "per_status": [], "per_class": []}
+    collection = attendance_days.DAYS if attendance_days.enabled() else "attendance"
+    async for facets in db[collection].aggregate(_breakdown_pipeline(start, end)):
+        result.update(facets)
+
+    result = {"start": start.isoformat(), "end": end.isoformat(), **result}
+    range_cache.set(key, result)
+    return result
+
 
 @router.get("/summary")
-async def analytics_summary(db=Depends(get_db)):
+async def analytics_summary(mode: str = "counters", db=Depends(get_db)):
     """
     Return total students and total attendance records.
+
+    mode=counters (default) reads the maintained counters in `stats`,
+    mode=estimated uses collection metadata (with ATTENDANCE_LAYOUT=daily,
+    the event counter plus an attendance_days count), mode=exact counts documents.
     """
     try:
         if db is None:
             raise HTTPException(status_code=500, detail="Database connection failed")
-        
+
+        if mode not in SUMMARY_MODES:
+            raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(SUMMARY_MODES)}")
+
+        if mode == "counters":
+            return await stats.read_counters(db)
+
+        if mode == "estimated":
+            return await stats.estimated_counts(db)
+
         students_collection = db["students"]
         attendance_collection = db["attendance"]
-        
+
         # Count students
         student_count = await students_collection.count_documents({})
-        
+
         # Count attendance
-        attendance_count = await attendance_collection.count_documents({})
+        if attendance_days.enabled():
+            attendance_count = await attendance_days.count_events(db)
+        else:
+            attendance_count = await attendance_collection.count_documents({})
 
         return {
             "students": student_count,
@@ -31,3 +135,51 @@ async def analytics_summary(db=Depends(get_db)):
     except Exception as e:
         print(f"Error getting analytics summary: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error getting analytics: {str(e)}")
+
+
+@router.post("/reconcile")
+async def reconcile_counters(db=Depends(get_db)):
+    """
+    Admin: recompute the summary counters from scratch.
+    """
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    counters = await stats.reconcile(db)
+    counters.pop("reconciled_at", None)
+    return {"detail": "Counters reconciled", "counters": counters}
+
+
+@router.get("/attendance")
+async def attendance_range(start: Optional[date] = None, end: Optional[date] = None, db=Depends(get_analytics_db)):
+    """
+    Attendance per day, per class and per status between `start` and `end`
+    (inclusive, default: the last 30 days), from one aggregation.
+    """
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    return await attendance_breakdown(db, start, end)
+
+
+@router.get("/attendance/daily")
+async def attendance_per_day(start: Optional[date] = None, end: Optional[date] = None, db=Depends(get_analytics_db)):
+    """Attendance counts per day over a date range."""
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    return (await attendance_breakdown(db, start, end))["per_day"]
+
+
+@router.get("/attendance/by-class")
+async def attendance_per_class(start: Optional[date] = None, end: Optional[date] = None, db=Depends(get_analytics_db)):
+    """Attendance counts per class over a date range."""
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    return (await attendance_breakdown(db, start, end))["per_class"]
+
+
+@router.get("/attendance/by-status")
+async def attendance_per_status(start: Optional[date] = None, end: Optional[date] = None, db=Depends(get_analytics_db)):
+    """Attendance counts per status over a date range."""
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    return (await attendance_breakdown(db, start, end))["per_status"]
@@ -0,0 +1,350 @@
+"""
+Hot/cold tiering for attendance.
+
+Marks older than ARCHIVE_AFTER_DAYS move out of MongoDB into gzip-compressed
+NDJSON segment files on local disk, partitioned by day of the mark:
+
+    ARCHIVE_PATH/manifest.json                 segment list (day, file, counts)
+    ARCHIVE_PATH/2025/2025-03-14.1.ndjson.gz   immutable once written
+
+`archive_attendance` handles one day at a time:
+
+ 1. read the day's hot marks (either ATTENDANCE_LAYOUT);
+ 2. drop the ones an earlier segment of that day already holds, and write
+    the rest to a new segment (temp file + rename) and the manifest;
+ 3. delete every read mark from MongoDB in ARCHIVE_BATCH_SIZE batches.
+
+Deletes are by exact _id, and step 2 deduplicates against the day's
+segments, so a run interrupted at any point is finished by the next one
+without losing or duplicating a mark. Marks that arrive later for an
+archived day go to another segment of that day on the next run.
+
+Readers (`cold_records`) go through the manifest, reloaded whenever the
+file changes, so every worker sees new segments. Each manifest entry lists
+the segment's student ids, so one student's history opens only the
+segments that student appears in. /attendance/student/{id}
+and /attendance/export read both tiers; analytics ranges and the summary
+counters cover MongoDB only.
+
+    python -m app.archive                 # archive marks older than ARCHIVE_AFTER_DAYS
+    python -m app.archive --days 365 --dry-run
+
+POST /api/attendance/archive does the same ARCHIVE_DAYS_PER_REQUEST days
+at a time, so a large backlog never outlives the request; call it again
+until it answers "done": true.
+"""
+import argparse
+import asyncio
+import gzip
+import os
+import sys
+import uuid
+from datetime import date, datetime, timedelta
+
+import orjson
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from . import analytics, attendance_days, stats
+from . import db as dbmod
+from .core.config import settings
+
+MANIFEST = "manifest.json"
+LOCK_ID = "archive"
+LOCK_SECONDS = 600
+
+
+# --- segments ---------------------------------------------------------------
+
+def _encode(record: dict) -> bytes:
+    return orjson.dumps({
+        "id": str(record["_id"]),
+        "student_id": str(record["student_id"]),
+        "student_name": record.get("student_name"),
+        "roll": record.get("roll"),
+        "timestamp": record["timestamp"],
+        "status": record.get("status"),
+        "confidence": record.get("confidence"),
+    })
+
+
+def _decode(line: bytes) -> dict:
+    row = orjson.loads(line)
+    row["_id"] = ObjectId(row.pop("id"))
+    row["student_id"] = ObjectId(row["student_id"])
+    row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+    return row
+
+
+def _write_segment(path: str, records) -> int:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with gzip.open(tmp, "wb") as f:
+        for record in records:
+            f.write(_encode(record) + b"\n")
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+
+def _read_segment(path: str, student_ids=None):
+    """Records of one segment, optionally only those of `student_ids` (hex strings)."""
+    records = []
+    with gzip.open(path, "rb") as f:
+        for line in f:
+            if student_ids is not None and orjson.loads(line)["student_id"] not in student_ids:
+                continue
+            records.append(_decode(line))
+    return records
+
+
+class Manifest:
+    def __init__(self, root: str):
+        self.root = root
+        self.path = os.path.join(root, MANIFEST)
+        self._mtime = None
+        self._segments = []
+        self._by_student = {}
+        self._unindexed = []
+
+    def segments(self):
+        """Segments sorted by day, reloaded when another process changed the file."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            self._mtime = None
+            self._load([])
+            return self._segments
+        if mtime != self._mtime:
+            with open(self.path, "rb") as f:
+                self._load(orjson.loads(f.read())["segments"])
+            self._mtime = mtime
+        return self._segments
+
+    def _load(self, segments):
+        """Keep `segments` and index them by student for `for_students`."""
+        self._segments = segments
+        self._by_student, self._unindexed = {}, []
+        for segment in segments:
+            if "students" not in segment:
+                # Written before segments listed their students: may hold anyone
+                self._unindexed.append(segment)
+                continue
+            for student_id in segment["students"]:
+                self._by_student.setdefault(student_id, []).append(segment)
+
+    def add(self, segment: dict):
+        segments = sorted(self.segments() + [segment], key=lambda s: (s["day"], s["file"]))
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(orjson.dumps({"segments": segments}, option=orjson.OPT_INDENT_2))
+        os.replace(tmp, self.path)
+        self._load(segments)
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    def for_day(self, day: str):
+        return [segment for segment in self.segments() if segment["day"] == day]
+
+    def for_students(self, student_ids):
+        """Segments that can hold marks of `student_ids` (hex strings), sorted by day."""
+        self.segments()
+        found = {id(segment): segment for segment in self._unindexed}
+        for student_id in student_ids:
+            found.update((id(segment), segment) for segment in self._by_student.get(student_id, []))
+        return sorted(found.values(), key=lambda s: (s["day"], s["file"]))
+
+    def stats(self):
+        segments = self.segments()
+        return {
+            "segments": len(segments),
+            "records": sum(segment["records"] for segment in segments),
+            "bytes": sum(segment["bytes"] for segment in segments),
+            "oldest_day": segments[0]["day"] if segments else None,
+            "newest_day": segments[-1]["day"] if segments else None,
+        }
+
+
+manifest = Manifest(settings.ARCHIVE_PATH)
+
+
+async def cold_records(start: datetime = None, end: datetime = None, student_ids=None):
+    """
+    Yield archived marks in [start, end), day by day in timestamp order,
+    optionally only for `student_ids`. Segments are read in a thread.
+    """
+    first = start.date().isoformat() if start else None
+    last = end.date().isoformat() if end else None
+    wanted = {str(student_id) for student_id in student_ids} if student_ids is not None else None
+    segments = manifest.for_students(wanted) if wanted is not None else list(manifest.segments())
+    for segment in segments:
+        if (first and segment["day"] < first) or (last and segment["day"] >= last):
+            continue
+        path = os.path.join(manifest.root, segment["file"])
+        records = await asyncio.to_thread(_read_segment, path, wanted)
+        records.sort(key=lambda record: (record["timestamp"], record["_id"]))
+        for record in records:
+            if (start and record["timestamp"] < start) or (end and record["timestamp"] >= end):
+                continue
+            yield record
+
+
+# --- archiving ----------------------------------------------------------------
+
+async def _next_day(db, before: datetime, after: datetime = None):
+    """The oldest day with hot marks in [after, before), or None."""
+    bounds = {"$lt": before, **({"$gte": after} if after else {})}
+    if attendance_days.enabled():
+        doc = await db[attendance_days.DAYS].find_one({"date": bounds}, {"date": 1}, sort=[("date", 1)])
+        return doc["date"] if doc else None
+    doc = await db["attendance"].find_one({"timestamp": bounds}, {"timestamp": 1}, sort=[("timestamp", 1)])
+    return attendance_days.day_of(doc["timestamp"]) if doc else None
+
+
+async def _hot_records(db, day: datetime):
+    """(flat records, per-day-document event ids) of one day's hot marks."""
+    if attendance_days.enabled():
+        records, events_by_doc = [], {}
+        async for day_doc in db[attendance_days.DAYS].find({"date": day}):
+            events_by_doc[day_doc["_id"]] = [event["_id"] for event in day_doc.get("events", [])]
+            records += [attendance_days.flatten(day_doc, event) for event in day_doc.get("events", [])]
+        return records, events_by_doc
+    cursor = db["attendance"].find({"timestamp": {"$gte": day, "$lt": day + timedelta(days=1)}})
+    return [record async for record in cursor], None
+
+
+async def _delete_hot(db, records, events_by_doc):
+    """Delete archived marks by exact _id, ARCHIVE_BATCH_SIZE documents at a time."""
+    batch = settings.ARCHIVE_BATCH_SIZE
+    if events_by_doc is None:
+        ids = [record["_id"] for record in records]
+        for i in range(0, len(ids), batch):
+            await db["attendance"].delete_many({"_id": {"$in": ids[i:i + batch]}})
+        return
+
+    # Day documents: pull exactly the archived events (a mark pushed since the
+    # read survives), then drop documents left empty
+    doc_ids = list(events_by_doc)
+    for i in range(0, len(doc_ids), batch):
+        chunk = doc_ids[i:i + batch]
+        await db[attendance_days.DAYS].bulk_write([
+            UpdateOne({"_id": doc_id}, [
+                {"$set": {"events": {"$filter": {
+                    "input": "$events",
+                    "cond": {"$not": [{"$in": ["$$this._id", events_by_doc[doc_id]]}]},
+                }}}},
+                {"$set": {"count": {"$size": "$events"}}},
+            ])
+            for doc_id in chunk
+        ], ordered=False)
+        await db[attendance_days.DAYS].delete_many({"_id": {"$in": chunk}, "count": 0})
+
+
+async def _archive_day(db, day: datetime) -> int:
+    records, events_by_doc = await _hot_records(db, day)
+    if not records:
+        if events_by_doc:
+            # Day documents already emptied by a run that stopped before deleting them
+            await db[attendance_days.DAYS].delete_many({"date": day, "count": 0})
+        return 0
+
+    day_key = day.date().isoformat()
+    existing = manifest.for_day(day_key)
+    archived = set()
+    for segment in existing:
+        path = os.path.join(manifest.root, segment["file"])
+        archived.update(record["_id"] for record in await asyncio.to_thread(_read_segment, path))
+    new = sorted((record for record in records if record["_id"] not in archived), key=lambda r: r["_id"])
+
+    if new:
+        name = f"{day.year}/{day_key}.{len(existing) + 1}.ndjson.gz"
+        size = await asyncio.to_thread(_write_segment, os.path.join(manifest.root, name), new)
+        await asyncio.to_thread(manifest.add, {
+            "day": day_key,
+            "file": name,
+            "records": len(new),
+            "bytes": size,
+            # Lets one student's history skip every segment they are not in
+            "students": sorted({str(record["student_id"]) for record in new}),
+            "created_at": datetime.utcnow().isoformat(),
+        })
+
+    await _delete_hot(db, records, events_by_doc)
+    await stats.increment(db, "attendance_records", -len(records))
+    return len(new)
+
+
+async def _lock(db, owner: str) -> bool:
+    now = datetime.utcnow()
+    try:
+        await db["locks"].update_one(
+            {"_id": LOCK_ID, "$or": [{"lease_until": {"$lt": now}}, {"owner": owner}]},
+            {"$set": {"owner": owner, "lease_until": now + timedelta(seconds=LOCK_SECONDS)}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def archive_attendance(db, older_than_days: int = None, dry_run: bool = False, max_days: int = None):
+    """
+    Move marks from days older than `older_than_days` (default
+    ARCHIVE_AFTER_DAYS) to the cold tier, at most `max_days` days per call.
+    Only one run at a time, across processes.
+    Returns {"days", "records", "cutoff", "done"}; "done" is False while
+    older days remain.
+    """
+    older_than_days = settings.ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    today = date.today()
+    cutoff = datetime(today.year, today.month, today.day) - timedelta(days=older_than_days)
+    result = {"days": 0, "records": 0, "cutoff": cutoff.date().isoformat()}
+
+    owner = uuid.uuid4().hex
+    if not await _lock(db, owner):
+        raise RuntimeError("Another archive run is in progress")
+    try:
+        day = await _next_day(db, cutoff)
+        while day is not None and (max_days is None or result["days"] < max_days):
+            if dry_run:
+                records, _ = await _hot_records(db, day)
+                archived = len(records)
+            else:
+                archived = await _archive_day(db, day)
+                analytics.invalidate_days({day.date()})
+                await _lock(db, owner)  # extend the lease
+            print(f"[ARCHIVE] {day.date()}: {archived} records{' (dry run)' if dry_run else ''}")
+            result["days"] += 1
+            result["records"] += archived
+            # Always step past the day, so one that yields nothing can't repeat
+            day = await _next_day(db, cutoff, day + timedelta(days=1))
+    finally:
+        await db["locks"].delete_one({"_id": LOCK_ID, "owner": owner})
+    result["done"] = day is None
+    return result
+
+
+# --- command line ---------------------------------------------------------------
+
+async def run(args) -> int:
+    await dbmod.connect_to_mongo()
+    try:
+        result = await archive_attendance(dbmod.db, args.days, args.dry_run)
+    except RuntimeError as e:
+        print(f"[ARCHIVE] {e}")
+        return 1
+    finally:
+        await dbmod.close_mongo_connection()
+    print(f"[ARCHIVE] {result['records']} records from {result['days']} days before {result['cutoff']}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, help="archive days older than this (default ARCHIVE_AFTER_DAYS)")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be archived")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
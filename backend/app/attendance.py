@@ -1,11 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from typing import List, Optional, Union
 from datetime import datetime, date, timedelta
+import asyncio
+import contextlib
+import csv
+import io
+import json
+import time
 from bson import ObjectId
-from . import schemas
-from .db import get_db
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from . import analytics, archive, attendance_days, schemas, stats
+from .core.config import settings
+from .db import get_analytics_db, get_db
+from .debounce import debouncer, serialize_record
+from .dependencies import authenticate
+from .face_index import face_index
+from .feed import FeedEvicted, feed
+from .frames import FrameQueueFull, frame_pipeline
+from .serialization import ATTENDANCE_PROJECTION, collect, to_jsonable
+from .pagination import cursor_limit, decode_cursor, descending_after, encode_cursor, legacy_limit
+from .students import get_student_by_roll, get_students_by_rolls
+from .writer import attendance_writer
 
 router = APIRouter(tags=["Attendance"])
+# Live feed routes authenticate themselves: EventSource and WebSocket clients
+# can't send an Authorization header, so they may pass ?token= instead
+stream_router = APIRouter(tags=["Attendance"])
+
+
+async def _after_attendance_written(db, docs):
+    """Bookkeeping for newly accepted attendance marks."""
+    if not docs:
+        return
+    await stats.increment(db, "attendance_records", len(docs))
+    analytics.invalidate_days({doc["timestamp"].date() for doc in docs})
+    feed.publish_written(docs)
+
+
+def _rejected_as_duplicate(code) -> bool:
+    """A write error meaning "already marked": the dedup_key index, or the day document."""
+    if attendance_days.enabled():
+        return code == attendance_days.DUPLICATE_KEY_ERROR
+    return debouncer.is_duplicate_error(code)
 
 
 @router.post("/mark", response_model=dict)
@@ -13,9 +50,8 @@ async def mark_attendance(att: schemas.AttendanceIn, db=Depends(get_db)):
     """
     Mark attendance by roll number.
     """
-    # Fetch student by roll number
-    students_collection = db["students"]
-    student = await students_collection.find_one({"roll": att.roll})
+    # Fetch student by roll number (cached, see students.get_student_by_roll)
+    student = await get_student_by_roll(db, att.roll)
 
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
@@ -26,25 +62,6 @@ async def mark_attendance(att: schemas.AttendanceIn, db=Depends(get_db)):
     # 🕒 1. Determine Timestamp
     # ------------------------------------------------
     event_time = att.timestamp if att.timestamp else datetime.utcnow()
-    
-    # ------------------------------------------------
-    # 🚫 2. Duplicate Check (Debounce: 60 seconds)
-    # Check if this student was marked in the last 60 seconds
-    # ------------------------------------------------
-    time_threshold = event_time - timedelta(seconds=60)
-    
-    existing_recent = await attendance_collection.find_one({
-        "student_id": student["_id"],
-        "timestamp": { "$gt": time_threshold }
-    })
-    
-    if existing_recent:
-        # Already marked recently - Skip insertion
-        # Return the existing record to satisfy the caller without error
-        existing_recent["id"] = str(existing_recent["_id"])
-        existing_recent["student_id"] = str(existing_recent["student_id"])
-        existing_recent.pop("_id", None)
-        return existing_recent
 
     new_attendance = {
         "student_id": student["_id"],
@@ -54,40 +71,385 @@ async def mark_attendance(att: schemas.AttendanceIn, db=Depends(get_db)):
         "status": att.status or "Present",
         "confidence": att.confidence,
     }
-
-    result = await attendance_collection.insert_one(new_attendance)
-    new_attendance["id"] = str(result.inserted_id)
-    new_attendance["student_id"] = str(new_attendance["student_id"])
     
-    return new_attendance
+    # ------------------------------------------------
+    # 🚫 2. Duplicate Check (Debounce: DEBOUNCE_SECONDS)
+    # Memory mode answers without a query; bucket mode lets the
+    # unique dedup_key index reject the insert instead.
+    # ------------------------------------------------
+    existing_recent = debouncer.prepare(new_attendance)
+    if existing_recent:
+        # Already marked recently - Skip insertion
+        # Return the existing record to satisfy the caller without error
+        return existing_recent
+
+    try:
+        if attendance_days.enabled():
+            # One upsert into the student's day document, which also debounces
+            new_attendance["_id"] = ObjectId()
+            await attendance_days.push_event(db, new_attendance)
+        elif settings.WRITE_BUFFER_ENABLED:
+            # Group commit: resolves once the batch holding this mark is written
+            await attendance_writer.insert(db, new_attendance)
+        else:
+            await attendance_collection.insert_one(new_attendance)
+    except DuplicateKeyError as e:
+        if not _rejected_as_duplicate(e.code):
+            debouncer.release(new_attendance)
+            raise
+        if attendance_days.enabled():
+            debouncer.release(new_attendance)
+            existing_recent = await attendance_days.last_event(db, new_attendance)
+            existing_recent = existing_recent and serialize_record(existing_recent)
+        else:
+            existing_recent = await debouncer.find_existing(attendance_collection, new_attendance)
+        return existing_recent or serialize_record(new_attendance)
+    except Exception:
+        debouncer.release(new_attendance)
+        raise
+
+    debouncer.accepted(new_attendance)
+    await _after_attendance_written(db, [new_attendance])
+    return serialize_record(new_attendance)
+
+
+@router.post("/mark/batch", response_model=dict)
+async def mark_attendance_batch(events: List[schemas.AttendanceIn], db=Depends(get_db)):
+    """
+    Mark attendance for a burst of recognition events in one request.
+
+    Uses at most one query for all rolls and a single unordered insert_many,
+    instead of three round trips per event.
+    Each event gets its own result: "inserted", "debounced" or "unknown_roll".
+    """
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    return await mark_events(db, events)
+
+
+async def mark_events(db, events: List[schemas.AttendanceIn]):
+    """Batch write path shared by /mark/batch, /recognize and frame ingestion."""
+    if not events:
+        return {"inserted": 0, "debounced": 0, "unknown_roll": 0, "results": []}
+
+    attendance_collection = db["attendance"]
+
+    # ------------------------------------------------
+    # 1. Resolve every roll, cache misses in a single $in query
+    # ------------------------------------------------
+    students_by_roll = await get_students_by_rolls(db, [att.roll for att in events])
+
+    now = datetime.utcnow()
+
+    # ------------------------------------------------
+    # 2. Debounce each event, in order, so that repeats inside
+    # the same batch are debounced against each other too
+    # ------------------------------------------------
+    results = []
+    to_insert = []
+    for index, att in enumerate(events):
+        student = students_by_roll.get(att.roll)
+        if not student:
+            results.append({"index": index, "roll": att.roll, "result": "unknown_roll"})
+            continue
+
+        doc = {
+            "student_id": student["_id"],
+            "student_name": student["name"],
+            "roll": att.roll,
+            "timestamp": att.timestamp if att.timestamp else now,
+            "status": att.status or "Present",
+            "confidence": att.confidence,
+        }
+        if debouncer.prepare(doc):
+            results.append({"index": index, "roll": att.roll, "result": "debounced"})
+            continue
+
+        to_insert.append(doc)
+        results.append({"index": index, "roll": att.roll, "result": "inserted"})
+
+    # ------------------------------------------------
+    # 3. Write the survivors in one unordered round trip
+    # ------------------------------------------------
+    if to_insert:
+        failed = {}
+        try:
+            if attendance_days.enabled():
+                for doc in to_insert:
+                    doc["_id"] = ObjectId()
+                failed = await attendance_days.push_events(db, to_insert)
+            else:
+                await attendance_collection.insert_many(to_insert, ordered=False)
+        except BulkWriteError as e:
+            failed = {err["index"]: err.get("code") for err in e.details.get("writeErrors", [])}
+        except Exception:
+            # Nothing is known to be written: free every slot so a retry isn't debounced
+            for doc in to_insert:
+                debouncer.release(doc)
+            raise
+
+        inserted = iter(range(len(to_insert)))
+        for result in results:
+            if result["result"] != "inserted":
+                continue
+            position = next(inserted)
+            doc = to_insert[position]
+            if position in failed:
+                debouncer.release(doc)
+                result["result"] = "debounced" if _rejected_as_duplicate(failed[position]) else "error"
+            else:
+                debouncer.accepted(doc)
+                result["id"] = str(doc["_id"])
+
+        await _after_attendance_written(db, [doc for i, doc in enumerate(to_insert) if i not in failed])
+
+    summary = {"inserted": 0, "debounced": 0, "unknown_roll": 0, "error": 0}
+    for result in results:
+        summary[result["result"]] += 1
+    if not summary["error"]:
+        summary.pop("error")
+
+    summary["results"] = results
+    return summary
+
+
+@router.post("/recognize", response_model=dict)
+async def recognize_faces(payload: schemas.RecognizeIn, db=Depends(get_db)):
+    """
+    Match one or more face embeddings against every enrolled student.
+
+    All probes are scored in a single matrix multiply. With `mark=true`,
+    matched faces go through the same write path as /mark/batch.
+    """
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    if not payload.embeddings:
+        return {"matches": []}
+    if len(payload.embeddings) > settings.FACE_RECOGNIZE_MAX_BATCH:
+        raise HTTPException(status_code=413, detail="Too many embeddings in one request")
+
+    await face_index.sync(db)
+    try:
+        matches = await face_index.search(payload.embeddings, payload.threshold)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    response = {"matches": matches}
+    if payload.mark:
+        events = [
+            schemas.AttendanceIn(
+                roll=match["roll"],
+                status=payload.status,
+                timestamp=payload.timestamp,
+                confidence=match["score"],
+            )
+            for match in matches
+            if match and match["matched"]
+        ]
+        response["attendance"] = await mark_events(db, events)
+    return response
+
+
+def _parse_boxes(raw, frames: int):
+    """Face boxes per frame: a JSON list with one [[l, t, r, b], ...] (or null) per frame."""
+    if not raw:
+        return [None] * frames
+    try:
+        boxes = json.loads(raw)
+        if frames == 1 and boxes and not isinstance(boxes[0][0], list):
+            boxes = [boxes]  # a single frame may send its boxes unwrapped
+        if len(boxes) != frames:
+            raise ValueError
+        for frame_boxes in boxes:
+            for box in frame_boxes or []:
+                if len(box) != 4 or box[2] <= box[0] or box[3] <= box[1]:
+                    raise ValueError
+    except (ValueError, TypeError, IndexError):
+        raise HTTPException(status_code=400, detail="boxes must be one list of [left, top, right, bottom] per frame")
+    return boxes
+
+
+async def _read_frames(request: Request):
+    """Return [(jpeg bytes, boxes)] from a raw image body or a multipart batch."""
+    content_type = request.headers.get("content-type", "")
+
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        uploads = form.getlist("frames")
+        if len(uploads) > settings.FRAME_MAX_BATCH:
+            raise HTTPException(status_code=413, detail="Too many frames in one request")
+        frames = []
+        for upload in uploads:
+            data = await upload.read(settings.FRAME_MAX_BYTES + 1)
+            if len(data) > settings.FRAME_MAX_BYTES:
+                raise HTTPException(status_code=413, detail="Frame too large")
+            frames.append(data)
+        boxes = _parse_boxes(form.get("boxes"), len(frames))
+    else:
+        if int(request.headers.get("content-length") or 0) > settings.FRAME_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="Frame too large")
+        data = await request.body()
+        if len(data) > settings.FRAME_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="Frame too large")
+        frames = [data] if data else []
+        boxes = _parse_boxes(request.headers.get("x-face-boxes"), len(frames))
+
+    if not frames:
+        raise HTTPException(status_code=400, detail="No frames in request")
+    return list(zip(frames, boxes))
+
+
+def _queue_full(e: FrameQueueFull):
+    return HTTPException(
+        status_code=429,
+        detail="Frame queue full, retry later",
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+@router.post("/frames", response_model=dict)
+async def ingest_frames(
+    request: Request,
+    mark: bool = True,
+    status: str = "Present",
+    threshold: Optional[float] = None,
+    db=Depends(get_db),
+):
+    """
+    Recognize faces in raw camera frames and mark attendance.
+
+    Send one JPEG as the request body (face boxes in an `X-Face-Boxes` JSON
+    header) or a multipart batch of `frames` files with an optional `boxes`
+    field. Decoding and preprocessing happen in a process pool behind a
+    bounded queue; when it is full the request is rejected with 429 and a
+    Retry-After header. Matches go through the same write path as /mark/batch.
+    """
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    if not settings.FRAME_EMBEDDER:
+        raise HTTPException(status_code=503, detail="No face embedding model configured (FRAME_EMBEDDER)")
+
+    # Reject before reading the body when the queue is already full
+    try:
+        frame_pipeline.check_capacity()
+    except FrameQueueFull as e:
+        raise _queue_full(e)
+
+    frames = await _read_frames(request)
+    try:
+        futures = frame_pipeline.submit(frames)
+    except FrameQueueFull as e:
+        raise _queue_full(e)
+
+    outcomes = await asyncio.gather(*futures, return_exceptions=True)
+
+    # ------------------------------------------------
+    # Score every face from every frame in one matrix multiply
+    # ------------------------------------------------
+    results = []
+    embeddings = []
+    for index, outcome in enumerate(outcomes):
+        if isinstance(outcome, Exception):
+            results.append({"index": index, "error": str(outcome)})
+            continue
+        frame_embeddings, faces = outcome
+        results.append({"index": index, "faces": faces, "matches": []})
+        embeddings.extend((index, vector) for vector in frame_embeddings)
+
+    matched = []
+    if embeddings:
+        started = time.perf_counter()
+        await face_index.sync(db)
+        try:
+            matches = await face_index.search([vector for _, vector in embeddings], threshold)
+        except ValueError as e:
+            raise HTTPException(status_code=500, detail=f"Embedder output rejected: {e}")
+        frame_pipeline.latency.record("match", (time.perf_counter() - started) * 1000)
+
+        for (index, _), match in zip(embeddings, matches):
+            if match:
+                results[index]["matches"].append(match)
+                if match["matched"]:
+                    matched.append(match)
+
+    response = {"frames": results}
+    if mark:
+        started = time.perf_counter()
+        events = [
+            schemas.AttendanceIn(roll=match["roll"], status=status, confidence=match["score"])
+            for match in matched
+        ]
+        response["attendance"] = await mark_events(db, events)
+        frame_pipeline.latency.record("write", (time.perf_counter() - started) * 1000)
+    return response
 
 
-@router.get("/", response_model=List[dict])
-async def get_attendance(skip: int = 0, limit: int = 100, db=Depends(get_db)):
+@router.get("/", response_model=Union[List[dict], dict], response_class=ORJSONResponse)
+async def get_attendance(
+    skip: int = Query(0, ge=0),
+    limit: int = 100,
+    after: Optional[str] = None,
+    db=Depends(get_db),
+):
     """
-    Return all attendance records with pagination.
+    Return attendance records with pagination.
+
+    Without `after` this is the legacy skip/limit list; `limit` is clamped
+    to MAX_PAGE_SIZE. Passing `after` (empty for the first page) switches to
+    keyset pagination, newest first, and returns {"items": [...],
+    "next_cursor": ...}; there a `limit` outside 1..MAX_PAGE_SIZE is a 400.
     """
     try:
         if db is None:
             raise HTTPException(status_code=500, detail="Database connection failed")
         
         attendance_collection = db["attendance"]
+
+        if after is None:
+            limit = legacy_limit(limit)
+            if attendance_days.enabled():
+                pipeline = attendance_days.flat_pipeline() + [{"$skip": skip}, {"$limit": limit}]
+                return ORJSONResponse(await collect(db[attendance_days.DAYS].aggregate(pipeline)))
+            cursor = attendance_collection.find({}, ATTENDANCE_PROJECTION).skip(skip).limit(limit)
+            return ORJSONResponse(await collect(cursor))
+
+        limit = cursor_limit(limit)
+        last = decode_cursor(after, ("timestamp", "_id")) if after else None
+        query = descending_after(last, "timestamp") if last else {}
+        if attendance_days.enabled():
+            # Newest days first; stops reading once the page is full
+            day_match = {"date": {"$lte": attendance_days.day_of(last["timestamp"])}} if last else None
+            records = []
+            events = attendance_days.events_by_day(db, day_match, query, descending=True)
+            async with contextlib.aclosing(events):
+                async for record in events:
+                    records.append(to_jsonable(record))
+                    if len(records) > limit:
+                        break
+        else:
+            cursor = (
+                attendance_collection.find(query, ATTENDANCE_PROJECTION)
+                .sort([("timestamp", -1), ("_id", -1)])
+                .limit(limit + 1)
+            )
+            records = await collect(cursor)
+
+        next_cursor = None
+        if len(records) > limit:
+            records.pop()
+            last = records[-1]
+            next_cursor = encode_cursor({"timestamp": last["timestamp"], "_id": ObjectId(last["id"])})
         
-        records = []
-        cursor = attendance_collection.find({}).skip(skip).limit(limit)
-        async for record in cursor:
-            record["id"] = str(record["_id"])
-            record["student_id"] = str(record["student_id"])
-            record.pop("_id", None)
-            records.append(record)
-        
-        return records
+        return ORJSONResponse({"items": records, "next_cursor": next_cursor})
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching attendance: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching attendance: {str(e)}")
 
 
-@router.get("/today", response_model=List[dict])
+@router.get("/today", response_model=List[dict], response_class=ORJSONResponse)
 async def get_today_attendance(db=Depends(get_db)):
     """
     Return today's attendance records.
@@ -100,44 +462,272 @@ async def get_today_attendance(db=Depends(get_db)):
         start_of_day = datetime(today.year, today.month, today.day, 0, 0, 0)
         end_of_day = start_of_day + timedelta(days=1)
 
+        if attendance_days.enabled():
+            pipeline = attendance_days.flat_pipeline({"date": start_of_day})
+            return ORJSONResponse(await collect(db[attendance_days.DAYS].aggregate(pipeline)))
+
         attendance_collection = db["attendance"]
         
-        records = []
         cursor = attendance_collection.find({
             "timestamp": {
                 "$gte": start_of_day,
                 "$lt": end_of_day
             }
-        })
-        async for record in cursor:
-            record["id"] = str(record["_id"])
-            record["student_id"] = str(record["student_id"])
-            record.pop("_id", None)
-            records.append(record)
+        }, ATTENDANCE_PROJECTION)
         
-        return records
+        return ORJSONResponse(await collect(cursor))
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching today's attendance: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching attendance: {str(e)}")
 
 
-@router.get("/student/{student_id}", response_model=List[dict])
+EXPORT_FIELDS = ["id", "student_id", "student_name", "roll", "timestamp", "status", "confidence"]
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+# Rows are flushed to the client in chunks of this many encoded rows
+EXPORT_CHUNK_ROWS = 500
+
+
+def _export_row(record):
+    timestamp = record.get("timestamp")
+    return {
+        "id": str(record["_id"]),
+        "student_id": str(record.get("student_id", "")),
+        "student_name": record.get("student_name"),
+        "roll": record.get("roll"),
+        "timestamp": timestamp.isoformat() if timestamp else None,
+        "status": record.get("status"),
+        "confidence": record.get("confidence"),
+    }
+
+
+async def _encode_csv(cursor):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    rows = 0
+    async for record in cursor:
+        writer.writerow(_export_row(record))
+        rows += 1
+        if rows % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
+
+
+async def _encode_ndjson(cursor):
+    lines = []
+    async for record in cursor:
+        lines.append(json.dumps(_export_row(record)))
+        if len(lines) == EXPORT_CHUNK_ROWS:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+@router.get("/export/{format}")
+async def export_attendance(
+    format: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    class_name: Optional[str] = None,
+    db=Depends(get_analytics_db),
+):
+    """
+    Stream attendance as CSV or NDJSON.
+
+    `start`/`end` are inclusive dates; `class_name` restricts to one class.
+    Rows are encoded while the cursor is read, so memory stays flat no
+    matter how many records are exported.
+    """
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Unsupported export format (use csv or ndjson)")
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    query = {}
+    if start or end:
+        query["timestamp"] = {}
+        if start:
+            query["timestamp"]["$gte"] = datetime(start.year, start.month, start.day)
+        if end:
+            query["timestamp"]["$lt"] = datetime(end.year, end.month, end.day) + timedelta(days=1)
+
+    student_ids = None
+    if class_name:
+        student_ids = [
+            s["_id"] async for s in db["students"].find({"class_name": class_name}, {"_id": 1})
+        ]
+        query["student_id"] = {"$in": student_ids}
+
+    if attendance_days.enabled():
+        # Range bounds are whole days, so filtering day documents is exact
+        day_match = {key: value for key, value in query.items() if key != "timestamp"}
+        if "timestamp" in query:
+            day_match["date"] = attendance_days.date_range(query["timestamp"].get("$gte"), query["timestamp"].get("$lt"))
+        cursor = attendance_days.events_by_day(db, day_match)
+    else:
+        cursor = (
+            db["attendance"]
+            .find(query, ATTENDANCE_PROJECTION)
+            .sort("timestamp", 1)
+            .batch_size(settings.EXPORT_BATCH_SIZE)
+        )
+
+    async def both_tiers():
+        # Archived days are older than anything in MongoDB, so cold goes first
+        bounds = query.get("timestamp", {})
+        async for record in archive.cold_records(bounds.get("$gte"), bounds.get("$lt"), student_ids):
+            yield record
+        async for record in cursor:
+            yield record
+
+    encoder = _encode_csv if format == "csv" else _encode_ndjson
+    filename = f"attendance-{date.today().isoformat()}.{format}"
+    return StreamingResponse(
+        encoder(both_tiers()),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.post("/archive")
+async def archive_attendance(older_than_days: Optional[int] = None, dry_run: bool = False, db=Depends(get_db)):
+    """
+    Move marks older than `older_than_days` (default ARCHIVE_AFTER_DAYS) to
+    the compressed archive now, instead of waiting for `python -m app.archive`.
+
+    Each call handles the oldest ARCHIVE_DAYS_PER_REQUEST days, so it stays
+    well inside proxy timeouts; repeat until the response says "done".
+    """
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    if older_than_days is not None and older_than_days < 1:
+        raise HTTPException(status_code=400, detail="older_than_days must be at least 1")
+    try:
+        result = await archive.archive_attendance(db, older_than_days, dry_run, settings.ARCHIVE_DAYS_PER_REQUEST)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"detail": "Dry run" if dry_run else "Attendance archived", **result}
+
+
+@router.get("/student/{student_id}", response_model=List[dict], response_class=ORJSONResponse)
 async def get_student_attendance(student_id: str, db=Depends(get_db)):
     """
-    Return attendance history for a specific student.
+    Return attendance history for a specific student, archived marks first.
     """
     try:
         student_obj_id = ObjectId(student_id)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid student ID format")
     
-    attendance_collection = db["attendance"]
-    
-    records = []
-    cursor = attendance_collection.find({"student_id": student_obj_id})
-    async for record in cursor:
-        record["id"] = str(record["_id"])
-        record["student_id"] = str(record["student_id"])
-        records.append(record)
-    
-    return records
+    cold = [record async for record in archive.cold_records(student_ids=[student_obj_id])]
+
+    if attendance_days.enabled():
+        pipeline = [{"$match": {"student_id": student_obj_id}}, {"$sort": {"date": 1}}] + attendance_days.flat_pipeline()
+        hot = db[attendance_days.DAYS].aggregate(pipeline)
+    else:
+        hot = db["attendance"].find({"student_id": student_obj_id}, ATTENDANCE_PROJECTION)
+
+    # A mark being archived right now can be in both tiers for a moment
+    archived = {record["_id"] for record in cold}
+    records = [to_jsonable(record) for record in cold]
+    records += [to_jsonable(record) async for record in hot if record["_id"] not in archived]
+    return ORJSONResponse(records)
+
+
+# ------------------------------------------------
+# 📡 Live feed: /stream as Server-Sent Events or WebSocket
+# ------------------------------------------------
+def _bearer(request_or_socket, token: Optional[str]):
+    header = request_or_socket.headers.get("authorization", "")
+    if header.lower().startswith("bearer "):
+        return header[7:]
+    return token
+
+
+async def _sse_events(db, last_event_id):
+    try:
+        async for event in feed.events(db, last_event_id):
+            if event is None:
+                yield ": ping\n\n"
+            else:
+                yield f"id: {event[0]}\nevent: attendance\ndata: {event[1]}\n\n"
+    except FeedEvicted:
+        # EventSource reconnects on its own and resumes via Last-Event-ID
+        yield "event: evicted\ndata: {}\n\n"
+
+
+@stream_router.get("/stream")
+async def stream_attendance(
+    request: Request,
+    token: Optional[str] = None,
+    last_event_id: Optional[str] = None,
+    db=Depends(get_db),
+):
+    """
+    Server-Sent Events feed of newly accepted attendance records.
+
+    Resumes after `Last-Event-ID` (header, sent by EventSource on reconnect)
+    or `last_event_id`. Each event's data is a record shaped like /today rows.
+    """
+    await authenticate(db, _bearer(request, token))
+    last_event_id = request.headers.get("last-event-id") or last_event_id
+    return StreamingResponse(
+        _sse_events(db, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _send_feed(websocket: WebSocket, db, last_event_id):
+    try:
+        async with contextlib.aclosing(feed.events(db, last_event_id)) as events:
+            async for event in events:
+                if event is None:
+                    await websocket.send_text('{"type": "ping"}')
+                else:
+                    await websocket.send_text(f'{{"type": "attendance", "id": "{event[0]}", "record": {event[1]}}}')
+    except FeedEvicted:
+        await websocket.send_text('{"type": "evicted"}')
+        await websocket.close(code=1013)
+
+
+async def _wait_disconnect(websocket: WebSocket):
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+@stream_router.websocket("/stream")
+async def stream_attendance_ws(
+    websocket: WebSocket,
+    token: Optional[str] = None,
+    last_event_id: Optional[str] = None,
+):
+    """
+    WebSocket feed: one JSON text message per event,
+    {"type": "attendance", "id": ..., "record": {...}}, plus "ping" and "evicted".
+    """
+    db = await get_db()
+    try:
+        await authenticate(db, _bearer(websocket, token))
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    # Watch for the client going away while the sender waits for events,
+    # so its subscription is dropped right away rather than at the next ping
+    tasks = [
+        asyncio.create_task(_send_feed(websocket, db, last_event_id)),
+        asyncio.create_task(_wait_disconnect(websocket)),
+    ]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
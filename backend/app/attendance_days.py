@@ -0,0 +1,258 @@
+"""
+Daily attendance layout (ATTENDANCE_LAYOUT=daily).
+
+Instead of one `attendance` document per mark, `attendance_days` holds one
+document per student per day:
+
+    {student_id, date, student_name, roll, count, last_timestamp,
+     events: [{_id, timestamp, status, confidence}, ...]}
+
+student_name and roll are stored once per day rather than once per mark,
+and the (student_id, date) index gets one entry per student-day.
+
+A mark is a single upsert that $push-es the event. Its filter also requires
+`last_timestamp` (the newest event so far) to be older than
+DEBOUNCE_SECONDS, so a repeat mark misses the document, tries to insert a
+second one for the same (student_id, date), and is rejected by the unique
+index: the day document is the debounce check, atomically and across
+workers. Debounce does not reach across midnight.
+
+Reads unwind `events` back into the flat record shape (event _id as the
+record id), so every endpoint returns the same JSON in either layout.
+Day-ordered reads seek one day at a time on the date index, so a page of
+results only touches the days it returns.
+
+`python -m app.migrate --attendance-days` copies the flat collection over.
+"""
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from .core.config import settings
+
+DAYS = "attendance_days"
+DUPLICATE_KEY_ERROR = 11000
+
+
+def enabled() -> bool:
+    return settings.ATTENDANCE_LAYOUT == "daily"
+
+
+def day_of(timestamp: datetime) -> datetime:
+    return datetime(timestamp.year, timestamp.month, timestamp.day)
+
+
+# --- writes -----------------------------------------------------------------
+
+def _debounced(doc: dict) -> dict:
+    """Match the day document only if its newest event is outside the debounce window."""
+    window = timedelta(seconds=settings.DEBOUNCE_SECONDS)
+    return {"last_timestamp": {"$not": {"$gt": doc["timestamp"] - window}}}
+
+
+def _push(doc: dict, condition: dict):
+    """(filter, update) of the upsert appending `doc` to its day document, if that matches `condition`."""
+    return (
+        {"student_id": doc["student_id"], "date": day_of(doc["timestamp"]), **condition},
+        {
+            "$push": {"events": {
+                "_id": doc["_id"],
+                "timestamp": doc["timestamp"],
+                "status": doc["status"],
+                "confidence": doc.get("confidence"),
+            }},
+            "$max": {"last_timestamp": doc["timestamp"]},
+            "$inc": {"count": 1},
+            "$set": {"student_name": doc["student_name"], "roll": doc["roll"]},
+        },
+    )
+
+
+async def push_event(db, doc: dict):
+    """Append one flat attendance doc (with `_id` set); raises DuplicateKeyError when debounced."""
+    await db[DAYS].update_one(*_push(doc, _debounced(doc)), upsert=True)
+
+
+async def push_events(db, docs) -> dict:
+    """
+    Append flat attendance docs (with `_id` already set) to their day
+    documents in one unordered bulk write. Returns {index: error code} for
+    the docs that weren't written; DUPLICATE_KEY_ERROR means debounced.
+    """
+    if not docs:
+        return {}
+    try:
+        await db[DAYS].bulk_write(
+            [UpdateOne(*_push(doc, _debounced(doc)), upsert=True) for doc in docs], ordered=False
+        )
+    except BulkWriteError as e:
+        return {err["index"]: err.get("code") for err in e.details.get("writeErrors", [])}
+    return {}
+
+
+async def last_event(db, doc: dict):
+    """The newest event of `doc`'s student-day, as a flat record (or None)."""
+    day = await db[DAYS].find_one(
+        {"student_id": doc["student_id"], "date": day_of(doc["timestamp"])},
+        {"student_id": 1, "student_name": 1, "roll": 1, "events": {"$slice": -1}},
+    )
+    if not day or not day.get("events"):
+        return None
+    return flatten(day, day["events"][-1])
+
+
+def flatten(day: dict, event: dict) -> dict:
+    return {
+        "_id": event["_id"],
+        "student_id": day["student_id"],
+        "student_name": day.get("student_name"),
+        "roll": day.get("roll"),
+        "timestamp": event["timestamp"],
+        "status": event.get("status"),
+        "confidence": event.get("confidence"),
+    }
+
+
+# --- reads ------------------------------------------------------------------
+
+def flat_pipeline(day_match: dict = None, event_match: dict = None):
+    """
+    Stages turning day documents into flat attendance records. `day_match`
+    filters day documents (student_id, date) before $unwind, so the index
+    does the narrowing; `event_match` filters the unwound records.
+    """
+    pipeline = []
+    if day_match:
+        pipeline.append({"$match": day_match})
+    pipeline += [
+        {"$unwind": "$events"},
+        {"$project": {
+            "_id": "$events._id",
+            "student_id": 1,
+            "student_name": 1,
+            "roll": 1,
+            "timestamp": "$events.timestamp",
+            "status": "$events.status",
+            "confidence": "$events.confidence",
+        }},
+    ]
+    if event_match:
+        pipeline.append({"$match": event_match})
+    return pipeline
+
+
+def date_range(start: datetime = None, end: datetime = None) -> dict:
+    """`date` filter for the days overlapping [start, end)."""
+    bounds = {}
+    if start:
+        bounds["$gte"] = day_of(start)
+    if end:
+        bounds["$lt"] = end
+    return bounds
+
+
+async def events_by_day(db, day_match: dict = None, event_match: dict = None, descending: bool = False):
+    """
+    Yield flat records in timestamp order, one day at a time. Each step
+    seeks the next day with data on the date index, so a consumer that
+    stops early never reads further days.
+    """
+    day_match = dict(day_match or {})
+    bounds = day_match.pop("date", {})
+    direction = -1 if descending else 1
+    day = None
+    while True:
+        query = dict(day_match)
+        step = dict(bounds)
+        if day is not None:
+            step["$lt" if descending else "$gt"] = day
+        if step:
+            query["date"] = step
+        following = await db[DAYS].find_one(query, {"date": 1}, sort=[("date", direction)])
+        if following is None:
+            return
+        day = following["date"]
+        pipeline = flat_pipeline({**day_match, "date": day}, event_match)
+        pipeline.append({"$sort": {"timestamp": direction, "_id": direction}})
+        async for record in db[DAYS].aggregate(pipeline):
+            yield record
+
+
+async def count_events(db) -> int:
+    async for row in db[DAYS].aggregate([{"$group": {"_id": None, "events": {"$sum": "$count"}}}]):
+        return row["events"]
+    return 0
+
+
+def latest_mark_lookup(day: datetime, exclude_status: str = None):
+    """
+    $lookup of a student's marks on `day` (localField _id), as
+    `marks: [{status, timestamp}]` holding at most the newest one.
+    With `exclude_status`, only days with another status match.
+    """
+    match = {"date": day}
+    if exclude_status:
+        match["events"] = {"$elemMatch": {"status": {"$ne": exclude_status}}}
+    return {"$lookup": {
+        "from": DAYS,
+        "localField": "_id",
+        "foreignField": "student_id",
+        "pipeline": [
+            {"$match": match},
+            {"$project": {
+                "_id": 0,
+                "status": {"$arrayElemAt": ["$events.status", -1]},
+                "timestamp": {"$arrayElemAt": ["$events.timestamp", -1]},
+            }},
+        ],
+        "as": "marks",
+    }}
+
+
+# --- migration ----------------------------------------------------------------
+
+MIGRATION_ID = "attendance_days"
+
+
+async def migrate_flat(db, batch_size: int = 5000):
+    """
+    Copy `attendance` into day documents in _id order, batch by batch.
+    Progress is stored in `migrations`, so an interrupted run resumes, and
+    a second run after switching layouts picks up marks written meanwhile.
+    An event already copied is never pushed twice. The flat collection is
+    left in place. Returns (events copied, batches).
+    """
+    progress = await db["migrations"].find_one({"_id": MIGRATION_ID}) or {}
+    after = progress.get("last_id")
+    copied = batches = 0
+    while True:
+        query = {"_id": {"$gt": after}} if after else {}
+        docs = await db["attendance"].find(query).sort("_id", 1).limit(batch_size).to_list(None)
+        if not docs:
+            break
+
+        operations = []
+        for doc in docs:
+            doc.setdefault("student_name", None)
+            doc.setdefault("roll", None)
+            doc.setdefault("status", "Present")
+            # Skip events an earlier, interrupted run already copied
+            operations.append(UpdateOne(*_push(doc, {"events._id": {"$ne": doc["_id"]}}), upsert=True))
+        try:
+            result = await db[DAYS].bulk_write(operations, ordered=False)
+            copied += result.modified_count + result.upserted_count
+        except BulkWriteError as e:
+            if any(err.get("code") != DUPLICATE_KEY_ERROR for err in e.details.get("writeErrors", [])):
+                raise
+            copied += e.details.get("nModified", 0) + e.details.get("nUpserted", 0)
+
+        after = docs[-1]["_id"]
+        batches += 1
+        await db["migrations"].update_one(
+            {"_id": MIGRATION_ID},
+            {"$set": {"last_id": after, "updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+        print(f"[MIGRATE] attendance -> {DAYS}: {copied} events copied ({batches} batches)")
+    return copied, batches
@@ -25,7 +25,7 @@ async def register(user: schemas.UserCreate, db=Depends(get_db)):
             detail="User with this username or email already exists",
         )
 
-    hashed = utils.get_password_hash(user.password)
+    hashed = await utils.get_password_hash_async(user.password)
 
     new_user = UserModel(
         username=user.username,
@@ -55,11 +55,16 @@ async def login(
     users_collection = db["users"]
     user = await users_collection.find_one({"username": form_data.username})
 
-    if not user or not utils.verify_password(form_data.password, user["hashed_password"]):
+    if not user or not await utils.verify_password_async(form_data.password, user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
         )
 
+    # Transparently upgrade legacy hashes or a changed iteration count
+    if utils.needs_rehash(user["hashed_password"]):
+        upgraded = await utils.get_password_hash_async(form_data.password)
+        await users_collection.update_one({"_id": user["_id"]}, {"$set": {"hashed_password": upgraded}})
+
     token = utils.create_access_token(form_data.username)
     return {"access_token": token, "token_type": "bearer"}
@@ -2,9 +2,6 @@ from fastapi import APIRouter, Depends, HTTPException, status, Body
 from app import schemas, utils
 from app.db import get_db
 from app.models import UserModel
-from google.oauth2 import id_token
-from google.auth.transport import requests
-from app.core.config import settings
 
 router = APIRouter()
 
@@ -13,13 +10,12 @@ async def google_login(token_data: schemas.GoogleLoginIn = Body(...), db=Depends
     """
     Verify Google ID Token and login/register user.
     """
+    # Imported on the first Google login, not in every worker at startup
+    from app.google_verifier import google_verifier
+
     try:
-        # Verify the token
-        id_info = id_token.verify_oauth2_token(
-            token_data.credential, 
-            requests.Request(), 
-            settings.GOOGLE_CLIENT_ID
-        )
+        # Verify the token (cached signing certs, signature check off the event loop)
+        id_info = await google_verifier.verify(token_data.credential)
 
         email = id_info.get("email")
         full_name = id_info.get("name")
@@ -0,0 +1,125 @@
+"""
+Pluggable binary blob storage (student photos and their thumbnails).
+
+ - GridFSBlobStore keeps blobs in MongoDB GridFS (default).
+ - LocalBlobStore writes them under a directory on local disk.
+
+Both return string ids and stream blobs back in chunks, so a large photo is
+never held in memory in full while it is served.
+"""
+import asyncio
+import json
+import os
+import uuid
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+from .core.config import settings
+
+CHUNK_SIZE = 256 * 1024
+
+
+class BlobNotFound(Exception):
+    pass
+
+
+class GridFSBlobStore:
+    def __init__(self, db, bucket_name: str = "photos"):
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name=bucket_name)
+
+    async def put(self, data: bytes, content_type: str, metadata: dict = None) -> str:
+        file_id = await self.bucket.upload_from_stream(
+            "blob",
+            data,
+            metadata={"content_type": content_type, **(metadata or {})},
+        )
+        return str(file_id)
+
+    async def open(self, blob_id: str):
+        """Return (chunk async iterator, length, content_type)."""
+        try:
+            grid_out = await self.bucket.open_download_stream(ObjectId(blob_id))
+        except Exception:
+            raise BlobNotFound(blob_id)
+
+        async def chunks():
+            while True:
+                chunk = await grid_out.readchunk()
+                if not chunk:
+                    break
+                yield chunk
+
+        content_type = (grid_out.metadata or {}).get("content_type", "application/octet-stream")
+        return chunks(), grid_out.length, content_type
+
+    async def delete(self, blob_id: str):
+        try:
+            await self.bucket.delete(ObjectId(blob_id))
+        except Exception:
+            pass
+
+
+class LocalBlobStore:
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, blob_id: str):
+        # Ids are generated uuid4 hex strings; never join anything else into the path
+        if len(blob_id) != 32 or not all(c in "0123456789abcdef" for c in blob_id):
+            raise BlobNotFound(blob_id)
+        return os.path.join(self.root, blob_id[:2], blob_id)
+
+    def _write(self, path: str, data: bytes, meta: dict):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".json", "w") as f:
+            json.dump(meta, f)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    async def put(self, data: bytes, content_type: str, metadata: dict = None) -> str:
+        blob_id = uuid.uuid4().hex
+        meta = {"content_type": content_type, **(metadata or {})}
+        await asyncio.to_thread(self._write, self._path(blob_id), data, meta)
+        return blob_id
+
+    async def open(self, blob_id: str):
+        path = self._path(blob_id)
+        try:
+            with open(path + ".json") as f:
+                meta = json.load(f)
+            length = os.path.getsize(path)
+        except OSError:
+            raise BlobNotFound(blob_id)
+
+        async def chunks():
+            f = await asyncio.to_thread(open, path, "rb")
+            try:
+                while True:
+                    chunk = await asyncio.to_thread(f.read, CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                f.close()
+
+        return chunks(), length, meta.get("content_type", "application/octet-stream")
+
+    async def delete(self, blob_id: str):
+        try:
+            path = self._path(blob_id)
+        except BlobNotFound:
+            return
+        for target in (path, path + ".json"):
+            try:
+                await asyncio.to_thread(os.remove, target)
+            except OSError:
+                pass
+
+
+def get_blob_store(db):
+    if settings.PHOTO_STORE == "local":
+        return LocalBlobStore(settings.PHOTO_STORE_PATH)
+    if settings.PHOTO_STORE == "gridfs":
+        return GridFSBlobStore(db)
+    raise ValueError(f"Unknown PHOTO_STORE: {settings.PHOTO_STORE}")
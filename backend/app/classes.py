@@ -1,11 +1,56 @@
 from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi.responses import ORJSONResponse
+from typing import List, Optional
+from datetime import date, datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+from . import attendance_days
 from .db import get_db
+from .serialization import CLASS_PROJECTION
 from bson import ObjectId
 
 router = APIRouter(tags=["Classes"])
 
 
+# ------------------------------------------------
+# Membership counts: `students` on each class document is kept in sync
+# with $inc from the student write paths instead of being recounted.
+# ------------------------------------------------
+async def adjust_class_counts(db, changes):
+    """Apply {class_name: delta} to class counts, one $inc per class."""
+    for class_name, delta in changes.items():
+        if class_name and delta:
+            await db.classes.update_one({"name": class_name}, {"$inc": {"students": delta}})
+
+
+async def move_student(db, old_class: Optional[str], new_class: Optional[str]):
+    """Count a student leaving `old_class` and joining `new_class` (either may be None)."""
+    if old_class == new_class:
+        return
+    await adjust_class_counts(db, {old_class: -1, new_class: 1})
+
+
+async def dedupe_classes(db):
+    """
+    Merge class documents sharing a name (possible before classes.name was
+    unique): keep the oldest, delete the rest, recount its students.
+    Students refer to classes by name, so nothing else changes. Returns the
+    number of documents removed.
+    """
+    pipeline = [
+        {"$group": {"_id": "$name", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    removed = 0
+    async for group in db.classes.aggregate(pipeline, allowDiskUse=True):
+        keep, *extra = sorted(group["ids"])
+        await db.classes.delete_many({"_id": {"$in": extra}})
+        count = await db.students.count_documents({"class_name": group["_id"]})
+        await db.classes.update_one({"_id": keep}, {"$set": {"students": count}})
+        removed += len(extra)
+        print(f"[MIGRATE] Merged {len(extra) + 1} classes named {group['_id']!r}")
+    return removed
+
+
 def serialize_class(doc):
     return {
         "id": str(doc["_id"]),
@@ -14,7 +59,7 @@ def serialize_class(doc):
     }
 
 
-@router.get("/", response_model=List[dict])
+@router.get("/", response_model=List[dict], response_class=ORJSONResponse)
 async def list_classes(db=Depends(get_db)):
     """
     Return all classes from MongoDB
@@ -23,11 +68,11 @@ async def list_classes(db=Depends(get_db)):
         if db is None:
             raise HTTPException(status_code=500, detail="Database connection failed")
         
-        classes = []
-        cursor = db.classes.find({})
-        async for cls in cursor:
-            classes.append(serialize_class(cls))
-        return classes
+        cursor = db.classes.find({}, CLASS_PROJECTION)
+        classes = [serialize_class(cls) async for cls in cursor]
+        return ORJSONResponse(classes)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching classes: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching classes: {str(e)}")
@@ -48,11 +93,16 @@ async def create_class(payload: dict, db=Depends(get_db)):
 
         new_class = {
             "name": payload["name"],
-            "students": 0  # default
+            # Students may already carry this class_name; from here on $inc keeps it current
+            "students": await db.students.count_documents({"class_name": payload["name"]}),
         }
 
-        result = await db.classes.insert_one(new_class)
+        try:
+            result = await db.classes.insert_one(new_class)
+        except DuplicateKeyError:
+            raise HTTPException(status_code=409, detail="Class already exists")
         new_class["id"] = str(result.inserted_id)
+        new_class.pop("_id", None)
 
         return {"message": "Class created", "class": new_class}
     except HTTPException:
@@ -62,6 +112,88 @@ async def create_class(payload: dict, db=Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Error creating class: {str(e)}")
 
 
+@router.post("/recount", response_model=dict)
+async def recount_classes(db=Depends(get_db)):
+    """Admin: reset every class count from the students collection in one aggregation."""
+    counts = {
+        row["_id"]: row["count"]
+        async for row in db.students.aggregate([{"$group": {"_id": "$class_name", "count": {"$sum": 1}}}])
+    }
+    updated = 0
+    async for cls in db.classes.find({}, {"name": 1, "students": 1}):
+        count = counts.get(cls["name"], 0)
+        if cls.get("students") != count:
+            await db.classes.update_one({"_id": cls["_id"]}, {"$set": {"students": count}})
+            updated += 1
+    return {"detail": "Class counts reconciled", "updated": updated}
+
+
+def roster_pipeline(class_name: str, day: date):
+    """
+    Students of a class (class_name, roll index) with their latest mark on
+    `day` joined in by one $lookup on the (student_id, timestamp) index,
+    or the (student_id, date) index of day documents with
+    ATTENDANCE_LAYOUT=daily. The localField/foreignField + pipeline form
+    needs MongoDB 5.0+.
+    """
+    start = datetime(day.year, day.month, day.day)
+    if attendance_days.enabled():
+        marks = attendance_days.latest_mark_lookup(start)
+    else:
+        marks = {"$lookup": {
+            "from": "attendance",
+            "localField": "_id",
+            "foreignField": "student_id",
+            "pipeline": [
+                {"$match": {"timestamp": {"$gte": start, "$lt": start + timedelta(days=1)}}},
+                {"$sort": {"timestamp": -1}},
+                {"$limit": 1},
+                {"$project": {"_id": 0, "status": 1, "timestamp": 1}},
+            ],
+            "as": "marks",
+        }}
+    return [
+        {"$match": {"class_name": class_name}},
+        {"$sort": {"roll": 1}},
+        marks,
+        {"$project": {"name": 1, "roll": 1, "photo_ref.etag": 1, "marks": 1}},
+    ]
+
+
+@router.get("/{class_id}/roster", response_model=dict, response_class=ORJSONResponse)
+async def get_class_roster(class_id: str, day: Optional[date] = None, db=Depends(get_db)):
+    """
+    Students of a class with their attendance status for `day` (default today).
+    Students without a mark that day are reported as "Absent".
+    """
+    try:
+        cls = await db.classes.find_one({"_id": ObjectId(class_id)}, CLASS_PROJECTION)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid class ID format")
+    if not cls:
+        raise HTTPException(status_code=404, detail="Class not found")
+
+    day = day or date.today()
+    students = []
+    async for student in db.students.aggregate(roster_pipeline(cls["name"], day)):
+        mark = student.pop("marks")[:1]
+        student["id"] = str(student.pop("_id"))
+        student["status"] = mark[0]["status"] if mark else "Absent"
+        student["marked_at"] = mark[0]["timestamp"] if mark else None
+        students.append(student)
+
+    summary = {}
+    for student in students:
+        summary[student["status"]] = summary.get(student["status"], 0) + 1
+
+    return ORJSONResponse({
+        **serialize_class(cls),
+        "date": day.isoformat(),
+        "summary": summary,
+        "roster": students,
+    })
+
+
 @router.get("/{class_id}", response_model=dict)
 async def get_class_details(class_id: str, db=Depends(get_db)):
     """
@@ -6,14 +6,142 @@ class Settings(BaseSettings):
     # MongoDB Database
     MONGO_URI: str = "mongodb://localhost:27017"
     MONGO_DB: str = "facesense"
+    # Connection pool, wire compression and timeouts (app/db.py)
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = 2000  # fail fast instead of queueing forever for a connection
+    MONGO_COMPRESSORS: str = ""  # e.g. "zstd,snappy,zlib" (zstd needs zstandard, snappy needs python-snappy)
+    MONGO_CONNECT_TIMEOUT_MS: int = 5000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGO_SOCKET_TIMEOUT_MS: int = 0  # 0 = no socket timeout
+    # Analytics and export reads use their own, smaller pool so report
+    # queries can't take connections from the ingest path
+    MONGO_ANALYTICS_URI: str = ""  # defaults to MONGO_URI
+    MONGO_ANALYTICS_READ_PREFERENCE: str = "secondaryPreferred"
+    MONGO_ANALYTICS_MAX_POOL_SIZE: int = 10
+    # Ensure indexes in every worker's startup; skipped when the stored index
+    # version matches. Set false when deploys run `python -m app.migrate`.
+    CREATE_INDEXES_ON_STARTUP: bool = True
 
     # JWT & Auth
     JWT_SECRET: str = "your-secret-key-change-in-production"
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 1 day
 
+    # Require a bearer token on every router except /api/auth
+    AUTH_REQUIRED: bool = True
+    # Validated-token and user-document caches used by get_current_user
+    TOKEN_CACHE_SIZE: int = 10000
+    TOKEN_CACHE_TTL_SECONDS: int = 3600
+    USER_CACHE_SIZE: int = 2000
+    USER_CACHE_TTL_SECONDS: int = 30
+
+    # Password hashing (PBKDF2-SHA256). Changing the iteration count upgrades
+    # existing hashes on each user's next successful login.
+    PASSWORD_HASH_ITERATIONS: int = 100000
+    PASSWORD_HASH_CONCURRENCY: int = 4
+
+    # Log MongoDB commands slower than this (0 disables the listener) and
+    # explain them to flag collection scans
+    SLOW_QUERY_MS: int = 0
+    SLOW_QUERY_EXPLAIN: bool = True
+
+    # Roll -> student lookup cache used by attendance marking
+    STUDENT_CACHE_SIZE: int = 10000
+    STUDENT_CACHE_TTL_SECONDS: int = 300
+    # CSV import (POST /api/students/import): rows per bulk_write, and how
+    # many row errors the report lists (the failed count is always exact)
+    STUDENT_IMPORT_BATCH_SIZE: int = 1000
+    STUDENT_IMPORT_MAX_ERRORS: int = 1000
+
+    # Attendance debounce: "memory" (single worker, no query per duplicate)
+    # or "bucket" (unique dedup_key index, safe across several workers)
+    DEBOUNCE_MODE: str = "memory"
+    DEBOUNCE_SECONDS: int = 60
+
+    # Attendance storage (app/attendance_days.py): "flat" (one `attendance`
+    # document per mark) or "daily" (one `attendance_days` document per
+    # student per day). Convert with `python -m app.migrate --attendance-days`.
+    ATTENDANCE_LAYOUT: str = "flat"
+
+    # Date-range analytics result cache
+    ANALYTICS_CACHE_SIZE: int = 256
+    ANALYTICS_CACHE_TTL_SECONDS: int = 300
+
+    # Student photos: "gridfs" or "local" (files under PHOTO_STORE_PATH)
+    PHOTO_STORE: str = "gridfs"
+    PHOTO_STORE_PATH: str = "data/photos"
+    PHOTO_MAX_BYTES: int = 5 * 1024 * 1024
+    PHOTO_PROCESS_WORKERS: int = 2
+    THUMBNAIL_SIZE: int = 160
+    THUMBNAIL_FORMAT: str = "WEBP"
+
+    # Server-side face recognition (app/face_index.py)
+    FACE_EMBEDDING_DIM: int = 512
+    FACE_MATCH_THRESHOLD: float = 0.6  # cosine similarity
+    FACE_INDEX_SNAPSHOT_PATH: str = "data/face_index"
+    FACE_INDEX_SYNC_SECONDS: int = 5
+    FACE_RECOGNIZE_MAX_BATCH: int = 256
+
+    # Camera frame ingestion (app/frames.py)
+    # "module:function" taking an (n, size, size, 3) float32 array of face
+    # crops and returning (n, FACE_EMBEDDING_DIM) embeddings; runs in the pool
+    FRAME_EMBEDDER: str = ""
+    FRAME_QUEUE_SIZE: int = 64
+    FRAME_PROCESS_WORKERS: int = 2
+    FRAME_FACE_SIZE: int = 112
+    FRAME_MAX_BYTES: int = 2 * 1024 * 1024
+    FRAME_MAX_BATCH: int = 16
+
+    # Write-behind group commit for /mark (app/writer.py)
+    WRITE_BUFFER_ENABLED: bool = False
+    WRITE_BUFFER_FLUSH_MS: int = 10
+    WRITE_BUFFER_MAX_DOCS: int = 500
+    WRITE_BUFFER_MAX_QUEUE: int = 10000
+
+    # Live attendance feed (app/feed.py): "local" or "changestream" (replica set)
+    FEED_SOURCE: str = "local"
+    FEED_REPLAY_SIZE: int = 1000
+    FEED_SUBSCRIBER_QUEUE: int = 256
+    FEED_HEARTBEAT_SECONDS: int = 15
+
+    # Notification dispatcher (app/dispatcher.py); opt-in, since delivery needs
+    # a reachable SMTP relay. While off, queued messages wait in MongoDB.
+    NOTIFY_ENABLED: bool = False
+    NOTIFY_PROVIDER: str = "smtp"  # default provider: "smtp" or "log"
+    NOTIFY_CONCURRENCY: int = 4
+    NOTIFY_BATCH_SIZE: int = 50
+    NOTIFY_MAX_ATTEMPTS: int = 6
+    NOTIFY_RETRY_BASE_SECONDS: int = 30
+    NOTIFY_RETRY_MAX_SECONDS: int = 3600
+    NOTIFY_LEASE_SECONDS: int = 300
+    NOTIFY_POLL_SECONDS: int = 5
+    NOTIFY_SENT_RETENTION_DAYS: int = 30
+    NOTIFY_ABSENTEE_TIME: str = ""  # "HH:MM" local time for the daily absentee alerts; empty = off
+    SMTP_HOST: str = "localhost"
+    SMTP_PORT: int = 25
+    SMTP_USERNAME: str = ""
+    SMTP_PASSWORD: str = ""
+    SMTP_STARTTLS: bool = False
+    SMTP_FROM: str = "facesense@localhost"
+    SMTP_TIMEOUT: int = 10
+
+    # Documents fetched per cursor round trip when streaming exports
+    EXPORT_BATCH_SIZE: int = 2000
+
+    # Cold tier (app/archive.py): marks older than ARCHIVE_AFTER_DAYS move to
+    # gzip NDJSON segments under ARCHIVE_PATH when `python -m app.archive` runs
+    ARCHIVE_PATH: str = "data/archive"
+    ARCHIVE_AFTER_DAYS: int = 180
+    ARCHIVE_BATCH_SIZE: int = 5000  # documents per delete
+    ARCHIVE_DAYS_PER_REQUEST: int = 7  # POST /api/attendance/archive works in steps
+
     # Google Auth
     GOOGLE_CLIENT_ID: str = "510613444416-q052kvlak7f2nn0ga4736b257rvlppni.apps.googleusercontent.com"
+    # Signing certs; point at a local stub key server in tests
+    GOOGLE_CERTS_URL: str = "https://www.googleapis.com/oauth2/v1/certs"
+    # Used when the certs response carries no Cache-Control max-age
+    GOOGLE_CERTS_DEFAULT_MAX_AGE: int = 3600
 
     # CORS - Allow specific origins in development
     CORS_ORIGINS: list = [
@@ -1,27 +1,76 @@
+import asyncio
+import hashlib
+import time
+from datetime import datetime
+
 from motor.motor_asyncio import AsyncIOMotorClient
 from .core.config import settings
+from .monitoring import pool_listeners, slow_query_listener
 import pymongo
 
 client = None
 db = None
+# Separate pool for analytics and export reads (secondaryPreferred)
+analytics_client = None
+analytics_db = None
+
+
+def client_options(max_pool_size: int) -> dict:
+    """Pool, compression and timeout options shared by both clients."""
+    options = {
+        "maxPoolSize": max_pool_size,
+        "minPoolSize": min(settings.MONGO_MIN_POOL_SIZE, max_pool_size),
+        "waitQueueTimeoutMS": settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "connectTimeoutMS": settings.MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": settings.MONGO_SOCKET_TIMEOUT_MS or None,
+    }
+    if settings.MONGO_COMPRESSORS:
+        options["compressors"] = settings.MONGO_COMPRESSORS
+    return options
 
 
 async def connect_to_mongo():
-    global client, db
+    global client, db, analytics_client, analytics_db
 
-    client = AsyncIOMotorClient(settings.MONGO_URI)
+    event_listeners = [pool_listeners["main"]]
+    if slow_query_listener:
+        event_listeners.append(slow_query_listener)
+    client = AsyncIOMotorClient(
+        settings.MONGO_URI,
+        event_listeners=event_listeners,
+        **client_options(settings.MONGO_MAX_POOL_SIZE),
+    )
     db = client[settings.MONGO_DB]
 
+    analytics_listeners = [pool_listeners["analytics"]]
+    if slow_query_listener:
+        # Report queries are the likeliest to be slow; watch them too
+        analytics_listeners.append(slow_query_listener)
+    analytics_client = AsyncIOMotorClient(
+        settings.MONGO_ANALYTICS_URI or settings.MONGO_URI,
+        event_listeners=analytics_listeners,
+        readPreference=settings.MONGO_ANALYTICS_READ_PREFERENCE,
+        **client_options(settings.MONGO_ANALYTICS_MAX_POOL_SIZE),
+    )
+    analytics_db = analytics_client[settings.MONGO_DB]
+
     print("Connected to MongoDB:", settings.MONGO_DB)
 
 
 async def close_mongo_connection():
-    global client
+    global client, analytics_client
 
     if client:
         client.close()
         print("MongoDB connection closed")
 
+    if analytics_client:
+        analytics_client.close()
+
+    if slow_query_listener:
+        slow_query_listener.close()
+
 
 async def get_db():
     """
@@ -30,34 +79,200 @@ async def get_db():
     return db
 
 
-async def create_indexes():
+async def get_analytics_db():
+    """
+    FastAPI dependency for report reads (analytics, export): the analytics
+    client's pool and read preference, or the main db if it isn't connected.
+    """
+    return analytics_db if analytics_db is not None else db
+
+
+# --------------------------------------------------------
+# Index registry: every query the routers issue, and the index serving it.
+# Add an entry here whenever a new filter or sort is introduced.
+# --------------------------------------------------------
+INDEXES = [
+    {
+        "collection": "students",
+        "keys": [("roll", pymongo.ASCENDING)],
+        "options": {"unique": True},
+        "serves": "roll lookups in attendance marking and batch $in resolution",
+    },
+    {
+        "collection": "students",
+        "keys": [("class_name", pymongo.ASCENDING), ("roll", pymongo.ASCENDING)],
+        "options": {},
+        "serves": "class roster (match + roll sort), class recount, export class filter, create_class count",
+    },
+    {
+        "collection": "classes",
+        "keys": [("name", pymongo.ASCENDING)],
+        "options": {"unique": True},
+        "serves": "$inc of class counts by name from the student write paths",
+        "on_duplicates": "merge them with `python -m app.migrate --dedupe-classes`",
+    },
+    {
+        "collection": "attendance",
+        "keys": [("student_id", pymongo.ASCENDING), ("timestamp", pymongo.DESCENDING)],
+        "options": {},
+        "serves": "/student/{id} history, export student_id $in filter",
+    },
+    {
+        "collection": "attendance",
+        "keys": [("timestamp", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)],
+        "options": {},
+        "serves": "/today, keyset listing, export range + sort, analytics $match",
+    },
+    {
+        "collection": "attendance",
+        "keys": [("dedup_key", pymongo.ASCENDING)],
+        "options": {"unique": True, "partialFilterExpression": {"dedup_key": {"$exists": True}}},
+        "serves": "DEBOUNCE_MODE=bucket duplicate rejection",
+    },
+    {
+        "collection": "attendance_days",
+        "keys": [("student_id", pymongo.ASCENDING), ("date", pymongo.ASCENDING)],
+        "options": {"unique": True},
+        "serves": "ATTENDANCE_LAYOUT=daily: $push upsert and its debounce, /student/{id}, roster and absentee $lookup",
+    },
+    {
+        "collection": "attendance_days",
+        "keys": [("date", pymongo.ASCENDING)],
+        "options": {},
+        "serves": "ATTENDANCE_LAYOUT=daily: /today, day-by-day listing and export, analytics range, feed replay",
+    },
+    {
+        "collection": "notifications",
+        "keys": [
+            ("provider", pymongo.ASCENDING),
+            ("status", pymongo.ASCENDING),
+            ("next_attempt_at", pymongo.ASCENDING),
+        ],
+        "options": {},
+        "serves": "dispatcher claims of due messages per provider",
+    },
+    {
+        "collection": "notifications",
+        "keys": [("claim", pymongo.ASCENDING)],
+        "options": {"sparse": True},
+        "serves": "dispatcher re-read of a claimed batch",
+    },
+    {
+        "collection": "notifications",
+        "keys": [("dedup_key", pymongo.ASCENDING)],
+        "options": {"unique": True, "partialFilterExpression": {"dedup_key": {"$exists": True}}},
+        "serves": "one absentee alert per student per day",
+    },
+    {
+        "collection": "notifications",
+        "keys": [("sent_at", pymongo.ASCENDING)],
+        "options": {"expireAfterSeconds": settings.NOTIFY_SENT_RETENTION_DAYS * 86400},
+        "serves": "TTL: delivered notifications are purged after NOTIFY_SENT_RETENTION_DAYS",
+    },
+    {
+        "collection": "users",
+        "keys": [("username", pymongo.ASCENDING)],
+        "options": {"unique": True},
+        "serves": "password login, register uniqueness, get_current_user",
+    },
+    {
+        "collection": "users",
+        "keys": [("email", pymongo.ASCENDING)],
+        "options": {},
+        "serves": "Google login, register uniqueness, get_current_user for Google subjects",
+    },
+]
+
+
+def _index_label(spec):
+    return f"{spec['collection']}(" + ", ".join(field for field, _ in spec["keys"]) + ")"
+
+
+def _spec_key(spec) -> tuple:
+    return (spec["collection"], spec["keys"], sorted(spec["options"].items()))
+
+
+def _spec_hash(spec) -> str:
+    return hashlib.sha1(repr(_spec_key(spec)).encode()).hexdigest()[:12]
+
+
+def indexes_version() -> str:
+    """Hash of the INDEXES registry; changes whenever an entry is added or edited."""
+    specs = [_spec_key(spec) for spec in INDEXES]
+    return hashlib.sha1(repr(specs).encode()).hexdigest()[:12]
+
+
+async def find_duplicates(spec, sample: int = 5):
     """
-    Create indexes for performance and constraint enforcement.
+    Up to `sample` key values that occur more than once in the collection,
+    so a unique index build can be refused with a useful message instead of
+    failing inside MongoDB. Scoped to partialFilterExpression when present.
+    """
+    fields = [field for field, _ in spec["keys"]]
+    pipeline = []
+    if spec["options"].get("partialFilterExpression"):
+        pipeline.append({"$match": spec["options"]["partialFilterExpression"]})
+    pipeline += [
+        {"$group": {"_id": {field: f"${field}" for field in fields}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": sample},
+    ]
+    return [row async for row in db[spec["collection"]].aggregate(pipeline, allowDiskUse=True)]
+
+
+async def _ensure_index(spec):
+    """Create one index; unique ones are checked for duplicate keys first."""
+    if spec["options"].get("unique"):
+        duplicates = await find_duplicates(spec)
+        if duplicates:
+            values = ", ".join(
+                "/".join(repr(value) for value in row["_id"].values()) + f" x{row['count']}" for row in duplicates
+            )
+            hint = spec.get("on_duplicates", "remove the duplicates and run `python -m app.migrate`")
+            raise ValueError(f"duplicate keys ({values}); {hint}")
+    return await db[spec["collection"]].create_index(spec["keys"], **spec["options"])
+
+
+async def create_indexes(force: bool = False):
+    """
+    Create every index in INDEXES for performance and constraint enforcement.
+
+    The registry's version is stored in the `migrations` collection once every
+    index was created, so later starts (and every other worker) skip the
+    round trips. Indexes are also recorded one by one, so when one can't be
+    built (e.g. duplicate keys) later runs retry only that one.
+    Returns True when indexes were (re)created.
     """
     global db
     if db is None:
         await connect_to_mongo()
 
-    print("[INDEX] Ensuring indexes...")
-
-    # 1. Students: Unique Roll Number
-    try:
-        await db["students"].create_index("roll", unique=True)
-        print("[INDEX] Created unique index on students.roll")
-    except Exception as e:
-        print("[INDEX] Error creating students.roll index:", e)
-
-    # 2. Attendance: (student_id + timestamp) for optimizing queries
-    # and preventing duplicates if we wanted strict unique constraint (but we do time-window check manually)
-    try:
-        await db["attendance"].create_index([("student_id", pymongo.ASCENDING), ("timestamp", pymongo.DESCENDING)])
-        print("[INDEX] Created compound index on attendance(student_id, timestamp)")
-    except Exception as e:
-        print("[INDEX] Error creating attendance index:", e)
-    
-    # 3. Users: Unique Username
-    try:
-        await db["users"].create_index("username", unique=True)
-        print("[INDEX] Created unique index on users.username")
-    except Exception as e:
-        print("[INDEX] Error creating users.username index:", e)
+    version = indexes_version()
+    applied = await db["migrations"].find_one({"_id": "indexes"}) or {}
+    if not force and applied.get("version") == version:
+        print(f"[INDEX] Indexes up to date (version {version})")
+        return False
+
+    done = set() if force else set(applied.get("applied", []))
+    pending = [spec for spec in INDEXES if _spec_hash(spec) not in done]
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(_ensure_index(spec) for spec in pending), return_exceptions=True)
+    failed = 0
+    for spec, result in zip(pending, results):
+        if isinstance(result, Exception):
+            failed += 1
+            print(f"[INDEX] Error creating index on {_index_label(spec)}:", result)
+        else:
+            done.add(_spec_hash(spec))
+
+    elapsed = (time.perf_counter() - started) * 1000
+    print(
+        f"[INDEX] Ensured {len(pending) - failed}/{len(pending)} indexes in {elapsed:.0f} ms "
+        f"({len(INDEXES) - len(pending)} already in place, version {version})"
+    )
+    update = {"applied": sorted(done & {_spec_hash(spec) for spec in INDEXES}), "applied_at": datetime.utcnow()}
+    if not failed:
+        update["version"] = version
+    await db["migrations"].update_one({"_id": "indexes"}, {"$set": update}, upsert=True)
+    return True
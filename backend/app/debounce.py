@@ -0,0 +1,138 @@
+"""
+Debounce engines for attendance marking.
+
+A camera reports the same face many times while a student walks past it,
+so an attendance mark is dropped when the same student was already marked
+within DEBOUNCE_SECONDS. Two engines are available (DEBOUNCE_MODE):
+
+ - "memory": the last accepted mark per student is kept in process.
+   A duplicate costs no query at all. Only correct with a single worker.
+ - "bucket": every mark carries a deterministic `dedup_key`
+   (student_id + time bucket) backed by a unique index, so the insert
+   itself rejects duplicates across any number of workers. Buckets are
+   aligned to the window, so two marks just either side of a bucket
+   boundary are both kept.
+"""
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from .core.config import settings
+
+EPOCH = datetime(1970, 1, 1)
+DUPLICATE_KEY_ERROR = 11000
+
+
+class MemoryDebouncer:
+    """In-process window keyed by student_id holding the last accepted mark."""
+
+    mode = "memory"
+
+    def __init__(self, window_seconds: int):
+        self.window = timedelta(seconds=window_seconds)
+        self.window_seconds = window_seconds
+        # student_id -> [latest event timestamp, serialized record, accepted at (monotonic)]
+        self._entries = OrderedDict()
+
+    def _evict(self):
+        cutoff = time.monotonic() - self.window_seconds
+        while self._entries:
+            _, entry = next(iter(self._entries.items()))
+            if entry[2] > cutoff:
+                break
+            self._entries.popitem(last=False)
+
+    def prepare(self, doc: dict):
+        """
+        Return the previously accepted record if `doc` is a duplicate.
+        Otherwise reserve the slot for `doc` and return None.
+
+        Check and reservation happen without awaiting, so two concurrent
+        marks for the same student on one event loop cannot both pass.
+        """
+        self._evict()
+        student_id = doc["student_id"]
+        entry = self._entries.get(student_id)
+        if entry is not None and entry[0] > doc["timestamp"] - self.window:
+            return entry[1]
+
+        record = serialize_record(doc)
+        latest = max(entry[0], doc["timestamp"]) if entry is not None else doc["timestamp"]
+        self._entries[student_id] = [latest, record, time.monotonic()]
+        self._entries.move_to_end(student_id)
+        return None
+
+    def accepted(self, doc: dict):
+        entry = self._entries.get(doc["student_id"])
+        if entry is not None and "_id" in doc:
+            entry[1]["id"] = str(doc["_id"])
+
+    def release(self, doc: dict):
+        """Forget a reservation whose insert failed."""
+        entry = self._entries.get(doc["student_id"])
+        if entry is not None and entry[1].get("timestamp") == doc["timestamp"]:
+            del self._entries[doc["student_id"]]
+
+    def is_duplicate_error(self, code) -> bool:
+        return False
+
+    async def find_existing(self, collection, doc: dict):
+        return None
+
+    def stats(self):
+        return {"mode": self.mode, "window_seconds": self.window_seconds, "tracked": len(self._entries)}
+
+
+class BucketDebouncer:
+    """Deterministic bucket key + unique index; the insert rejects duplicates."""
+
+    mode = "bucket"
+
+    def __init__(self, window_seconds: int):
+        self.window_seconds = window_seconds
+
+    def bucket_key(self, student_id, timestamp: datetime) -> str:
+        bucket = int((timestamp - EPOCH).total_seconds() // self.window_seconds)
+        return f"{student_id}:{bucket}"
+
+    def prepare(self, doc: dict):
+        doc["dedup_key"] = self.bucket_key(doc["student_id"], doc["timestamp"])
+        return None
+
+    def accepted(self, doc: dict):
+        pass
+
+    def release(self, doc: dict):
+        pass
+
+    def is_duplicate_error(self, code) -> bool:
+        return code == DUPLICATE_KEY_ERROR
+
+    async def find_existing(self, collection, doc: dict):
+        """Fetch the mark that won the bucket (only paid for duplicates)."""
+        existing = await collection.find_one({"dedup_key": doc["dedup_key"]})
+        return serialize_record(existing) if existing else None
+
+    def stats(self):
+        return {"mode": self.mode, "window_seconds": self.window_seconds}
+
+
+def serialize_record(doc: dict) -> dict:
+    record = {k: v for k, v in doc.items() if k not in ("_id", "dedup_key")}
+    if "_id" in doc:
+        record["id"] = str(doc["_id"])
+    record["student_id"] = str(doc["student_id"])
+    return record
+
+
+def create_debouncer(mode: str = None, window_seconds: int = None):
+    mode = mode or settings.DEBOUNCE_MODE
+    window_seconds = window_seconds or settings.DEBOUNCE_SECONDS
+    if mode == "memory":
+        return MemoryDebouncer(window_seconds)
+    if mode == "bucket":
+        return BucketDebouncer(window_seconds)
+    raise ValueError(f"Unknown DEBOUNCE_MODE: {mode}")
+
+
+debouncer = create_debouncer()
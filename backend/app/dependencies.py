@@ -0,0 +1,108 @@
+"""
+Authenticated-user dependency shared by the protected routers.
+
+Verifying a bearer token normally costs a JWT decode plus a `users`
+lookup. Both results are cached in process:
+
+ - validated tokens -> claims, each entry living no longer than the
+   token itself (and at most TOKEN_CACHE_TTL_SECONDS);
+ - subject -> user document, for USER_CACHE_TTL_SECONDS.
+
+Call `invalidate_user` when a user changes (role, deletion) and
+`invalidate_token` to revoke a token before it expires.
+"""
+import time
+
+from fastapi import Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+from jose import JWTError, jwt
+
+from .cache import TTLCache
+from .core.config import settings
+from .db import get_db
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
+
+token_cache = TTLCache(maxsize=settings.TOKEN_CACHE_SIZE, ttl=settings.TOKEN_CACHE_TTL_SECONDS)
+user_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS)
+
+USER_PROJECTION = {"hashed_password": 0}
+
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+
+def decode_token(token: str) -> dict:
+    """Return the claims of a valid token, decoding it only on a cache miss."""
+    claims = token_cache.get(token)
+    if claims is not None:
+        # Cached entries never outlive the token, but keep the check explicit
+        if claims["exp"] > time.time():
+            return claims
+        token_cache.invalidate(token)
+
+    try:
+        claims = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+    except JWTError:
+        raise credentials_exception
+
+    if not claims.get("sub") or not claims.get("exp"):
+        raise credentials_exception
+
+    token_cache.set(token, claims, ttl=claims["exp"] - time.time())
+    return claims
+
+
+async def load_user(db, subject: str):
+    """User document for a token subject (username, or email for Google logins)."""
+    user = user_cache.get(subject)
+    if user is not None:
+        return user
+
+    user = await db["users"].find_one(
+        {"$or": [{"username": subject}, {"email": subject}]}, USER_PROJECTION
+    )
+    if user is None:
+        return None
+
+    user["id"] = str(user.pop("_id"))
+    user_cache.set(subject, user)
+    return user
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db=Depends(get_db)):
+    """
+    FastAPI dependency returning the authenticated user, or raising 401.
+    """
+    return await authenticate(db, token)
+
+
+async def authenticate(db, token: str):
+    """Resolve a bearer token to its user; also used where Depends() can't read the header."""
+    if not settings.AUTH_REQUIRED:
+        return None
+    if not token:
+        raise credentials_exception
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    claims = decode_token(token)
+    user = await load_user(db, claims["sub"])
+    if user is None:
+        raise credentials_exception
+    return user
+
+
+def invalidate_user(*subjects):
+    """Drop cached user documents, e.g. after a role change or deletion."""
+    for subject in subjects:
+        if subject:
+            user_cache.invalidate(subject)
+
+
+def invalidate_token(token: str):
+    """Forget a validated token so the next request decodes it again."""
+    token_cache.invalidate(token)
@@ -0,0 +1,339 @@
+"""
+Background notification dispatcher.
+
+Request handlers only insert into the `notifications` collection, which is
+the persistent queue; a pool of NOTIFY_CONCURRENCY worker tasks delivers
+them:
+
+ 1. claim up to NOTIFY_BATCH_SIZE due messages for one provider (status
+    "pending", or "sending" with an expired lease after a crash), tagging
+    them with a claim id so concurrent workers and processes never share one;
+ 2. hand the batch to the provider's transport (one SMTP session per batch);
+ 3. mark successes "sent"; reschedule failures with exponential backoff,
+    and move messages that failed NOTIFY_MAX_ATTEMPTS times to
+    `notifications_dead`.
+
+Transports:
+ - "smtp": smtplib in a thread. For local testing run a stand-in server,
+           `python -m aiosmtpd -n -l localhost:8025`, with SMTP_PORT=8025.
+ - "log":  prints the message; for development.
+
+A daily job (NOTIFY_ABSENTEE_TIME, "HH:MM" local time) finds the day's
+absentees with a single aggregation and queues one alert per parent.
+
+Workers only start with NOTIFY_ENABLED=true; otherwise messages are queued
+and delivered once it is turned on.
+"""
+import asyncio
+import random
+import uuid
+from datetime import date, datetime, timedelta
+
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError
+
+from . import attendance_days
+from .core.config import settings
+
+QUEUE = "notifications"
+DEAD_LETTERS = "notifications_dead"
+
+
+# --- transports ---------------------------------------------------------------
+
+class SMTPTransport:
+    name = "smtp"
+
+    def _send_batch(self, messages):
+        # Imported here: most workers never send mail themselves
+        import smtplib
+        from email.message import EmailMessage
+
+        errors = []
+        with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT) as smtp:
+            if settings.SMTP_STARTTLS:
+                smtp.starttls()
+            if settings.SMTP_USERNAME:
+                smtp.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
+            for message in messages:
+                email = EmailMessage()
+                email["From"] = settings.SMTP_FROM
+                email["To"] = message["to"]
+                email["Subject"] = message["subject"]
+                email.set_content(message["body"])
+                try:
+                    smtp.send_message(email)
+                    errors.append(None)
+                except smtplib.SMTPException as e:
+                    errors.append(str(e))
+        return errors
+
+    async def send_batch(self, messages):
+        """Per-message error (None on success); raises when the server is unreachable."""
+        return await asyncio.to_thread(self._send_batch, messages)
+
+
+class LogTransport:
+    name = "log"
+
+    async def send_batch(self, messages):
+        for message in messages:
+            print(f"[NOTIFY] To {message['to']}: {message['subject']}")
+        return [None] * len(messages)
+
+
+TRANSPORTS = {transport.name: transport for transport in (SMTPTransport(), LogTransport())}
+
+
+# --- queue --------------------------------------------------------------------
+
+def backoff_seconds(attempts: int) -> float:
+    """Delay before retry number `attempts`, with jitter so retries don't stampede."""
+    delay = min(settings.NOTIFY_RETRY_BASE_SECONDS * 2 ** (attempts - 1), settings.NOTIFY_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+async def enqueue(db, messages):
+    """
+    Queue messages ({"to", "subject", "body", "provider", optional "dedup_key"}).
+    Messages whose dedup_key was already queued are skipped. Returns the
+    number queued.
+    """
+    if not messages:
+        return 0
+
+    now = datetime.utcnow()
+    docs = []
+    for message in messages:
+        provider = message.get("provider") or settings.NOTIFY_PROVIDER
+        if provider not in TRANSPORTS:
+            raise ValueError(f"Unknown notification provider: {provider}")
+        doc = {
+            "provider": provider,
+            "to": message["to"],
+            "subject": message["subject"],
+            "body": message["body"],
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        }
+        if message.get("dedup_key"):
+            doc["dedup_key"] = message["dedup_key"]
+        docs.append(doc)
+
+    try:
+        result = await db[QUEUE].insert_many(docs, ordered=False)
+        queued = len(result.inserted_ids)
+    except BulkWriteError as e:
+        queued = e.details.get("nInserted", 0)
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+    dispatcher.wake()
+    return queued
+
+
+class Dispatcher:
+    def __init__(self):
+        self._tasks = []
+        self._wake = None
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+
+    def wake(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _claim(self, db, provider: str):
+        now = datetime.utcnow()
+        due = {
+            "provider": provider,
+            "$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "sending", "lease_until": {"$lt": now}},
+            ],
+        }
+        ids = [
+            doc["_id"]
+            async for doc in db[QUEUE].find(due, {"_id": 1})
+            .sort("next_attempt_at", ASCENDING)
+            .limit(settings.NOTIFY_BATCH_SIZE)
+        ]
+        if not ids:
+            return []
+
+        claim = uuid.uuid4().hex
+        # Re-check `due` so a message another worker claimed meanwhile is skipped
+        await db[QUEUE].update_many(
+            {"_id": {"$in": ids}, **due},
+            {"$set": {
+                "status": "sending",
+                "claim": claim,
+                "lease_until": now + timedelta(seconds=settings.NOTIFY_LEASE_SECONDS),
+            }},
+        )
+        return [doc async for doc in db[QUEUE].find({"claim": claim})]
+
+    async def _settle(self, db, batch, errors):
+        now = datetime.utcnow()
+        sent = [message["_id"] for message, error in zip(batch, errors) if error is None]
+        if sent:
+            await db[QUEUE].update_many(
+                {"_id": {"$in": sent}},
+                {"$set": {"status": "sent", "sent_at": now}, "$unset": {"claim": "", "lease_until": ""}},
+            )
+            self.sent += len(sent)
+
+        for message, error in zip(batch, errors):
+            if error is None:
+                continue
+            attempts = message["attempts"] + 1
+            if attempts >= settings.NOTIFY_MAX_ATTEMPTS:
+                message.update({"status": "dead", "attempts": attempts, "last_error": error, "failed_at": now})
+                message.pop("claim", None)
+                message.pop("lease_until", None)
+                await db[DEAD_LETTERS].replace_one({"_id": message["_id"]}, message, upsert=True)
+                await db[QUEUE].delete_one({"_id": message["_id"]})
+                self.dead += 1
+                print(f"[NOTIFY] Dead-lettered {message['_id']} after {attempts} attempts: {error}")
+            else:
+                await db[QUEUE].update_one(
+                    {"_id": message["_id"]},
+                    {
+                        "$set": {
+                            "status": "pending",
+                            "attempts": attempts,
+                            "last_error": error,
+                            "next_attempt_at": now + timedelta(seconds=backoff_seconds(attempts)),
+                        },
+                        "$unset": {"claim": "", "lease_until": ""},
+                    },
+                )
+                self.retried += 1
+
+    async def _deliver(self, db, provider: str) -> int:
+        batch = await self._claim(db, provider)
+        if not batch:
+            return 0
+        try:
+            errors = await TRANSPORTS[provider].send_batch(batch)
+        except Exception as e:
+            print(f"[NOTIFY] {provider} batch of {len(batch)} failed: {e}")
+            errors = [str(e)] * len(batch)
+        await self._settle(db, batch, errors)
+        return len(batch)
+
+    async def _worker(self, db):
+        while True:
+            try:
+                delivered = 0
+                for provider in TRANSPORTS:
+                    delivered += await self._deliver(db, provider)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[NOTIFY] Worker error: {e}")
+                delivered = 0
+
+            if not delivered:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), settings.NOTIFY_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _absentee_schedule(self, db):
+        hour, minute = (int(part) for part in settings.NOTIFY_ABSENTEE_TIME.split(":"))
+        while True:
+            now = datetime.now()
+            run_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if run_at <= now:
+                run_at += timedelta(days=1)
+            await asyncio.sleep((run_at - now).total_seconds())
+            try:
+                queued = await queue_absentee_alerts(db, run_at.date())
+                print(f"[NOTIFY] Queued {queued} absentee alerts for {run_at.date()}")
+            except Exception as e:
+                print(f"[NOTIFY] Absentee job failed: {e}")
+
+    def start(self, db):
+        if self._tasks:
+            return
+        if not settings.NOTIFY_ENABLED:
+            print("[NOTIFY] Dispatcher disabled (NOTIFY_ENABLED=false); queued messages are kept")
+            return
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(db)) for _ in range(settings.NOTIFY_CONCURRENCY)]
+        if settings.NOTIFY_ABSENTEE_TIME:
+            self._tasks.append(asyncio.create_task(self._absentee_schedule(db)))
+        print(f"[NOTIFY] Dispatcher started with {settings.NOTIFY_CONCURRENCY} workers")
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self):
+        return {
+            "workers": settings.NOTIFY_CONCURRENCY if self._tasks else 0,
+            "sent": self.sent,
+            "retried": self.retried,
+            "dead": self.dead,
+        }
+
+
+dispatcher = Dispatcher()
+
+
+# --- daily absentee alerts -----------------------------------------------------
+
+def absentees_pipeline(day: date):
+    """
+    Students with a parent email and no non-"Absent" mark on `day`, in one
+    aggregation. The $lookup joins on (student_id, timestamp), served by
+    the attendance index, and stops at the first mark (MongoDB 5.0+). With
+    ATTENDANCE_LAYOUT=daily it is one day document per student instead.
+    """
+    start = datetime(day.year, day.month, day.day)
+    if attendance_days.enabled():
+        marks = attendance_days.latest_mark_lookup(start, exclude_status="Absent")
+    else:
+        marks = {"$lookup": {
+            "from": "attendance",
+            "localField": "_id",
+            "foreignField": "student_id",
+            "pipeline": [
+                {"$match": {
+                    "timestamp": {"$gte": start, "$lt": start + timedelta(days=1)},
+                    "status": {"$ne": "Absent"},
+                }},
+                {"$limit": 1},
+                {"$project": {"_id": 1}},
+            ],
+            "as": "marks",
+        }}
+    return [
+        {"$match": {"parent_email": {"$nin": [None, ""]}}},
+        marks,
+        {"$match": {"marks": {"$size": 0}}},
+        {"$project": {"name": 1, "roll": 1, "class_name": 1, "parent_email": 1}},
+    ]
+
+
+async def queue_absentee_alerts(db, day: date = None):
+    """Queue one alert per absent student; safe to run twice for the same day."""
+    day = day or date.today()
+    messages = []
+    async for student in db["students"].aggregate(absentees_pipeline(day)):
+        messages.append({
+            "to": student["parent_email"],
+            "subject": f"Absence alert: {student['name']} ({student['roll']})",
+            "body": (
+                f"{student['name']} (roll {student['roll']}, class {student.get('class_name', '-')}) "
+                f"was not marked present on {day.isoformat()}."
+            ),
+            "dedup_key": f"absent:{day.isoformat()}:{student['_id']}",
+        })
+    return await enqueue(db, messages)
@@ -0,0 +1,306 @@
+"""
+In-memory face-embedding index for server-side recognition.
+
+Every enrolled embedding is L2-normalized and kept as one row of a float32
+matrix, so cosine similarity for a whole batch of probe faces is a single
+matrix multiply (probes @ matrix.T) followed by an argmax per row.
+
+The index is updated incrementally as embeddings are added or removed.
+A snapshot (matrix.npy + meta.json in one directory, selected by a CURRENT
+file) can be written to disk and re-opened memory-mapped, so a new worker
+starts without re-reading every student. Staleness across workers is
+tracked with a generation counter kept in the `stats` collection: every
+embedding or roll/name change bumps it, and a worker whose local
+generation differs rebuilds from MongoDB.
+"""
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from pymongo import ReturnDocument
+
+from .core.config import settings
+from .stats import STATS_ID
+
+GENERATION_FIELD = "face_index_generation"
+SNAPSHOT_PREFIX = "snapshot-"
+
+
+class _LazyNumpy:
+    """Imports numpy on first use, so workers that never recognize a face don't pay for it."""
+
+    def __getattr__(self, name):
+        global np
+        import numpy
+
+        np = numpy
+        return getattr(numpy, name)
+
+
+np = _LazyNumpy()
+
+
+def normalize(vectors) -> "np.ndarray":
+    """L2-normalize rows; raises ValueError on a wrong width or a zero vector."""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    if matrix.ndim != 2 or matrix.shape[1] != settings.FACE_EMBEDDING_DIM:
+        raise ValueError(f"Embeddings must have {settings.FACE_EMBEDDING_DIM} dimensions")
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    if not np.all(norms > 0):
+        raise ValueError("Embeddings must not be zero vectors")
+    return matrix / norms
+
+
+class FaceIndex:
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._matrix = None  # allocated on first insert or snapshot load
+        self._count = 0
+        self._ids = []
+        self._meta = []  # (roll, name) per row
+        self._rows = {}  # student_id -> row
+        self.generation = None
+        self.loaded = False
+        self._synced_at = 0.0
+        self._lock = None
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def lock(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    # --- mutation (callers hold `lock`) -----------------------------------
+
+    def _writable(self, capacity: int):
+        """Ensure an owned, writable matrix with room for `capacity` rows."""
+        current = self._matrix.shape[0] if self._matrix is not None else 0
+        if current >= capacity and self._matrix.flags.writeable:
+            return
+        new_capacity = max(capacity, 2 * current, 1024)
+        grown = np.empty((new_capacity, self.dim), dtype=np.float32)
+        if self._count:
+            grown[: self._count] = self._matrix[: self._count]
+        self._matrix = grown
+
+    def _set(self, student_id: str, roll: str, name: str, vector: "np.ndarray"):
+        row = self._rows.get(student_id)
+        if row is None:
+            self._writable(self._count + 1)
+            row = self._count
+            self._count += 1
+            self._ids.append(student_id)
+            self._meta.append((roll, name))
+            self._rows[student_id] = row
+        else:
+            self._writable(self._count)
+            self._meta[row] = (roll, name)
+        self._matrix[row] = vector
+
+    def _remove(self, student_id: str):
+        row = self._rows.pop(student_id, None)
+        if row is None:
+            return
+        self._writable(self._count)
+        last = self._count - 1
+        if row != last:
+            # Move the last row into the hole so the matrix stays dense
+            self._matrix[row] = self._matrix[last]
+            self._ids[row] = self._ids[last]
+            self._meta[row] = self._meta[last]
+            self._rows[self._ids[row]] = row
+        self._ids.pop()
+        self._meta.pop()
+        self._count -= 1
+
+
+    # --- search -------------------------------------------------------------
+
+    def _search(self, probes: "np.ndarray", threshold: float):
+        if self._count == 0:
+            return [None] * len(probes)
+
+        scores = probes @ self._matrix[: self._count].T
+        best_rows = np.argmax(scores, axis=1)
+        best_scores = scores[np.arange(len(probes)), best_rows]
+
+        matches = []
+        for row, score in zip(best_rows.tolist(), best_scores.tolist()):
+            roll, name = self._meta[row]
+            matches.append({
+                "student_id": self._ids[row],
+                "roll": roll,
+                "name": name,
+                "score": round(score, 4),
+                "matched": score >= threshold,
+            })
+        return matches
+
+    async def search(self, embeddings, threshold: float = None):
+        """Best match for each embedding, scored in one matrix multiply off the event loop."""
+        probes = normalize(embeddings)
+        threshold = settings.FACE_MATCH_THRESHOLD if threshold is None else threshold
+        async with self.lock:
+            return await asyncio.to_thread(self._search, probes, threshold)
+
+    # --- snapshots ----------------------------------------------------------
+
+    def save_snapshot(self, path: str):
+        """
+        Write matrix and metadata into a new directory under `path`, then
+        point CURRENT at it with one atomic replace. Workers persisting at
+        the same time each write their own directory, so a reader never
+        pairs one worker's matrix with another's ids.
+        """
+        os.makedirs(path, exist_ok=True)
+        target = tempfile.mkdtemp(prefix=SNAPSHOT_PREFIX, dir=path)
+        matrix = self._matrix[: self._count] if self._matrix is not None else np.empty((0, self.dim), np.float32)
+        np.save(os.path.join(target, "matrix.npy"), np.ascontiguousarray(matrix))
+        with open(os.path.join(target, "meta.json"), "w") as f:
+            json.dump({"generation": self.generation, "ids": self._ids, "meta": self._meta}, f)
+
+        fd, pointer = tempfile.mkstemp(prefix="CURRENT.", suffix=".tmp", dir=path)
+        with os.fdopen(fd, "w") as f:
+            f.write(os.path.basename(target))
+        os.replace(pointer, os.path.join(path, "CURRENT"))
+
+        # Drop superseded snapshots; a young one may still be about to become CURRENT
+        for entry in os.listdir(path):
+            old = os.path.join(path, entry)
+            if entry.startswith(SNAPSHOT_PREFIX) and old != target and time.time() - os.path.getmtime(old) > 60:
+                shutil.rmtree(old, ignore_errors=True)
+
+    def load_snapshot(self, path: str) -> bool:
+        """Open the CURRENT snapshot memory-mapped (read-only until the first change)."""
+        try:
+            with open(os.path.join(path, "CURRENT")) as f:
+                target = os.path.join(path, f.read().strip())
+            with open(os.path.join(target, "meta.json")) as f:
+                meta = json.load(f)
+            matrix = np.load(os.path.join(target, "matrix.npy"), mmap_mode="r")
+        except (OSError, ValueError):
+            return False
+        if matrix.ndim != 2 or matrix.shape[1] != self.dim or matrix.shape[0] != len(meta["ids"]):
+            return False
+
+        self._matrix = matrix
+        self._count = matrix.shape[0]
+        self._ids = list(meta["ids"])
+        self._meta = [tuple(m) for m in meta["meta"]]
+        self._rows = {student_id: row for row, student_id in enumerate(self._ids)}
+        self.generation = meta["generation"]
+        return True
+
+    # --- MongoDB synchronisation ---------------------------------------------
+
+    async def _rebuild(self, db, generation):
+        self._matrix = None
+        self._count = 0
+        self._ids, self._meta, self._rows = [], [], {}
+
+        cursor = db["students"].find(
+            {"embedding": {"$type": "array"}}, {"roll": 1, "name": 1, "embedding": 1}
+        ).batch_size(1000)
+        async for student in cursor:
+            try:
+                vector = normalize(student["embedding"])[0]
+            except ValueError:
+                continue
+            self._set(str(student["_id"]), student.get("roll"), student.get("name"), vector)
+        self.generation = generation
+        print(f"[FACE INDEX] Rebuilt from MongoDB: {self._count} embeddings")
+
+    async def sync(self, db, force: bool = False):
+        """
+        Make sure the index reflects MongoDB. Cheap when nothing changed: at most
+        one stats lookup every FACE_INDEX_SYNC_SECONDS.
+        """
+        if not force and self.loaded and time.monotonic() - self._synced_at < settings.FACE_INDEX_SYNC_SECONDS:
+            return
+
+        counters = await db["stats"].find_one({"_id": STATS_ID}, {GENERATION_FIELD: 1}) or {}
+        generation = counters.get(GENERATION_FIELD, 0)
+
+        async with self.lock:
+            if not self.loaded:
+                path = settings.FACE_INDEX_SNAPSHOT_PATH
+                if path and self.load_snapshot(path) and self.generation == generation:
+                    print(f"[FACE INDEX] Loaded snapshot: {self._count} embeddings")
+                self.loaded = True
+
+            if self.generation != generation:
+                await self._rebuild(db, generation)
+                if settings.FACE_INDEX_SNAPSHOT_PATH:
+                    await asyncio.to_thread(self.save_snapshot, settings.FACE_INDEX_SNAPSHOT_PATH)
+
+        self._synced_at = time.monotonic()
+
+    async def persist(self):
+        """Write a snapshot of the current index, e.g. on shutdown."""
+        if not (self.loaded and settings.FACE_INDEX_SNAPSHOT_PATH and self.generation is not None):
+            return
+        async with self.lock:
+            await asyncio.to_thread(self.save_snapshot, settings.FACE_INDEX_SNAPSHOT_PATH)
+
+    async def _bump_generation(self, db):
+        counters = await db["stats"].find_one_and_update(
+            {"_id": STATS_ID},
+            {"$inc": {GENERATION_FIELD: 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        generation = counters[GENERATION_FIELD]
+        # Only adopt the new generation if no other worker changed anything meanwhile
+        if self.generation is not None and generation == self.generation + 1:
+            self.generation = generation
+
+    async def upsert(self, db, student_id: str, roll: str, name: str, embedding):
+        """Add or replace one student's embedding (already stored on the document)."""
+        vector = normalize(embedding)[0]
+        async with self.lock:
+            if self.loaded:
+                self._set(student_id, roll, name, vector)
+        await self._bump_generation(db)
+
+    async def update_meta(self, db, changes: dict):
+        """
+        Apply roll/name changes ({student_id: (roll, name)}) of students
+        with embeddings. Bumps the generation like an embedding change, so
+        other workers and the snapshot stop matching faces to a stale roll.
+        """
+        if not changes:
+            return
+        async with self.lock:
+            if self.loaded:
+                for student_id, (roll, name) in changes.items():
+                    row = self._rows.get(student_id)
+                    if row is not None:
+                        self._meta[row] = (roll, name)
+        await self._bump_generation(db)
+
+    async def remove(self, db, student_id: str):
+        async with self.lock:
+            if self.loaded:
+                self._remove(student_id)
+        await self._bump_generation(db)
+
+    def stats(self):
+        return {
+            "loaded": self.loaded,
+            "embeddings": self._count,
+            "dim": self.dim,
+            "generation": self.generation,
+            "memory_mapped": self._matrix is not None and isinstance(self._matrix, np.memmap),
+        }
+
+
+face_index = FaceIndex(settings.FACE_EMBEDDING_DIM)
@@ -0,0 +1,220 @@
+"""
+Live attendance feed: push accepted marks to dashboards instead of having
+them poll /api/attendance/today.
+
+Every accepted record is encoded to JSON once and fanned out to per-client
+bounded queues. A client that falls FEED_SUBSCRIBER_QUEUE events behind is
+evicted rather than buffered without limit; it reconnects with the last
+event id it saw and resumes from there.
+
+Sources (FEED_SOURCE):
+ - "local":        records written by this worker (attendance write path)
+ - "changestream": a MongoDB change stream on `attendance`, so every worker
+                   sees every insert; needs a replica set
+
+Event ids are attendance record ids. Resuming replays from the in-memory
+ring of the last FEED_REPLAY_SIZE events, or from MongoDB (`_id` order)
+when the id is older than that or came from another worker. With
+ATTENDANCE_LAYOUT=daily the change stream watches `attendance_days` and
+MongoDB replay reads day documents from the resume point's day onwards.
+"""
+import asyncio
+from collections import OrderedDict
+
+import orjson
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import PyMongoError
+
+from . import attendance_days
+from .core.config import settings
+from .serialization import ATTENDANCE_PROJECTION, to_jsonable
+
+
+class FeedEvicted(Exception):
+    pass
+
+
+class Subscription:
+    def __init__(self, maxsize: int):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.evicted = False
+
+
+def _encode(doc: dict):
+    """(event id, JSON payload) for an attendance document."""
+    record = {key: doc[key] for key in ATTENDANCE_PROJECTION if key in doc}
+    record["_id"] = doc["_id"]
+    record = to_jsonable(record)
+    return record["id"], orjson.dumps(record).decode()
+
+
+class AttendanceFeed:
+    def __init__(self, source: str, replay_size: int, subscriber_queue: int):
+        self.source = source
+        self.subscriber_queue = subscriber_queue
+        self.replay_size = replay_size
+        self._subscribers = set()
+        self._recent = OrderedDict()  # event id -> payload, oldest first
+        self._watcher = None
+        self.published = 0
+        self.evicted = 0
+
+    # --- publishing ------------------------------------------------------------
+
+    def publish(self, docs):
+        for doc in docs:
+            event = _encode(doc)
+            self._recent[event[0]] = event[1]
+            while len(self._recent) > self.replay_size:
+                self._recent.popitem(last=False)
+            self.published += 1
+
+            for subscription in list(self._subscribers):
+                try:
+                    subscription.queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    self._evict(subscription)
+
+    def publish_written(self, docs):
+        """Called from the attendance write path; a change stream publishes instead."""
+        if self.source == "local":
+            self.publish(docs)
+
+    def _evict(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+        subscription.evicted = True
+        self.evicted += 1
+        # Drop the backlog and wake the reader so it notices right away
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+    # --- subscribing -------------------------------------------------------------
+
+    async def _replay(self, db, last_event_id: str):
+        if last_event_id in self._recent:
+            ids = list(self._recent)
+            start = ids.index(last_event_id) + 1
+            return [(event_id, self._recent[event_id]) for event_id in ids[start:]]
+
+        try:
+            after = ObjectId(last_event_id)
+        except (InvalidId, TypeError):
+            return []
+        if attendance_days.enabled():
+            since = attendance_days.day_of(after.generation_time)
+            pipeline = attendance_days.flat_pipeline({"date": {"$gte": since}}, {"_id": {"$gt": after}})
+            pipeline += [{"$sort": {"_id": 1}}, {"$limit": self.replay_size}]
+            cursor = db[attendance_days.DAYS].aggregate(pipeline)
+        else:
+            cursor = (
+                db["attendance"]
+                .find({"_id": {"$gt": after}}, ATTENDANCE_PROJECTION)
+                .sort("_id", 1)
+                .limit(self.replay_size)
+            )
+        return [_encode(doc) async for doc in cursor]
+
+    async def events(self, db, last_event_id: str = None):
+        """
+        Yield (event id, JSON payload) for every new record, after replaying
+        what the client missed since `last_event_id`. Yields None as a
+        heartbeat every FEED_HEARTBEAT_SECONDS; raises FeedEvicted when the
+        client is too slow.
+        """
+        subscription = Subscription(self.subscriber_queue)
+        # Subscribe before replaying so nothing published meanwhile is lost
+        self._subscribers.add(subscription)
+        try:
+            replayed = set()
+            if last_event_id:
+                for event in await self._replay(db, last_event_id):
+                    replayed.add(event[0])
+                    yield event
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), settings.FEED_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event is None:
+                    raise FeedEvicted()
+                if event[0] in replayed:
+                    replayed.discard(event[0])
+                    continue
+                yield event
+        finally:
+            self._subscribers.discard(subscription)
+
+    # --- change stream source ---------------------------------------------------
+
+    @staticmethod
+    def _pushed_events(change):
+        """
+        Flat records for the events a change to a day document appended.
+        A $push shows up as `events.<n>`; a rewrite of the whole array (the
+        archive's $filter) or of one event's fields is not a new mark.
+        """
+        day = change["fullDocument"]
+        if day is None:
+            return []
+        if change["operationType"] == "insert":
+            events = day.get("events", [])
+        else:
+            updated = change["updateDescription"]["updatedFields"]
+            events = [
+                value for key, value in updated.items()
+                if key.startswith("events.") and key[len("events."):].isdigit()
+            ]
+        return [attendance_days.flatten(day, event) for event in events]
+
+    async def _watch(self, db):
+        resume_token = None
+        delay = 1
+        daily = attendance_days.enabled()
+        collection = attendance_days.DAYS if daily else "attendance"
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update"]} if daily else "insert"}}]
+        options = {"full_document": "updateLookup"} if daily else {}
+        while True:
+            try:
+                async with db[collection].watch(pipeline, resume_after=resume_token, **options) as stream:
+                    print(f"[FEED] Watching {collection} change stream")
+                    delay = 1
+                    async for change in stream:
+                        resume_token = change["_id"]
+                        try:
+                            self.publish(self._pushed_events(change) if daily else [change["fullDocument"]])
+                        except Exception as e:
+                            # One odd change must not stop the feed for everyone
+                            print(f"[FEED] Skipped change {change.get('documentKey')}: {e!r}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                kind = "Change stream error" if isinstance(e, PyMongoError) else "Unexpected change stream error"
+                print(f"[FEED] {kind}, retrying in {delay}s: {e!r}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    def start(self, db):
+        if self.source == "changestream" and self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch(db))
+
+    async def close(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+
+    def stats(self):
+        return {
+            "source": self.source,
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "evicted": self.evicted,
+            "replay_buffer": len(self._recent),
+        }
+
+
+feed = AttendanceFeed(settings.FEED_SOURCE, settings.FEED_REPLAY_SIZE, settings.FEED_SUBSCRIBER_QUEUE)
@@ -0,0 +1,196 @@
+"""
+Camera frame ingestion.
+
+Raw JPEG frames are queued on a bounded asyncio queue and preprocessed in a
+process pool, so image decoding never runs on the event loop:
+
+    queue -> decode (Pillow, JPEG draft mode) -> face crop -> resize to
+    FRAME_FACE_SIZE -> normalize to float32 [-1, 1] -> FRAME_EMBEDDER
+
+Face boxes come from the camera ([left, top, right, bottom] in frame pixels);
+a frame without boxes is treated as a single face, center-cropped to a
+square. The embeddings are matched against the face index and written by the
+caller (see attendance.ingest_frames).
+
+When the queue is full, `submit` raises FrameQueueFull instead of waiting,
+so a burst at bell time turns into 429s rather than unbounded memory.
+"""
+import asyncio
+import importlib
+import io
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .core.config import settings
+from .monitoring import LatencyStats
+
+
+class FrameQueueFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Frame queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+# --- worker process ------------------------------------------------------------
+
+_embedders = {}
+
+
+def _load_embedder(path: str):
+    if path not in _embedders:
+        module_name, _, attr = path.partition(":")
+        _embedders[path] = getattr(importlib.import_module(module_name), attr)
+    return _embedders[path]
+
+
+def _square(box, width, height):
+    """Clamp a [left, top, right, bottom] box to the frame and make it square."""
+    left, top, right, bottom = box
+    side = max(right - left, bottom - top)
+    cx, cy = (left + right) / 2, (top + bottom) / 2
+    side = min(side, width, height)
+    left = min(max(cx - side / 2, 0), width - side)
+    top = min(max(cy - side / 2, 0), height - side)
+    return (int(left), int(top), int(left + side), int(top + side))
+
+
+def preprocess_frame(data: bytes, boxes, size: int, embedder: str):
+    """
+    Runs in a worker process. Returns (embeddings or None, face count, timings in ms).
+    Raises ValueError when `data` is not an image Pillow can read.
+    """
+    import numpy as np
+    from PIL import Image, ImageOps
+
+    timings = {}
+    started = time.perf_counter()
+    try:
+        image = Image.open(io.BytesIO(data))
+        width, height = image.size
+        boxes = [_square(box, width, height) for box in boxes] if boxes else [_square((0, 0, width, height), width, height)]
+
+        # Let the JPEG decoder downscale by 1/2..1/8 while the smallest face stays >= size
+        smallest = min(box[2] - box[0] for box in boxes)
+        scale = min(1.0, size / max(smallest, 1))
+        image.draft("RGB", (math.ceil(width * scale), math.ceil(height * scale)))
+        image = image.convert("RGB")
+    except Exception as e:
+        raise ValueError(f"Unreadable frame: {e}")
+    timings["decode"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    ratio = image.size[0] / width
+    crops = np.empty((len(boxes), size, size, 3), dtype=np.float32)
+    for i, box in enumerate(boxes):
+        face = image.crop(tuple(round(v * ratio) for v in box))
+        face = face.resize((size, size), Image.BILINEAR)
+        crops[i] = np.asarray(face, dtype=np.float32)
+    crops -= 127.5
+    crops /= 128.0
+    timings["preprocess"] = (time.perf_counter() - started) * 1000
+
+    if not embedder:
+        return None, len(boxes), timings
+
+    started = time.perf_counter()
+    embeddings = np.asarray(_load_embedder(embedder)(crops), dtype=np.float32)
+    timings["embed"] = (time.perf_counter() - started) * 1000
+    return embeddings, len(boxes), timings
+
+
+# --- event loop side --------------------------------------------------------------
+
+class FramePipeline:
+    def __init__(self, queue_size: int, workers: int):
+        self.queue_size = queue_size
+        self.workers = workers
+        self.latency = LatencyStats()
+        self.frames = 0
+        self.rejected = 0
+        self.failed = 0
+        self._queue = None
+        self._tasks = []
+        self._pool = None
+
+    def _start(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            # One consumer per worker process keeps every process busy, no more
+            self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained."""
+        per_frame = (self.latency.mean("decode") + self.latency.mean("preprocess") + self.latency.mean("embed")) / 1000
+        return max(1, math.ceil(self.depth() * per_frame / self.workers))
+
+    def check_capacity(self, frames: int = 1):
+        """Raise FrameQueueFull unless `frames` more frames fit on the queue."""
+        self._start()
+        if self.queue_size - self._queue.qsize() < frames:
+            self.rejected += frames
+            raise FrameQueueFull(self.retry_after())
+
+    def submit(self, frames):
+        """
+        Enqueue [(jpeg bytes, boxes), ...] all-or-nothing and return one
+        future per frame resolving to (embeddings, face count).
+        """
+        self.check_capacity(len(frames))
+        loop = asyncio.get_running_loop()
+        futures = []
+        for data, boxes in frames:
+            future = loop.create_future()
+            self._queue.put_nowait((data, boxes, future, time.perf_counter()))
+            futures.append(future)
+        return futures
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            data, boxes, future, queued_at = await self._queue.get()
+            self.latency.record("queue_wait", (time.perf_counter() - queued_at) * 1000)
+            try:
+                embeddings, faces, timings = await loop.run_in_executor(
+                    self._pool, preprocess_frame, data, boxes, settings.FRAME_FACE_SIZE, settings.FRAME_EMBEDDER
+                )
+            except Exception as e:
+                self.failed += 1
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                self.frames += 1
+                for stage, ms in timings.items():
+                    self.latency.record(stage, ms)
+                if not future.done():
+                    future.set_result((embeddings, faces))
+            finally:
+                self._queue.task_done()
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        self._queue = None
+
+    def stats(self):
+        return {
+            "queue_depth": self.depth(),
+            "queue_size": self.queue_size,
+            "workers": self.workers,
+            "frames": self.frames,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "latency": self.latency.stats(),
+        }
+
+
+frame_pipeline = FramePipeline(settings.FRAME_QUEUE_SIZE, settings.FRAME_PROCESS_WORKERS)
@@ -0,0 +1,158 @@
+"""
+Google ID token verification that never blocks the event loop.
+
+google.oauth2.id_token.verify_oauth2_token fetches Google's signing certs
+with a synchronous HTTP call on every login. GoogleTokenVerifier keeps the
+certs in memory for as long as their Cache-Control max-age allows, refreshes
+them in the background shortly before they expire, and checks signatures
+in a worker thread. A token signed with a key id the cache doesn't know
+yet (Google rotated keys before max-age ran out) triggers one refetch, at
+most every `kid_refetch_interval` seconds.
+
+The certs URL is configurable (GOOGLE_CERTS_URL), so a local stub key server
+serving certs for a test key pair can stand in for Google.
+"""
+import asyncio
+import base64
+import binascii
+import json
+import re
+import time
+import urllib.request
+
+from .core.config import settings
+
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+def _fetch_certs(url: str, timeout: float):
+    """Blocking fetch; returns (certs, max_age_seconds or None)."""
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        certs = json.loads(response.read().decode("utf-8"))
+        match = _MAX_AGE.search(response.headers.get("Cache-Control", ""))
+    return certs, int(match.group(1)) if match else None
+
+
+def _key_id(token: str):
+    """`kid` from the token header without verifying anything, or None."""
+    try:
+        header = token.split(".", 1)[0]
+        header = json.loads(base64.urlsafe_b64decode(header + "=" * (-len(header) % 4)))
+        return header.get("kid") if isinstance(header, dict) else None
+    except (ValueError, binascii.Error):
+        return None
+
+
+def _decode(token: str, certs: dict, audience: str, clock_skew: int):
+    # Imported lazily: google.auth is only needed once a Google login happens
+    from google.auth import jwt
+
+    return jwt.decode(token, certs=certs, audience=audience, clock_skew_in_seconds=clock_skew)
+
+
+class GoogleTokenVerifier:
+    def __init__(
+        self,
+        audience: str,
+        certs_url: str = None,
+        default_max_age: int = None,
+        refresh_margin: int = 60,
+        fetch_timeout: float = 5.0,
+        clock_skew: int = 10,
+        kid_refetch_interval: float = 30.0,
+    ):
+        self.audience = audience
+        self.certs_url = certs_url or settings.GOOGLE_CERTS_URL
+        self.default_max_age = default_max_age or settings.GOOGLE_CERTS_DEFAULT_MAX_AGE
+        self.refresh_margin = refresh_margin
+        self.fetch_timeout = fetch_timeout
+        self.clock_skew = clock_skew
+        self.kid_refetch_interval = kid_refetch_interval
+
+        self._certs = None
+        self._expires_at = 0.0
+        self._fetched_at = None
+        self._lock = None
+        self._refresh_task = None
+        self.fetches = 0
+
+    async def _refresh(self):
+        certs, max_age = await asyncio.to_thread(_fetch_certs, self.certs_url, self.fetch_timeout)
+        self._certs = certs
+        self._fetched_at = time.monotonic()
+        self._expires_at = self._fetched_at + (max_age if max_age is not None else self.default_max_age)
+        self.fetches += 1
+        return certs
+
+    async def get_certs(self):
+        """Cached certs; concurrent callers share a single fetch when they expire."""
+        if self._certs is not None and time.monotonic() < self._expires_at:
+            return self._certs
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._certs is not None and time.monotonic() < self._expires_at:
+                return self._certs
+            certs = await self._refresh()
+
+        self._ensure_background_refresh()
+        return certs
+
+    async def _refetch_for(self, kid: str):
+        """Refetch for a key id the cache doesn't have; rate limited so bogus ids can't hammer Google."""
+        async with self._lock:
+            if kid in self._certs or time.monotonic() - self._fetched_at < self.kid_refetch_interval:
+                return self._certs
+            print(f"[GOOGLE] Unknown key id {kid}, refetching signing certs")
+            return await self._refresh()
+
+    def _ensure_background_refresh(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        """Refetch `refresh_margin` seconds before expiry so logins never wait on it."""
+        while True:
+            delay = max(self._expires_at - time.monotonic() - self.refresh_margin, 1.0)
+            await asyncio.sleep(delay)
+            try:
+                await self._refresh()
+            except Exception as e:
+                # Keep serving the cached certs; get_certs refetches once they expire
+                print(f"[GOOGLE] Error refreshing signing certs: {str(e)}")
+                await asyncio.sleep(self.refresh_margin / 2)
+
+    async def verify(self, token: str) -> dict:
+        """
+        Verify signature, audience, expiry and issuer of a Google ID token.
+        Raises ValueError when the token is invalid.
+        """
+        certs = await self.get_certs()
+        kid = _key_id(token)
+        if kid is not None and kid not in certs:
+            certs = await self._refetch_for(kid)
+        claims = await asyncio.to_thread(_decode, token, certs, self.audience, self.clock_skew)
+        if claims.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError(f"Wrong issuer: {claims.get('iss')}")
+        return claims
+
+    async def close(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    def stats(self):
+        return {
+            "cached": self._certs is not None,
+            "expires_in": max(round(self._expires_at - time.monotonic()), 0) if self._certs else 0,
+            "fetches": self.fetches,
+        }
+
+
+google_verifier = GoogleTokenVerifier(audience=settings.GOOGLE_CLIENT_ID)
@@ -1,11 +1,25 @@
-from fastapi import FastAPI
+import sys
+
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .core.config import settings
 from .db import connect_to_mongo, close_mongo_connection, get_db
-from . import auth, students, attendance, classes, analytics, notifications
-from . import auth_google
-from .utils import get_password_hash
-from .models import UserModel
+from . import auth, auth_google, students, attendance, classes, analytics, notifications, archive
+from .debounce import debouncer
+from .photos import shutdown_process_pool
+from .face_index import face_index
+from .frames import frame_pipeline
+from .feed import feed
+from .writer import attendance_writer
+from .dispatcher import dispatcher
+from .monitoring import pool_listeners, slow_query_listener
+from .dependencies import get_current_user, token_cache, user_cache
+
+
+def _loaded(module: str):
+    """An app submodule if something already imported it, else None."""
+    return sys.modules.get(f"{__package__}.{module}")
+
 
 app = FastAPI(
     title="FaceSense API",
@@ -32,9 +46,13 @@ async def startup_event():
     await connect_to_mongo()
     print("[STARTUP] Connected to MongoDB")
     
-    # Create Indexes for Scalability
-    from .db import create_indexes
-    await create_indexes()
+    # Create Indexes for Scalability (or run `python -m app.migrate` once per deploy)
+    if settings.CREATE_INDEXES_ON_STARTUP:
+        from .db import create_indexes
+        await create_indexes()
+
+    feed.start(await get_db())
+    dispatcher.start(await get_db())
 
 
 # --------------------------------------------------------
@@ -43,6 +61,16 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     print("[SHUTDOWN] Shutting down FaceSense API...")
+    # Drain buffered attendance writes while MongoDB is still connected
+    await attendance_writer.close()
+    google = _loaded("google_verifier")
+    if google:
+        await google.google_verifier.close()
+    shutdown_process_pool()
+    await frame_pipeline.close()
+    await feed.close()
+    await dispatcher.close()
+    await face_index.persist()
     await close_mongo_connection()
     print("[SHUTDOWN] MongoDB connection closed")
 
@@ -64,16 +92,39 @@ def health():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", dependencies=[Depends(get_current_user)])
+def metrics():
+    google = _loaded("google_verifier")
+    return {
+        "student_cache": students.student_cache.stats(),
+        "debounce": debouncer.stats(),
+        "analytics_cache": analytics.range_cache.stats(),
+        "google_certs": google.google_verifier.stats() if google else None,
+        "token_cache": token_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "face_index": face_index.stats(),
+        "frames": frame_pipeline.stats(),
+        "feed": feed.stats(),
+        "attendance_writer": attendance_writer.stats(),
+        "notifications": dispatcher.stats(),
+        "archive": archive.manifest.stats(),
+        "mongo_pools": {name: listener.stats() for name, listener in pool_listeners.items()},
+        "slow_queries": slow_query_listener.stats() if slow_query_listener else None,
+    }
+
+
 # --------------------------------------------------------
 # 📌 Routers
 # --------------------------------------------------------
 app.include_router(auth.router, prefix="/api/auth", tags=["Auth"])
 app.include_router(auth_google.router, prefix="/api/auth", tags=["Auth"])
-app.include_router(students.router, prefix="/api/students", tags=["Students"])
-app.include_router(attendance.router, prefix="/api/attendance", tags=["Attendance"])
-app.include_router(classes.router, prefix="/api/classes", tags=["Classes"])
-app.include_router(analytics.router, prefix="/api/analytics", tags=["Analytics"])
-app.include_router(notifications.router, prefix="/api/notifications", tags=["Notifications"])
+protected = [Depends(get_current_user)]
+app.include_router(students.router, prefix="/api/students", tags=["Students"], dependencies=protected)
+app.include_router(attendance.router, prefix="/api/attendance", tags=["Attendance"], dependencies=protected)
+app.include_router(attendance.stream_router, prefix="/api/attendance", tags=["Attendance"])
+app.include_router(classes.router, prefix="/api/classes", tags=["Classes"], dependencies=protected)
+app.include_router(analytics.router, prefix="/api/analytics", tags=["Analytics"], dependencies=protected)
+app.include_router(notifications.router, prefix="/api/notifications", tags=["Notifications"], dependencies=protected)
 
 
 # --------------------------------------------------------
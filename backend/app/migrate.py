@@ -0,0 +1,59 @@
+"""
+One-shot schema setup, run once per deploy instead of in every worker:
+
+    python -m app.migrate            # create indexes unless the stored version matches
+    python -m app.migrate --force    # create them regardless
+    python -m app.migrate --check    # exit 1 when indexes are out of date
+    python -m app.migrate --attendance-days   # copy attendance into day documents
+    python -m app.migrate --dedupe-classes    # merge same-named classes, then create indexes
+
+Pair with CREATE_INDEXES_ON_STARTUP=false so workers start without touching
+the index registry at all.
+
+Switching to ATTENDANCE_LAYOUT=daily: run --attendance-days, deploy with the
+new layout, then run --attendance-days once more to copy the marks written
+in between (it resumes where it stopped). The `attendance` collection is
+left in place; drop it once the day documents are verified.
+"""
+import argparse
+import asyncio
+import sys
+
+from . import attendance_days, classes
+from . import db as dbmod
+
+
+async def run(args) -> int:
+    await dbmod.connect_to_mongo()
+    try:
+        if args.check:
+            applied = await dbmod.db["migrations"].find_one({"_id": "indexes"})
+            current = dbmod.indexes_version()
+            stored = applied.get("version") if applied else None
+            print(f"[MIGRATE] Index version: stored {stored}, current {current}")
+            return 0 if stored == current else 1
+        if args.dedupe_classes:
+            # Before the index build, which refuses duplicate class names
+            removed = await classes.dedupe_classes(dbmod.db)
+            print(f"[MIGRATE] Removed {removed} duplicate class documents")
+        await dbmod.create_indexes(force=args.force)
+        if args.attendance_days:
+            copied, _ = await attendance_days.migrate_flat(dbmod.db, args.batch_size)
+            print(f"[MIGRATE] Copied {copied} attendance events into {attendance_days.DAYS}")
+        return 0
+    finally:
+        await dbmod.close_mongo_connection()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--force", action="store_true", help="create indexes even when the version matches")
+    parser.add_argument("--check", action="store_true", help="only report whether indexes are up to date")
+    parser.add_argument("--attendance-days", action="store_true", help="copy flat attendance into day documents")
+    parser.add_argument("--dedupe-classes", action="store_true", help="merge classes sharing a name first")
+    parser.add_argument("--batch-size", type=int, default=5000, help="attendance documents per migration batch")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
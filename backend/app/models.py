@@ -49,7 +49,9 @@ class StudentModel(BaseModel):
     name: str
     roll: str
     class_name: str
-    photo: Optional[str] = None
+    photo: Optional[str] = None  # legacy inline photo, see photo_ref
+    photo_ref: Optional[dict] = None  # blob store ids + etag (app/photos.py)
+    parent_email: Optional[str] = None  # absence alerts (app/dispatcher.py)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
     class Config:
@@ -0,0 +1,257 @@
+"""
+Runtime monitoring helpers.
+
+LatencyStats keeps per-stage latency counters (count, mean, max and recent
+percentiles) for pipelines that report through /metrics.
+
+SlowQueryListener records MongoDB commands slower than SLOW_QUERY_MS and
+explains them in the background to flag collection scans.
+
+PoolStatsListener tracks a MongoDB client's connection pool: connections
+open and checked out, checkouts waiting, and how long checkouts waited.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo import MongoClient, monitoring
+
+from .core.config import settings
+
+# Commands that `explain` accepts
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+# Session/cluster fields the driver adds that `explain` must not receive
+_DRIVER_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+
+
+class LatencyStats:
+    """Per-stage latency counters; percentiles cover the last `window` samples."""
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self._count = defaultdict(int)
+        self._total = defaultdict(float)
+        self._max = defaultdict(float)
+        self._recent = defaultdict(lambda: deque(maxlen=self.window))
+
+    def record(self, stage: str, ms: float):
+        self._count[stage] += 1
+        self._total[stage] += ms
+        self._max[stage] = max(self._max[stage], ms)
+        self._recent[stage].append(ms)
+
+    def mean(self, stage: str) -> float:
+        count = self._count.get(stage, 0)
+        return self._total[stage] / count if count else 0.0
+
+    def stats(self):
+        report = {}
+        for stage, count in self._count.items():
+            recent = sorted(self._recent[stage])
+            report[stage] = {
+                "count": count,
+                "mean_ms": round(self._total[stage] / count, 2),
+                "max_ms": round(self._max[stage], 2),
+                "p50_ms": round(recent[len(recent) // 2], 2),
+                "p95_ms": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 2),
+            }
+        return report
+
+
+# --- MongoDB connection pool monitoring ------------------------------------------------
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Live pool statistics for one client. pymongo calls these hooks from the
+    threads Motor runs it on, so counters are updated under a lock; a
+    checkout's start time is kept per thread, since "started" and
+    "checked out/failed" for one checkout fire on the same thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.wait = LatencyStats()
+        self.open = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.checkouts = 0
+        self.checkout_failures = defaultdict(int)
+        self.pool_clears = 0
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+
+    def _check_out_finished(self):
+        waited_ms = (time.perf_counter() - getattr(self._local, "started", time.perf_counter())) * 1000
+        with self._lock:
+            self.waiting -= 1
+            self.wait.record("checkout_wait", waited_ms)
+
+    def connection_checked_out(self, event):
+        self._check_out_finished()
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def connection_check_out_failed(self, event):
+        self._check_out_finished()
+        with self._lock:
+            self.checkout_failures[event.reason] += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    # Remaining hooks carry nothing the stats need
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "open": self.open,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "waiting": self.waiting,
+                "max_waiting": self.max_waiting,
+                "checkouts": self.checkouts,
+                "checkout_failures": dict(self.checkout_failures),
+                "pool_clears": self.pool_clears,
+                **self.wait.stats(),
+            }
+
+
+pool_listeners = {"main": PoolStatsListener(), "analytics": PoolStatsListener()}
+
+
+# --- MongoDB command monitoring ------------------------------------------------
+#
+# SlowQueryListener is a pymongo CommandListener that records every command
+# slower than SLOW_QUERY_MS. When SLOW_QUERY_EXPLAIN is on, it also re-runs
+# the command through `explain` (on a separate synchronous client, in a
+# background thread, so the listener itself never blocks) and flags plans
+# containing a COLLSCAN.
+
+
+def _plan_stages(plan):
+    """Yield every stage name in an explain plan tree."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    def __init__(self, threshold_ms: int, explain: bool = True, max_records: int = 100):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.records = deque(maxlen=max_records)
+        self.slow_count = 0
+        self.collscan_count = 0
+        self._pending = {}
+        self._explain_client = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain") if explain else None
+
+    # --- CommandListener -------------------------------------------------
+
+    def started(self, event):
+        if event.command_name in EXPLAINABLE:
+            self._pending[(event.connection_id, event.request_id)] = (event.database_name, event.command)
+
+    def succeeded(self, event):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        duration_ms = event.duration_micros / 1000
+        if pending is None or duration_ms < self.threshold_ms:
+            return
+
+        database_name, command = pending
+        record = {
+            "at": time.time(),
+            "command": event.command_name,
+            "collection": command.get(event.command_name),
+            "database": database_name,
+            "duration_ms": round(duration_ms, 2),
+            "collscan": None,
+        }
+        self.records.append(record)
+        self.slow_count += 1
+        print(f"[SLOW QUERY] {record['command']} on {record['collection']} took {record['duration_ms']} ms")
+
+        if self._executor is not None:
+            self._executor.submit(self._explain, record, database_name, command)
+
+    def failed(self, event):
+        self._pending.pop((event.connection_id, event.request_id), None)
+
+    # --- explain ----------------------------------------------------------
+
+    def _explain(self, record, database_name, command):
+        try:
+            if self._explain_client is None:
+                self._explain_client = MongoClient(settings.MONGO_URI)
+            clean = {k: v for k, v in command.items() if not k.startswith("$") and k not in _DRIVER_FIELDS}
+            plan = self._explain_client[database_name].command("explain", clean, verbosity="queryPlanner")
+        except Exception as e:
+            record["explain_error"] = str(e)
+            return
+
+        stages = set(_plan_stages(plan.get("queryPlanner", plan)))
+        record["plan_stages"] = sorted(stages)
+        record["collscan"] = "COLLSCAN" in stages
+        if record["collscan"]:
+            self.collscan_count += 1
+            print(f"[SLOW QUERY] COLLSCAN: {record['command']} on {record['collection']} filter={clean.get('filter')}")
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        if self._explain_client is not None:
+            self._explain_client.close()
+
+    def stats(self, recent: int = 10):
+        return {
+            "threshold_ms": self.threshold_ms,
+            "slow_commands": self.slow_count,
+            "collscans": self.collscan_count,
+            "recent": list(self.records)[-recent:],
+        }
+
+
+slow_query_listener = (
+    SlowQueryListener(settings.SLOW_QUERY_MS, explain=settings.SLOW_QUERY_EXPLAIN)
+    if settings.SLOW_QUERY_MS > 0
+    else None
+)
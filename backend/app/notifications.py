@@ -1,9 +1,70 @@
-from fastapi import APIRouter
+from datetime import date
+from typing import Optional
+
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
+
+from . import schemas
+from .db import get_db
+from .dispatcher import DEAD_LETTERS, QUEUE, dispatcher, enqueue, queue_absentee_alerts
+from .serialization import collect
 
 router = APIRouter()
 
 
 @router.post("/send")
-async def send_notification(payload: dict):
-    """Send a notification (placeholder - integrate email/SMS/push provider)"""
-    return {"detail": "Notification queued", "payload": payload}
+async def send_notification(payload: schemas.NotificationIn, db=Depends(get_db)):
+    """Queue a notification; the background dispatcher delivers it."""
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    try:
+        await enqueue(db, [payload.model_dump()])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"detail": "Notification queued"}
+
+
+@router.get("/status")
+async def notification_status(db=Depends(get_db)):
+    """Queue depth by status and provider, dead letters, and dispatcher counters."""
+    pipeline = [{"$group": {"_id": {"status": "$status", "provider": "$provider"}, "count": {"$sum": 1}}}]
+    queue = {}
+    async for row in db[QUEUE].aggregate(pipeline):
+        queue.setdefault(row["_id"]["status"], {})[row["_id"]["provider"]] = row["count"]
+
+    return {
+        "queue": queue,
+        "dead_letters": await db[DEAD_LETTERS].estimated_document_count(),
+        "dispatcher": dispatcher.stats(),
+    }
+
+
+@router.post("/absentees")
+async def run_absentee_alerts(day: Optional[date] = None, db=Depends(get_db)):
+    """Queue absence alerts for `day` (default today) now, instead of waiting for the schedule."""
+    queued = await queue_absentee_alerts(db, day)
+    return {"detail": "Absentee alerts queued", "queued": queued}
+
+
+@router.get("/dead-letters", response_class=ORJSONResponse)
+async def list_dead_letters(limit: int = 100, db=Depends(get_db)):
+    cursor = db[DEAD_LETTERS].find({}).sort("failed_at", -1).limit(limit)
+    return ORJSONResponse(await collect(cursor))
+
+
+@router.post("/dead-letters/{message_id}/retry")
+async def retry_dead_letter(message_id: str, db=Depends(get_db)):
+    """Put a dead-lettered message back on the queue with a fresh attempt count."""
+    try:
+        object_id = ObjectId(message_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid notification ID format")
+
+    message = await db[DEAD_LETTERS].find_one_and_delete({"_id": object_id})
+    if message is None:
+        raise HTTPException(status_code=404, detail="Dead letter not found")
+
+    await enqueue(db, [message])
+    return {"detail": "Notification re-queued"}
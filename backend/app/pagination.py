@@ -0,0 +1,59 @@
+"""
+Opaque keyset cursors for list endpoints.
+
+A cursor is the sort key of the last row of a page, serialized with
+bson.json_util (so ObjectId and datetime survive) and base64url encoded.
+Unlike skip/limit, the next page is an index seek, so deep pages cost
+the same as the first one.
+"""
+import base64
+
+from bson import json_util
+from fastapi import HTTPException
+
+# Largest `limit` a list endpoint returns
+MAX_PAGE_SIZE = 1000
+
+
+def legacy_limit(limit: int) -> int:
+    """
+    Page size for the old skip/limit lists. Larger values (and 0, which
+    meant "everything") are clamped to MAX_PAGE_SIZE rather than rejected,
+    so existing clients keep working.
+    """
+    return MAX_PAGE_SIZE if limit <= 0 or limit > MAX_PAGE_SIZE else limit
+
+
+def cursor_limit(limit: int) -> int:
+    """Page size for cursor pagination; 400 outside 1..MAX_PAGE_SIZE."""
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+
+def encode_cursor(values: dict) -> str:
+    raw = json_util.dumps(values).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, fields) -> dict:
+    """Decode `token` and check it carries exactly `fields`; 400 otherwise."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+    if not isinstance(values, dict) or set(values) != set(fields):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    return values
+
+
+def descending_after(values: dict, primary: str, tiebreak: str = "_id") -> dict:
+    """Filter for rows strictly after `values` in (primary desc, tiebreak desc) order."""
+    return {
+        "$or": [
+            {primary: {"$lt": values[primary]}},
+            {primary: values[primary], tiebreak: {"$lt": values[tiebreak]}},
+        ]
+    }
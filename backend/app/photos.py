@@ -0,0 +1,147 @@
+"""
+Student photo handling.
+
+Photos arrive inline on StudentIn.photo (a data URL or bare base64). They are
+decoded, a fixed-size thumbnail is rendered with Pillow in a process pool,
+both are written to the blob store, and the student document keeps only a
+`photo_ref`:
+
+    {"original": <blob id>, "thumbnail": <blob id>, "etag": <sha256 prefix>,
+     "content_type": <original content type>}
+"""
+import asyncio
+import base64
+import binascii
+import hashlib
+import io
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException
+
+from .blobstore import get_blob_store
+from .core.config import settings
+
+# Spellings of THUMBNAIL_FORMAT that aren't Pillow format names
+THUMBNAIL_FORMAT_ALIASES = {"JPG": "JPEG"}
+
+_process_pool = None
+
+
+def _get_process_pool():
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=settings.PHOTO_PROCESS_WORKERS)
+    return _process_pool
+
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def render_thumbnail(data: bytes, size: int, image_format: str):
+    """
+    Runs in a worker process: returns (thumbnail bytes, original content type).
+    Raises ValueError when `data` is not an image Pillow can read.
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        original_type = Image.MIME.get(image.format, "application/octet-stream")
+        image = ImageOps.exif_transpose(image)
+    except Exception as e:
+        raise ValueError(f"Unreadable image: {e}")
+
+    thumbnail = ImageOps.fit(image.convert("RGB"), (size, size))
+    out = io.BytesIO()
+    thumbnail.save(out, format=image_format, quality=85)
+    return out.getvalue(), original_type
+
+
+def thumbnail_format():
+    """
+    (Pillow format, content type) for THUMBNAIL_FORMAT, case-insensitive.
+    500 when Pillow can't write it, before anything is stored.
+    """
+    from PIL import Image
+
+    name = settings.THUMBNAIL_FORMAT.strip().upper()
+    name = THUMBNAIL_FORMAT_ALIASES.get(name, name)
+    Image.init()
+    if name not in Image.SAVE:
+        print(f"[PHOTOS] Unsupported THUMBNAIL_FORMAT: {settings.THUMBNAIL_FORMAT}")
+        raise HTTPException(status_code=500, detail=f"Unsupported THUMBNAIL_FORMAT: {settings.THUMBNAIL_FORMAT}")
+    return name, Image.MIME.get(name, "application/octet-stream")
+
+
+def decode_photo(photo: str) -> bytes:
+    """Decode a data URL or bare base64 payload; 400 on malformed input, 413 when too large."""
+    payload = photo.split(",", 1)[1] if photo.startswith("data:") else photo
+    try:
+        data = base64.b64decode(payload, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Photo must be a base64 data URL")
+
+    if len(data) > settings.PHOTO_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Photo too large")
+    return data
+
+
+async def store_photo(db, photo: str) -> dict:
+    """Decode, thumbnail and store a photo; return the photo_ref for the student document."""
+    data = decode_photo(photo)
+    image_format, thumbnail_type = thumbnail_format()
+
+    loop = asyncio.get_running_loop()
+    try:
+        thumbnail, content_type = await loop.run_in_executor(
+            _get_process_pool(), render_thumbnail, data, settings.THUMBNAIL_SIZE, image_format
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    store = get_blob_store(db)
+    etag = hashlib.sha256(data).hexdigest()[:32]
+    original_id = await store.put(data, content_type, {"etag": etag})
+    thumbnail_id = await store.put(thumbnail, thumbnail_type, {"etag": etag})
+    return {
+        "original": original_id,
+        "thumbnail": thumbnail_id,
+        "etag": etag,
+        "content_type": content_type,
+    }
+
+
+async def delete_photo(db, photo_ref: dict):
+    if not photo_ref:
+        return
+    store = get_blob_store(db)
+    for key in ("original", "thumbnail"):
+        if photo_ref.get(key):
+            await store.delete(photo_ref[key])
+
+
+async def migrate_inline_photos(db, batch_size: int = 100):
+    """
+    Move photos still stored inline on student documents into the blob store.
+    Returns (migrated, failed) counts.
+    """
+    migrated = failed = 0
+    cursor = db["students"].find(
+        {"photo": {"$type": "string", "$ne": ""}}, {"photo": 1}
+    ).batch_size(batch_size)
+    async for student in cursor:
+        try:
+            photo_ref = await store_photo(db, student["photo"])
+        except HTTPException as e:
+            print(f"[PHOTOS] Skipping student {student['_id']}: {e.detail}")
+            failed += 1
+            continue
+        await db["students"].update_one(
+            {"_id": student["_id"]}, {"$set": {"photo_ref": photo_ref, "photo": None}}
+        )
+        migrated += 1
+    return migrated, failed
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class Token(BaseModel):
@@ -19,10 +19,14 @@ class StudentBase(BaseModel):
     name: str
     roll: str
     class_name: str
-    photo: Optional[str] = None
+    photo: Optional[str] = None  # base64 data URL; stored in the blob store, not on the document
+    parent_email: Optional[str] = None  # absence alerts
 
 class StudentIn(StudentBase):
-    pass
+    embedding: Optional[List[float]] = None  # face embedding for server-side recognition
+
+class EmbeddingIn(BaseModel):
+    embedding: List[float]
 
 class StudentOut(StudentBase):
     id: str = Field(..., alias="_id")
@@ -43,3 +47,16 @@ class AttendanceOut(BaseModel):
     confidence: Optional[float] = None
     class Config:
         populate_by_name = True
+
+class RecognizeIn(BaseModel):
+    embeddings: List[List[float]]
+    threshold: Optional[float] = None
+    mark: bool = False  # mark attendance for every matched face
+    status: str = "Present"
+    timestamp: Optional[datetime] = None
+
+class NotificationIn(BaseModel):
+    to: str
+    subject: str
+    body: str
+    provider: Optional[str] = None  # defaults to NOTIFY_PROVIDER
@@ -0,0 +1,53 @@
+"""
+Fast serialization path for list endpoints.
+
+List endpoints used to fetch whole documents, patch each dict, and let
+FastAPI validate and re-encode the list through response_model=List[dict].
+Instead they now:
+
+ 1. ask Mongo for only the fields the client uses (the *_PROJECTION dicts),
+ 2. convert ObjectId values in one pass over each document (`to_jsonable`),
+ 3. return an ORJSONResponse, which FastAPI sends as-is, skipping
+    response_model validation. orjson encodes datetimes natively.
+"""
+from bson import ObjectId
+
+ATTENDANCE_PROJECTION = {
+    "student_id": 1,
+    "student_name": 1,
+    "roll": 1,
+    "timestamp": 1,
+    "status": 1,
+    "confidence": 1,
+}
+
+STUDENT_PROJECTION = {
+    "name": 1,
+    "roll": 1,
+    "class_name": 1,
+    "parent_email": 1,
+    # Photos live in the blob store; the etag tells clients whether one exists
+    "photo_ref.etag": 1,
+    "created_at": 1,
+}
+
+CLASS_PROJECTION = {
+    "name": 1,
+    "students": 1,
+}
+
+
+def to_jsonable(doc: dict) -> dict:
+    """Rename _id to id and stringify top-level ObjectIds, in place."""
+    if "_id" in doc:
+        doc["id"] = str(doc.pop("_id"))
+    for key, value in doc.items():
+        if isinstance(value, ObjectId):
+            doc[key] = str(value)
+    return doc
+
+
+async def collect(cursor):
+    """Drain a Motor cursor into a list of JSON-ready dicts."""
+    return [to_jsonable(doc) async for doc in cursor]
+
@@ -0,0 +1,69 @@
+"""
+Incrementally maintained collection counters.
+
+A single document in the `stats` collection holds the totals served by
+/api/analytics/summary. Write paths bump it with $inc, so reading the
+summary is one _id lookup however large the collections grow.
+`reconcile` recomputes the totals from scratch.
+"""
+from datetime import datetime
+
+from . import attendance_days
+
+STATS_ID = "counters"
+
+# counter name -> collection it counts
+COUNTED_COLLECTIONS = {
+    "students": "students",
+    "attendance_records": "attendance",
+}
+
+
+async def increment(db, counter: str, amount: int = 1):
+    """Atomically add `amount` to a counter. Failures are logged, never raised."""
+    if not amount:
+        return
+    try:
+        await db["stats"].update_one({"_id": STATS_ID}, {"$inc": {counter: amount}}, upsert=True)
+    except Exception as e:
+        print(f"[STATS] Error incrementing {counter}: {str(e)}")
+
+
+async def read_counters(db):
+    """Return the counters, reconciling first if they were never computed."""
+    counters = await db["stats"].find_one({"_id": STATS_ID})
+    if not counters or not counters.get("reconciled_at"):
+        counters = await reconcile(db)
+    return {name: counters.get(name, 0) for name in COUNTED_COLLECTIONS}
+
+
+async def reconcile(db):
+    """Recompute every counter with an exact count and store the result."""
+    counters = {}
+    for name, collection in COUNTED_COLLECTIONS.items():
+        counters[name] = await db[collection].count_documents({})
+    if attendance_days.enabled():
+        counters["attendance_records"] = await attendance_days.count_events(db)
+    counters["reconciled_at"] = datetime.utcnow()
+
+    await db["stats"].update_one({"_id": STATS_ID}, {"$set": counters}, upsert=True)
+    print(f"[STATS] Reconciled counters: {counters}")
+    return counters
+
+
+async def estimated_counts(db):
+    """
+    Metadata-based counts; O(1) but may drift after unclean shutdowns.
+    Day documents hold many marks each, so with ATTENDANCE_LAYOUT=daily
+    attendance_records is the maintained counter and the metadata count is
+    reported as attendance_days.
+    """
+    counts = {
+        name: await db[collection].estimated_document_count()
+        for name, collection in COUNTED_COLLECTIONS.items()
+    }
+    if attendance_days.enabled():
+        counters = await db["stats"].find_one({"_id": STATS_ID}, {"attendance_records": 1}) or {}
+        counts["attendance_records"] = counters.get("attendance_records", 0)
+        counts["attendance_days"] = await db[attendance_days.DAYS].estimated_document_count()
+    return counts
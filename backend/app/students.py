@@ -1,12 +1,227 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+import codecs
+import csv
+import io
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from typing import List, Optional, Union
 from bson import ObjectId
-from . import schemas
+from pydantic import ValidationError
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from . import schemas, stats
+from .blobstore import BlobNotFound, get_blob_store
+from .cache import TTLCache
+from .classes import adjust_class_counts, move_student
+from .core.config import settings
 from .db import get_db
+from .face_index import face_index, normalize
+from .pagination import cursor_limit, decode_cursor, encode_cursor, legacy_limit
+from .photos import delete_photo, migrate_inline_photos, store_photo
+from .serialization import STUDENT_PROJECTION, collect, to_jsonable
 
 router = APIRouter()
 
 
+# ------------------------------------------------
+# Roll -> student cache for the attendance write path
+# Only the fields attendance needs (_id, name) are kept.
+# ------------------------------------------------
+student_cache = TTLCache(
+    maxsize=settings.STUDENT_CACHE_SIZE,
+    ttl=settings.STUDENT_CACHE_TTL_SECONDS,
+)
+
+
+async def get_student_by_roll(db, roll: str):
+    """Return {"_id", "name", "roll"} for a roll, served from cache when possible."""
+    student = student_cache.get(roll)
+    if student is not None:
+        return student
+
+    student = await db["students"].find_one({"roll": roll}, {"_id": 1, "name": 1, "roll": 1})
+    if student:
+        student_cache.set(roll, student)
+    return student
+
+
+async def get_students_by_rolls(db, rolls):
+    """Resolve many rolls at once; only cache misses go to MongoDB in one $in query."""
+    found = {}
+    missing = []
+    for roll in set(rolls):
+        student = student_cache.get(roll)
+        if student is not None:
+            found[roll] = student
+        else:
+            missing.append(roll)
+
+    if missing:
+        cursor = db["students"].find({"roll": {"$in": missing}}, {"_id": 1, "name": 1, "roll": 1})
+        async for student in cursor:
+            student_cache.set(student["roll"], student)
+            found[student["roll"]] = student
+
+    return found
+
+
+def invalidate_student_cache(*rolls):
+    """Drop cached lookups for the given rolls."""
+    for roll in rolls:
+        if roll is not None:
+            student_cache.invalidate(roll)
+
+
+def _checked_embedding(embedding):
+    """Validate an embedding (width, non-zero) and return it as stored on the document."""
+    try:
+        normalize(embedding)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return [float(x) for x in embedding]
+
+
+# ------------------------------------------------
+# CSV import
+# ------------------------------------------------
+IMPORT_COLUMNS = ("name", "roll", "class_name", "parent_email")
+REQUIRED_IMPORT_COLUMNS = ("name", "roll", "class_name")
+
+
+async def csv_records(chunks):
+    """
+    Parse CSV records as the body streams in. Only text up to the last
+    newline outside quotes is parsed, so a quoted field may span chunks.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        end, start, quoted = 0, 0, False
+        while True:
+            newline = pending.find("\n", start)
+            if newline == -1:
+                break
+            if pending.count('"', start, newline) % 2:
+                quoted = not quoted
+            start = newline + 1
+            if not quoted:
+                end = start
+        if end:
+            for record in csv.reader(io.StringIO(pending[:end])):
+                yield record
+            pending = pending[end:]
+
+    pending += decoder.decode(b"", final=True)
+    for record in csv.reader(io.StringIO(pending)):
+        yield record
+
+
+class StudentImport:
+    """Validated rows in, one bulk_write per batch out, plus the per-row report."""
+
+    def __init__(self, db, columns):
+        self.db = db
+        self.columns = columns
+        self.batch = []
+        self.seen = set()
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, row: int, roll, message: str):
+        self.failed += 1
+        if len(self.errors) < settings.STUDENT_IMPORT_MAX_ERRORS:
+            self.errors.append({"row": row, "roll": roll, "error": message})
+
+    async def add(self, row: int, record):
+        self.rows += 1
+        fields = {column: value.strip() for column, value in zip(self.columns, record) if column}
+        if fields.get("parent_email") == "":
+            fields["parent_email"] = None
+        try:
+            student = schemas.StudentIn(**fields)
+        except ValidationError as e:
+            problems = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            self.error(row, fields.get("roll"), problems)
+            return
+        if not student.roll or not student.name or not student.class_name:
+            self.error(row, student.roll, "name, roll and class_name must not be empty")
+            return
+        if student.roll in self.seen:
+            self.error(row, student.roll, "Duplicate roll in file; the first row was kept")
+            return
+        self.seen.add(student.roll)
+
+        self.batch.append((row, student.model_dump(include=set(fields))))
+        if len(self.batch) >= settings.STUDENT_IMPORT_BATCH_SIZE:
+            await self.flush()
+
+    async def flush(self):
+        batch, self.batch = self.batch, []
+        if not batch:
+            return
+        students = self.db["students"]
+        rolls = [fields["roll"] for _, fields in batch]
+        # One read per batch for the class moves and face index names of existing students
+        existing = {
+            doc["roll"]: doc
+            async for doc in students.find(
+                {"roll": {"$in": rolls}}, {"roll": 1, "name": 1, "class_name": 1, "embedding": {"$slice": 1}}
+            )
+        }
+
+        operations = [
+            UpdateOne(
+                {"roll": fields["roll"]},
+                {"$set": fields, "$setOnInsert": {"photo": None, "photo_ref": None}},
+                upsert=True,
+            )
+            for _, fields in batch
+        ]
+        try:
+            await students.bulk_write(operations, ordered=False)
+            write_errors = {}
+        except BulkWriteError as e:
+            write_errors = {err["index"]: err.get("errmsg", "Write failed") for err in e.details.get("writeErrors", [])}
+
+        class_changes = {}
+        renamed = {}
+        inserted = 0
+        for index, (row, fields) in enumerate(batch):
+            if index in write_errors:
+                self.error(row, fields["roll"], write_errors[index])
+                continue
+            previous = existing.get(fields["roll"])
+            if previous is None:
+                inserted += 1
+                class_changes[fields["class_name"]] = class_changes.get(fields["class_name"], 0) + 1
+                continue
+            self.updated += 1
+            if previous.get("class_name") != fields["class_name"]:
+                class_changes[previous.get("class_name")] = class_changes.get(previous.get("class_name"), 0) - 1
+                class_changes[fields["class_name"]] = class_changes.get(fields["class_name"], 0) + 1
+            if previous.get("embedding") and previous.get("name") != fields["name"]:
+                renamed[str(previous["_id"])] = (fields["roll"], fields["name"])
+
+        self.inserted += inserted
+        invalidate_student_cache(*rolls)
+        await stats.increment(self.db, "students", inserted)
+        await adjust_class_counts(self.db, class_changes)
+        await face_index.update_meta(self.db, renamed)
+
+    def report(self):
+        return {
+            "detail": "Import finished",
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "failed": self.failed,
+            "errors": self.errors,
+        }
+
+
 @router.post("/", response_model=dict)
 async def create_student(student: schemas.StudentIn, db=Depends(get_db)):
     """Create a new student"""
@@ -16,16 +231,39 @@ async def create_student(student: schemas.StudentIn, db=Depends(get_db)):
         
         students_collection = db["students"]
         
+        embedding = _checked_embedding(student.embedding) if student.embedding is not None else None
+
+        # Photos go to the blob store; the document keeps only a reference
+        photo_ref = await store_photo(db, student.photo) if student.photo else None
+
         new_student = {
             "name": student.name,
             "roll": student.roll,
             "class_name": student.class_name,
-            "photo": student.photo or None,
+            "parent_email": student.parent_email,
+            "photo": None,
+            "photo_ref": photo_ref,
         }
         
-        result = await students_collection.insert_one(new_student)
+        if embedding is not None:
+            new_student["embedding"] = embedding
+        
+        try:
+            result = await students_collection.insert_one(new_student)
+        except DuplicateKeyError:
+            await delete_photo(db, photo_ref)
+            raise HTTPException(status_code=409, detail="Roll number already exists")
+        except Exception:
+            await delete_photo(db, photo_ref)
+            raise
+        invalidate_student_cache(student.roll)
+        await stats.increment(db, "students", 1)
+        await adjust_class_counts(db, {student.class_name: 1})
+        if student.embedding is not None:
+            await face_index.upsert(db, str(result.inserted_id), student.roll, student.name, student.embedding)
         new_student["id"] = str(result.inserted_id)
         new_student.pop("_id", None)
+        new_student.pop("embedding", None)
         
         print(f"Student created successfully: {new_student}")
         return new_student
@@ -36,71 +274,208 @@ async def create_student(student: schemas.StudentIn, db=Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Error creating student: {str(e)}")
 
 
-@router.get("/", response_model=List[dict])
-async def list_students(skip: int = 0, limit: int = 100, db=Depends(get_db)):
-    """Get all students with pagination"""
+@router.get("/", response_model=Union[List[dict], dict], response_class=ORJSONResponse)
+async def list_students(
+    skip: int = Query(0, ge=0),
+    limit: int = 100,
+    after: Optional[str] = None,
+    db=Depends(get_db),
+):
+    """
+    Get all students with pagination.
+
+    Passing `after` (empty for the first page) switches from skip/limit to
+    keyset pagination on _id and returns {"items": [...], "next_cursor": ...}.
+    The skip/limit list clamps `limit` to MAX_PAGE_SIZE; the cursor path
+    answers 400 outside 1..MAX_PAGE_SIZE.
+    """
     try:
         if db is None:
             raise HTTPException(status_code=500, detail="Database connection failed")
         
         students_collection = db["students"]
+
+        if after is None:
+            cursor = students_collection.find({}, STUDENT_PROJECTION).skip(skip).limit(legacy_limit(limit))
+            return ORJSONResponse(await collect(cursor))
+
+        limit = cursor_limit(limit)
+        query = {}
+        if after:
+            last = decode_cursor(after, ("_id",))
+            query = {"_id": {"$gt": last["_id"]}}
+        cursor = students_collection.find(query, STUDENT_PROJECTION).sort("_id", 1).limit(limit + 1)
         
-        students = []
-        cursor = students_collection.find({}).skip(skip).limit(limit)
-        async for student in cursor:
-            student["id"] = str(student["_id"])
-            # Remove _id from response to avoid duplication
-            student.pop("_id", None)
-            students.append(student)
+        students = await collect(cursor)
+        next_cursor = None
+        if len(students) > limit:
+            students.pop()
+            next_cursor = encode_cursor({"_id": ObjectId(students[-1]["id"])})
         
-        return students
+        return ORJSONResponse({"items": students, "next_cursor": next_cursor})
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching students: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching students: {str(e)}")
 
 
+@router.post("/photos/migrate")
+async def migrate_photos(db=Depends(get_db)):
+    """Admin: move photos still stored inline on student documents to the blob store."""
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    migrated, failed = await migrate_inline_photos(db)
+    return {"detail": "Photo migration finished", "migrated": migrated, "failed": failed}
+
+
+@router.post("/import")
+async def import_students(request: Request, db=Depends(get_db)):
+    """
+    Create or update students from a CSV request body (Content-Type: text/csv).
+
+    The header row names the columns: name, roll and class_name are
+    required, parent_email is optional and other columns are ignored.
+    Rows are upserted on roll in batches of STUDENT_IMPORT_BATCH_SIZE, so an
+    existing roll is updated in place. Invalid rows are skipped and listed
+    in the report with their row number (the header is row 1).
+    """
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    importer = None
+    row = 0
+    try:
+        async for record in csv_records(request.stream()):
+            row += 1
+            if importer is None:
+                columns = [column.strip().lower() for column in record]
+                missing = [column for column in REQUIRED_IMPORT_COLUMNS if column not in columns]
+                if missing:
+                    raise HTTPException(status_code=400, detail=f"CSV header is missing columns: {', '.join(missing)}")
+                importer = StudentImport(db, [column if column in IMPORT_COLUMNS else None for column in columns])
+                continue
+            if any(value.strip() for value in record):
+                await importer.add(row, record)
+    except (UnicodeDecodeError, csv.Error) as e:
+        if importer is None:
+            raise HTTPException(status_code=400, detail=f"Unreadable CSV: {e}")
+        # Rows before this point are kept; report where parsing stopped
+        importer.error(row + 1, None, f"Unreadable CSV, import stopped here: {e}")
+
+    if importer is None:
+        raise HTTPException(status_code=400, detail="CSV is empty")
+    await importer.flush()
+
+    report = importer.report()
+    print(f"[IMPORT] {report['rows']} rows: {report['inserted']} inserted, {report['updated']} updated, {report['failed']} failed")
+    return report
+
+
 @router.get("/{student_id}", response_model=dict)
 async def get_student(student_id: str, db=Depends(get_db)):
     """Get a specific student by ID"""
     students_collection = db["students"]
     
     try:
-        student = await students_collection.find_one({"_id": ObjectId(student_id)})
+        student = await students_collection.find_one({"_id": ObjectId(student_id)}, STUDENT_PROJECTION)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid student ID format")
     
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
-    student["id"] = str(student["_id"])
-    return student
+    return to_jsonable(student)
+
+
+async def _serve_photo(student_id: str, variant: str, request: Request, db):
+    try:
+        student = await db["students"].find_one({"_id": ObjectId(student_id)}, {"photo_ref": 1})
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid student ID format")
+
+    photo_ref = (student or {}).get("photo_ref")
+    if not photo_ref:
+        raise HTTPException(status_code=404, detail="Photo not found")
+
+    etag = f'"{photo_ref["etag"]}-{variant}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    try:
+        chunks, length, content_type = await get_blob_store(db).open(photo_ref[variant])
+    except BlobNotFound:
+        raise HTTPException(status_code=404, detail="Photo not found")
+
+    headers["Content-Length"] = str(length)
+    return StreamingResponse(chunks, media_type=content_type, headers=headers)
+
+
+@router.get("/{student_id}/photo")
+async def get_student_photo(student_id: str, request: Request, db=Depends(get_db)):
+    """Stream a student's original photo (ETag / If-None-Match aware)."""
+    return await _serve_photo(student_id, "original", request, db)
+
+
+@router.get("/{student_id}/photo/thumbnail")
+async def get_student_thumbnail(student_id: str, request: Request, db=Depends(get_db)):
+    """Stream a student's thumbnail (ETag / If-None-Match aware)."""
+    return await _serve_photo(student_id, "thumbnail", request, db)
 
 
 @router.put("/{student_id}", response_model=dict)
 async def update_student(student_id: str, student: schemas.StudentIn, db=Depends(get_db)):
-    """Update a student"""
+    """Update a student. Omitting `photo` keeps the current photo."""
     students_collection = db["students"]
+
+    try:
+        object_id = ObjectId(student_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid student ID format")
+
+    update = {
+        "name": student.name,
+        "roll": student.roll,
+        "class_name": student.class_name,
+        "parent_email": student.parent_email,
+    }
+    if student.embedding is not None:
+        update["embedding"] = _checked_embedding(student.embedding)
+    if student.photo:
+        update["photo_ref"] = await store_photo(db, student.photo)
+        update["photo"] = None
     
     try:
-        result = await students_collection.update_one(
-            {"_id": ObjectId(student_id)},
-            {"$set": {
-                "name": student.name,
-                "roll": student.roll,
-                "class_name": student.class_name,
-                "photo": student.photo
-            }}
+        previous = await students_collection.find_one_and_update(
+            {"_id": object_id},
+            {"$set": update},
+            return_document=ReturnDocument.BEFORE,
         )
+    except DuplicateKeyError:
+        await delete_photo(db, update.get("photo_ref"))
+        raise HTTPException(status_code=409, detail="Roll number already exists")
     except Exception:
-        raise HTTPException(status_code=400, detail="Invalid student ID format")
+        await delete_photo(db, update.get("photo_ref"))
+        raise
     
-    if result.matched_count == 0:
+    if previous is None:
+        await delete_photo(db, update.get("photo_ref"))
         raise HTTPException(status_code=404, detail="Student not found")
+
+    # The roll may have changed, so drop both the old and the new key
+    invalidate_student_cache(previous.get("roll"), student.roll)
+    await move_student(db, previous.get("class_name"), student.class_name)
+    if "photo_ref" in update:
+        await delete_photo(db, previous.get("photo_ref"))
+    if student.embedding is not None:
+        await face_index.upsert(db, student_id, student.roll, student.name, student.embedding)
+    elif previous.get("embedding") and (previous.get("roll"), previous.get("name")) != (student.roll, student.name):
+        await face_index.update_meta(db, {student_id: (student.roll, student.name)})
     
-    updated_student = await students_collection.find_one({"_id": ObjectId(student_id)})
-    updated_student["id"] = str(updated_student["_id"])
-    
-    return updated_student
+    updated_student = await students_collection.find_one({"_id": object_id}, STUDENT_PROJECTION)
+    return to_jsonable(updated_student)
 
 
 @router.delete("/{student_id}")
@@ -109,11 +484,56 @@ async def delete_student(student_id: str, db=Depends(get_db)):
     students_collection = db["students"]
     
     try:
-        result = await students_collection.delete_one({"_id": ObjectId(student_id)})
+        deleted = await students_collection.find_one_and_delete(
+            {"_id": ObjectId(student_id)}, projection={"roll": 1, "class_name": 1, "photo_ref": 1, "embedding": {"$slice": 1}}
+        )
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid student ID format")
     
-    if result.deleted_count == 0:
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Student not found")
+
+    invalidate_student_cache(deleted.get("roll"))
+    await stats.increment(db, "students", -1)
+    await adjust_class_counts(db, {deleted.get("class_name"): -1})
+    await delete_photo(db, deleted.get("photo_ref"))
+    if deleted.get("embedding"):
+        await face_index.remove(db, student_id)
     
     return {"detail": "Student deleted successfully"}
+
+
+@router.put("/{student_id}/embedding", response_model=dict)
+async def set_student_embedding(student_id: str, payload: schemas.EmbeddingIn, db=Depends(get_db)):
+    """Enroll or replace a student's face embedding for server-side recognition."""
+    try:
+        object_id = ObjectId(student_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid student ID format")
+
+    student = await db["students"].find_one_and_update(
+        {"_id": object_id},
+        {"$set": {"embedding": _checked_embedding(payload.embedding)}},
+        projection={"roll": 1, "name": 1},
+    )
+    if student is None:
+        raise HTTPException(status_code=404, detail="Student not found")
+
+    await face_index.upsert(db, student_id, student["roll"], student["name"], payload.embedding)
+    return {"detail": "Embedding enrolled", "id": student_id}
+
+
+@router.delete("/{student_id}/embedding", response_model=dict)
+async def delete_student_embedding(student_id: str, db=Depends(get_db)):
+    """Remove a student's face embedding."""
+    try:
+        object_id = ObjectId(student_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid student ID format")
+
+    result = await db["students"].update_one({"_id": object_id}, {"$unset": {"embedding": ""}})
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Student not found")
+
+    await face_index.remove(db, student_id)
+    return {"detail": "Embedding removed", "id": student_id}
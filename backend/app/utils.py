@@ -1,26 +1,73 @@
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from jose import jwt
 from .core.config import settings
+import asyncio
 import hashlib
+import hmac
 import os
 
-def get_password_hash(password: str):
-    """Hash password using PBKDF2 instead of bcrypt to avoid compatibility issues"""
+# Hashes created before the iteration count was configurable are bare hex
+# (32-byte salt + digest) at this many iterations.
+LEGACY_ITERATIONS = 100000
+HASH_SCHEME = "pbkdf2_sha256"
+
+# PBKDF2 releases the GIL, so a small thread pool runs hashes in parallel
+# while the event loop keeps serving requests. The pool size caps concurrency.
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_CONCURRENCY,
+    thread_name_prefix="password-hash",
+)
+
+
+def _pbkdf2(password: str, salt: bytes, iterations: int) -> bytes:
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+
+
+def _parse_hash(hashed: str):
+    """Return (iterations, salt, digest) for both the current and the legacy format."""
+    if hashed.startswith(HASH_SCHEME + "$"):
+        _, iterations, salt, digest = hashed.split("$")
+        return int(iterations), bytes.fromhex(salt), bytes.fromhex(digest)
+
+    hash_bytes = bytes.fromhex(hashed)
+    return LEGACY_ITERATIONS, hash_bytes[:32], hash_bytes[32:]
+
+
+def get_password_hash(password: str, iterations: int = None):
+    """Hash password using PBKDF2; the iteration count is stored in the hash"""
+    iterations = iterations or settings.PASSWORD_HASH_ITERATIONS
     salt = os.urandom(32)
-    pwd_hash = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, 100000)
-    return (salt + pwd_hash).hex()
+    pwd_hash = _pbkdf2(password, salt, iterations)
+    return f"{HASH_SCHEME}${iterations}${salt.hex()}${pwd_hash.hex()}"
 
 def verify_password(plain: str, hashed: str):
     """Verify password against hash"""
     try:
-        hash_bytes = bytes.fromhex(hashed)
-        salt = hash_bytes[:32]
-        stored_hash = hash_bytes[32:]
-        pwd_hash = hashlib.pbkdf2_hmac('sha256', plain.encode('utf-8'), salt, 100000)
-        return pwd_hash == stored_hash
+        iterations, salt, stored_hash = _parse_hash(hashed)
+        pwd_hash = _pbkdf2(plain, salt, iterations)
+        return hmac.compare_digest(pwd_hash, stored_hash)
     except Exception:
         return False
 
+def needs_rehash(hashed: str):
+    """True when a hash is legacy or uses a different iteration count than configured"""
+    try:
+        iterations, _, _ = _parse_hash(hashed)
+    except Exception:
+        return False
+    return not hashed.startswith(HASH_SCHEME + "$") or iterations != settings.PASSWORD_HASH_ITERATIONS
+
+async def get_password_hash_async(password: str):
+    """get_password_hash on the hashing pool, without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, get_password_hash, password)
+
+async def verify_password_async(plain: str, hashed: str):
+    """verify_password on the hashing pool, without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, verify_password, plain, hashed)
+
 def create_access_token(subject: str, expires_delta: int = None):
     expire = datetime.utcnow() + timedelta(minutes=(expires_delta or settings.ACCESS_TOKEN_EXPIRE_MINUTES))
     payload = {"sub": subject, "exp": expire}
@@ -0,0 +1,167 @@
+"""
+Write-behind buffered writer with group commit.
+
+Instead of one insert_one round trip per accepted mark, callers hand their
+document to a BufferedWriter and await a future. A single flusher task
+collects documents from a bounded asyncio queue and writes them with one
+insert_many(ordered=False) every WRITE_BUFFER_FLUSH_MS milliseconds or
+WRITE_BUFFER_MAX_DOCS documents, whichever comes first.
+
+Each caller's future resolves with its own inserted _id, or raises its own
+error: per-document failures from a BulkWriteError come back as
+DuplicateKeyError / WriteError, so callers handle them exactly as they
+would for insert_one. A full queue makes callers wait (backpressure).
+
+`close()` flushes everything still queued, including inserts that were
+waiting for room in a full queue when it was called; call it on shutdown
+before the MongoDB client is closed.
+"""
+import asyncio
+import time
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteError
+
+from .core.config import settings
+from .monitoring import LatencyStats
+
+_STOP = object()
+
+
+class BufferedWriter:
+    def __init__(self, collection: str, max_docs: int, flush_ms: int, max_queue: int):
+        self.collection = collection
+        self.max_docs = max_docs
+        self.flush_ms = flush_ms
+        self.max_queue = max_queue
+        self.latency = LatencyStats()
+        self.flushes = 0
+        self.documents = 0
+        self.batched = 0
+        self._queue = None
+        self._task = None
+        self._closing = False
+        self._putting = 0  # inserts waiting for room in the queue
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def insert(self, db, doc: dict):
+        """Queue `doc` for the next group commit and return its inserted _id."""
+        if self._closing:
+            # Shutting down: don't queue behind the final flush
+            result = await db[self.collection].insert_one(doc)
+            return result.inserted_id
+
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.create_task(self._run(db))
+
+        future = asyncio.get_running_loop().create_future()
+        self._putting += 1
+        try:
+            await self._queue.put((doc, future, time.perf_counter()))
+        finally:
+            self._putting -= 1
+        return await future
+
+    async def _run(self, db):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = loop.time() + self.flush_ms / 1000
+            while len(batch) < self.max_docs:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(db, batch)
+
+        # Inserts that were blocked on a full queue when close() began can
+        # land behind _STOP; write them too so their callers get an answer
+        while self._putting or not self._queue.empty():
+            batch = []
+            while len(batch) < self.max_docs and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            if batch:
+                await self._flush(db, batch)
+            else:
+                await asyncio.sleep(0)
+
+    async def _flush(self, db, batch):
+        docs = [doc for doc, _, _ in batch]
+        errors = {}
+        started = time.perf_counter()
+        try:
+            await db[self.collection].insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            errors = {err["index"]: err for err in e.details.get("writeErrors", [])}
+        except Exception as e:
+            print(f"[WRITER] Flush of {len(docs)} {self.collection} documents failed: {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            finished = time.perf_counter()
+            self.latency.record("flush", (finished - started) * 1000)
+            self.flushes += 1
+
+        self.documents += len(docs) - len(errors)
+        self.batched += len(docs)
+        for index, (doc, future, queued_at) in enumerate(batch):
+            self.latency.record("commit_wait", (finished - queued_at) * 1000)
+            if future.done():
+                continue  # the caller went away; the write still happened
+            error = errors.get(index)
+            if error is None:
+                future.set_result(doc["_id"])
+            elif error.get("code") == 11000:
+                future.set_exception(DuplicateKeyError(error.get("errmsg", ""), 11000, error))
+            else:
+                future.set_exception(WriteError(error.get("errmsg", ""), error.get("code"), error))
+
+    async def close(self):
+        """Flush whatever is queued and stop the flusher."""
+        self._closing = True
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        print(f"[WRITER] Drained {self.collection} buffer ({self.documents} documents written)")
+
+    def stats(self):
+        return {
+            "enabled": settings.WRITE_BUFFER_ENABLED,
+            "queue_depth": self.depth(),
+            "max_docs": self.max_docs,
+            "flush_ms": self.flush_ms,
+            "flushes": self.flushes,
+            "documents": self.documents,
+            "mean_batch": round(self.batched / self.flushes, 1) if self.flushes else 0,
+            "latency": self.latency.stats(),
+        }
+
+
+attendance_writer = BufferedWriter(
+    "attendance",
+    max_docs=settings.WRITE_BUFFER_MAX_DOCS,
+    flush_ms=settings.WRITE_BUFFER_FLUSH_MS,
+    max_queue=settings.WRITE_BUFFER_MAX_QUEUE,
+)
@@ -0,0 +1,308 @@
+"""
+In-process benchmark of the API hot paths.
+
+Drives the FastAPI app through an ASGI client (no network, no uvicorn)
+against a local mongod (--mongo-uri) or, by default, the in-memory
+mongomock_motor stand-in for the db dependency. The stand-in measures the
+app's own overhead (routing, auth, validation, serialization); use a real
+mongod for numbers that include the database.
+
+Scenarios:
+    login          concurrent password logins
+    mark_burst     concurrent /attendance/mark for distinct students
+    today          /attendance/today at several day sizes
+    list_students  keyset paging through /students, and skip/limit
+
+Each reports throughput and p50/p95/p99 latency. --save writes a JSON
+baseline; --compare checks a run against one and exits non-zero when a
+scenario's p95 or throughput regressed by more than --tolerance.
+
+    python -m benchmarks.api --save benchmarks/baseline.json
+    python -m benchmarks.api --compare benchmarks/baseline.json
+    python -m benchmarks.api --mongo-uri mongodb://localhost:27017 --scenarios mark_burst,today
+"""
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+from datetime import date, datetime
+
+import httpx
+from bson import ObjectId
+
+from app import db as dbmod
+from app import utils
+from app.core.config import settings
+from app.main import app
+
+BENCH_DB = "facesense_bench"
+USERNAME = "bench"
+PASSWORD = "bench-password"
+
+
+def percentile(sorted_ms, q):
+    return sorted_ms[min(len(sorted_ms) - 1, int(len(sorted_ms) * q))]
+
+
+def summarize(latencies, elapsed, errors):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+    }
+
+
+async def drive(requests, concurrency):
+    """Run request coroutine factories with bounded concurrency; return a summary."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(make_request):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await make_request()
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(make_request) for make_request in requests))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+# --- setup ------------------------------------------------------------------------
+
+async def connect(mongo_uri):
+    if mongo_uri:
+        settings.MONGO_URI = mongo_uri
+        settings.MONGO_DB = BENCH_DB
+        await dbmod.connect_to_mongo()
+        await dbmod.client.drop_database(BENCH_DB)
+        await dbmod.create_indexes()
+        return "mongod"
+
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        sys.exit("mongomock_motor is not installed: pip install mongomock-motor, or pass --mongo-uri")
+    dbmod.client = AsyncMongoMockClient()
+    dbmod.db = dbmod.client[BENCH_DB]
+    return "in-memory"
+
+
+async def seed_students(db, count, prefix="S"):
+    docs = [
+        {"name": f"Student {i}", "roll": f"{prefix}{i:06d}", "class_name": f"C{i % 20}", "photo": None}
+        for i in range(count)
+    ]
+    await db["students"].insert_many(docs)
+    return docs
+
+
+async def reset(db, *collections):
+    for name in collections:
+        await db[name].delete_many({})
+
+
+# --- scenarios -----------------------------------------------------------------------
+
+async def scenario_login(client, db, headers, args):
+    requests = [
+        (lambda: client.post("/api/auth/login", data={"username": USERNAME, "password": PASSWORD}))
+        for _ in range(args.logins)
+    ]
+    return {"login": await drive(requests, args.concurrency)}
+
+
+async def scenario_mark_burst(client, db, headers, args):
+    await reset(db, "students", "attendance")
+    students = await seed_students(db, args.burst * args.rounds, prefix="M")
+    results = {}
+    latencies_runs = []
+    for round_number in range(args.rounds):
+        batch = students[round_number * args.burst:(round_number + 1) * args.burst]
+        requests = [
+            (lambda roll=s["roll"]: client.post("/api/attendance/mark", json={"roll": roll}, headers=headers))
+            for s in batch
+        ]
+        latencies_runs.append(await drive(requests, args.burst))
+    # Report the median round so one cold round (cache fill) doesn't dominate
+    latencies_runs.sort(key=lambda r: r["p95_ms"])
+    results[f"mark_burst_{args.burst}"] = latencies_runs[len(latencies_runs) // 2]
+    return results
+
+
+async def scenario_today(client, db, headers, args):
+    results = {}
+    # Same notion of "today" as the endpoint
+    today = date.today()
+    start_of_day = datetime(today.year, today.month, today.day)
+    for size in args.day_sizes:
+        await reset(db, "attendance")
+        student_ids = [ObjectId() for _ in range(min(size, 2000))]
+        docs = [
+            {
+                "student_id": student_ids[i % len(student_ids)],
+                "student_name": f"Student {i}",
+                "roll": f"T{i:06d}",
+                "timestamp": start_of_day.replace(hour=8) if i % 2 else start_of_day.replace(hour=9, minute=i % 60),
+                "status": "Present",
+                "confidence": 0.9,
+            }
+            for i in range(size)
+        ]
+        await db["attendance"].insert_many(docs)
+        requests = [(lambda: client.get("/api/attendance/today", headers=headers)) for _ in range(args.repeat)]
+        results[f"today_{size}"] = await drive(requests, args.concurrency)
+    return results
+
+
+async def scenario_list_students(client, db, headers, args):
+    await reset(db, "students")
+    await seed_students(db, args.students, prefix="L")
+
+    # Keyset: walk the pages one after another, like a client would
+    latencies = []
+    started = time.perf_counter()
+    cursor = ""
+    errors = 0
+    while cursor is not None:
+        t = time.perf_counter()
+        response = await client.get("/api/students/", params={"after": cursor, "limit": args.page}, headers=headers)
+        latencies.append((time.perf_counter() - t) * 1000)
+        if response.status_code >= 400:
+            errors += 1
+            break
+        cursor = response.json()["next_cursor"]
+    keyset = summarize(latencies, time.perf_counter() - started, errors)
+
+    pages = range(0, args.students, args.page)
+    requests = [
+        (lambda skip=skip: client.get("/api/students/", params={"skip": skip, "limit": args.page}, headers=headers))
+        for skip in pages
+    ]
+    offset = await drive(requests, 1)
+    return {"list_students_keyset": keyset, "list_students_skip": offset}
+
+
+SCENARIOS = {
+    "login": scenario_login,
+    "mark_burst": scenario_mark_burst,
+    "today": scenario_today,
+    "list_students": scenario_list_students,
+}
+
+
+# --- baseline comparison -------------------------------------------------------------
+
+def compare(results, baseline, tolerance):
+    """Print a comparison table; return the names of regressed scenarios."""
+    regressions = []
+    print(f"\n{'scenario':<24}{'p95 ms':>18}{'rps':>20}")
+    for name, current in results.items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        p95_ratio = current["p95_ms"] / base["p95_ms"] if base["p95_ms"] else 1.0
+        rps_ratio = current["rps"] / base["rps"] if base["rps"] else 1.0
+        regressed = p95_ratio > 1 + tolerance or rps_ratio < 1 - tolerance
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{name:<24}{base['p95_ms']:>8.2f} -> {current['p95_ms']:<8.2f}"
+            f"{base['rps']:>9.1f} -> {current['rps']:<8.1f}{'  REGRESSED' if regressed else ''}"
+        )
+    return regressions
+
+
+async def run(args):
+    backend = await connect(args.mongo_uri)
+    db = dbmod.db
+    settings.AUTH_REQUIRED = True
+
+    await reset(db, "users")
+    await db["users"].insert_one({
+        "username": USERNAME,
+        "email": "bench@example.com",
+        "hashed_password": utils.get_password_hash(PASSWORD),
+        "role": "admin",
+    })
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        login = await client.post("/api/auth/login", data={"username": USERNAME, "password": PASSWORD})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        for name in args.scenarios:
+            results.update(await SCENARIOS[name](client, db, headers, args))
+
+    if args.mongo_uri:
+        await dbmod.client.drop_database(BENCH_DB)
+        await dbmod.close_mongo_connection()
+
+    print(f"{'scenario':<24}{'requests':>9}{'errors':>7}{'rps':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, r in results.items():
+        print(f"{name:<24}{r['requests']:>9}{r['errors']:>7}{r['rps']:>10.1f}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}")
+
+    report = {
+        "meta": {
+            "backend": backend,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "created_at": datetime.utcnow().isoformat(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("save", "compare")},
+        },
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline["meta"]["backend"] != backend:
+            print(f"\nWarning: baseline was recorded against {baseline['meta']['backend']}, this run used {backend}")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nFAIL: regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            return 1
+        print(f"\nOK: no scenario regressed beyond {args.tolerance:.0%}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", help="run against this mongod (database %s is dropped)" % BENCH_DB)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), type=lambda s: s.split(","))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--burst", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--day-sizes", default="100,1000,10000", type=lambda s: [int(n) for n in s.split(",")])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--save", help="write results as a JSON baseline")
+    parser.add_argument("--compare", help="compare against a saved JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
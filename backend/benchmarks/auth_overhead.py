@@ -0,0 +1,58 @@
+"""
+Per-request cost of get_current_user with and without its caches.
+
+The `users` collection is replaced by a stub that sleeps for --rtt-ms per
+find_one, standing in for a MongoDB round trip, and counts the calls.
+
+    python -m benchmarks.auth_overhead --requests 5000 --rtt-ms 0.5
+"""
+import argparse
+import asyncio
+import time
+
+from app import dependencies, utils
+
+
+class _StubUsers:
+    def __init__(self, rtt):
+        self.rtt = rtt
+        self.calls = 0
+
+    async def find_one(self, query, projection=None):
+        self.calls += 1
+        await asyncio.sleep(self.rtt)
+        return {"_id": "0" * 24, "username": "teacher1", "email": "teacher1@example.com", "role": "teacher"}
+
+
+async def _run(requests, token, db, cached):
+    started = time.perf_counter()
+    for _ in range(requests):
+        if not cached:
+            dependencies.token_cache.clear()
+            dependencies.user_cache.clear()
+        await dependencies.get_current_user(token=token, db=db)
+    return time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--rtt-ms", type=float, default=0.5)
+    args = parser.parse_args()
+
+    dependencies.settings.AUTH_REQUIRED = True
+    users = _StubUsers(args.rtt_ms / 1000)
+    db = {"users": users}
+    token = utils.create_access_token("teacher1")
+
+    for label, cached in (("uncached", False), ("cached", True)):
+        users.calls = 0
+        elapsed = await _run(args.requests, token, db, cached)
+        print(
+            f"{label:<9} {elapsed / args.requests * 1e6:8.1f} us/request | "
+            f"users lookups: {users.calls} for {args.requests} requests"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
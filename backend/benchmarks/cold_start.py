@@ -0,0 +1,90 @@
+"""
+Worker cold start: how long `import app.main` takes, which heavy modules it
+pulls in, and how long the startup index step takes on a fresh database vs
+a database whose stored index version already matches.
+
+Imports are timed in fresh subprocesses (median of --runs) so nothing is
+cached in this process. Index timing uses mongomock_motor by default, or a
+real mongod with --mongo-uri (database facesense_bench_start is dropped).
+
+    python -m benchmarks.cold_start
+    python -m benchmarks.cold_start --mongo-uri mongodb://localhost:27017
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from app import db as dbmod
+from app.core.config import settings
+
+BENCH_DB = "facesense_bench_start"
+
+# Modules a worker shouldn't import until a request needs them
+HEAVY = ["numpy", "PIL", "google.auth", "smtplib", "app.google_verifier"]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+print(json.dumps({"ms": elapsed * 1000, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY,)
+
+
+def time_import(runs):
+    samples, loaded = [], []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        samples.append(result["ms"])
+        loaded = result["loaded"]
+    return statistics.median(samples), loaded
+
+
+async def time_indexes(mongo_uri):
+    if mongo_uri:
+        settings.MONGO_URI = mongo_uri
+        settings.MONGO_DB = BENCH_DB
+        await dbmod.connect_to_mongo()
+        await dbmod.client.drop_database(BENCH_DB)
+    else:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("mongomock_motor is not installed: pip install mongomock-motor, or pass --mongo-uri")
+        dbmod.client = AsyncMongoMockClient()
+        dbmod.db = dbmod.client[BENCH_DB]
+
+    timings = {}
+    for label in ("fresh database", "version matches"):
+        started = time.perf_counter()
+        await dbmod.create_indexes()
+        timings[label] = (time.perf_counter() - started) * 1000
+
+    if mongo_uri:
+        await dbmod.client.drop_database(BENCH_DB)
+        await dbmod.close_mongo_connection()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--mongo-uri")
+    args = parser.parse_args()
+
+    import_ms, loaded = time_import(args.runs)
+    index_ms = asyncio.run(time_indexes(args.mongo_uri))
+
+    print(f"\nimport app.main        {import_ms:8.1f} ms (median of {args.runs})")
+    print(f"heavy modules loaded   {', '.join(loaded) or 'none'}")
+    for label, ms in index_ms.items():
+        print(f"indexes, {label:<15}{ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Recognition latency with a large enrolled roster, CPU only.
+
+Builds a FaceIndex with --faces random embeddings (default 50k x 512) and
+times FaceIndex._search for several probe batch sizes. Exits non-zero when
+the p99 of the largest batch misses --target-ms.
+
+    python -m benchmarks.face_match --faces 50000 --target-ms 100
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.face_index import FaceIndex, normalize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faces", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=settings.FACE_EMBEDDING_DIM)
+    parser.add_argument("--batches", default="1,8,32")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--target-ms", type=float, default=100.0)
+    args = parser.parse_args()
+
+    settings.FACE_EMBEDDING_DIM = args.dim
+    rng = np.random.default_rng(42)
+    enrolled = rng.standard_normal((args.faces, args.dim), dtype=np.float32)
+
+    index = FaceIndex(args.dim)
+    started = time.perf_counter()
+    for i, vector in enumerate(normalize(enrolled)):
+        index._set(str(i), f"R{i}", f"Student {i}", vector)
+    print(f"enrolled {args.faces} x {args.dim} in {time.perf_counter() - started:.2f}s")
+
+    p99 = 0.0
+    for batch in (int(b) for b in args.batches.split(",")):
+        # Probes are noisy copies of enrolled faces so every one has a true match
+        picks = rng.integers(0, args.faces, size=batch)
+        probes = normalize(enrolled[picks] + 0.1 * rng.standard_normal((batch, args.dim), dtype=np.float32))
+
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            matches = index._search(probes, settings.FACE_MATCH_THRESHOLD)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        correct = sum(m["student_id"] == str(p) for m, p in zip(matches, picks.tolist()))
+        timings.sort()
+        p50 = timings[len(timings) // 2]
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        print(f"batch {batch:>4}: p50 {p50:7.2f} ms, p99 {p99:7.2f} ms, "
+              f"{batch / (p50 / 1000):9.0f} faces/s, top-1 correct {correct}/{batch}")
+
+    if p99 > args.target_ms:
+        print(f"FAIL: p99 {p99:.2f} ms exceeds target {args.target_ms} ms")
+        sys.exit(1)
+    print(f"OK: p99 within {args.target_ms} ms target")
+
+
+if __name__ == "__main__":
+    main()
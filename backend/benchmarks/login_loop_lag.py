@@ -0,0 +1,76 @@
+"""
+Event-loop lag during a login storm: password verification inline vs on the hashing pool.
+
+A ticker task sleeps for TICK seconds in a loop and records how late it
+wakes up. While it runs, N concurrent "logins" verify a PBKDF2 hash either
+directly on the loop (the old behaviour) or through verify_password_async.
+
+    python -m benchmarks.login_loop_lag --logins 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app import utils
+
+TICK = 0.005
+
+
+async def _ticker(lags, stop):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - started - TICK)
+
+
+async def _storm(logins, hashed, inline):
+    async def login():
+        if inline:
+            utils.verify_password("password123", hashed)
+        else:
+            await utils.verify_password_async("password123", hashed)
+        # Yield like a real handler awaiting its DB call
+        await asyncio.sleep(0)
+
+    lags = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_ticker(lags, stop))
+    await asyncio.sleep(TICK * 2)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await ticker
+    return elapsed, lags
+
+
+def _report(label, logins, elapsed, lags):
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    p99 = lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))]
+    print(
+        f"{label:<8} {logins} logins in {elapsed:.2f}s ({logins / elapsed:.1f}/s) | "
+        f"loop lag mean {statistics.mean(lags_ms):.1f} ms, p99 {p99:.1f} ms, max {lags_ms[-1]:.1f} ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=50)
+    args = parser.parse_args()
+
+    hashed = utils.get_password_hash("password123")
+    print(f"PBKDF2 iterations: {utils.settings.PASSWORD_HASH_ITERATIONS}, "
+          f"pool size: {utils.settings.PASSWORD_HASH_CONCURRENCY}")
+
+    elapsed, lags = await _storm(args.logins, hashed, inline=True)
+    _report("before", args.logins, elapsed, lags)
+
+    elapsed, lags = await _storm(args.logins, hashed, inline=False)
+    _report("after", args.logins, elapsed, lags)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
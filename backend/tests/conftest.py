@@ -0,0 +1,46 @@
+"""
+Shared fixtures. MongoDB is replaced by mongomock_motor, an in-memory
+stand-in, so the suite needs no server:
+
+    pip install -r requirements-dev.txt
+    python -m pytest
+
+Async tests use anyio's pytest plugin (@pytest.mark.anyio).
+"""
+import os
+
+os.environ.setdefault("AUTH_REQUIRED", "false")
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from app import db as dbmod
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def db():
+    """A fresh in-memory database, also installed as app.db.db."""
+    dbmod.client = AsyncMongoMockClient()
+    dbmod.db = dbmod.client["facesense_test"]
+    yield dbmod.db
+    dbmod.client = dbmod.db = None
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    """TestClient for the app, running its startup and shutdown against `db`."""
+    from fastapi.testclient import TestClient
+
+    from app import main
+
+    async def connected():
+        pass
+
+    monkeypatch.setattr(main, "connect_to_mongo", connected)
+    with TestClient(main.app) as test_client:
+        yield test_client
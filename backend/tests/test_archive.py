@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app import archive, attendance_days
+from app.core.config import settings
+
+pytestmark = pytest.mark.anyio
+
+OLD = datetime.utcnow().replace(microsecond=0) - timedelta(days=400)
+
+
+@pytest.fixture(autouse=True)
+def cold_tier(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "manifest", archive.Manifest(str(tmp_path)))
+    return archive.manifest
+
+
+def mark(student_id, timestamp):
+    return {
+        "_id": ObjectId(),
+        "student_id": student_id,
+        "student_name": "Ann",
+        "roll": "R1",
+        "timestamp": timestamp,
+        "status": "Present",
+        "confidence": 0.9,
+    }
+
+
+async def run(db, **kwargs):
+    return await archive.archive_attendance(db, **kwargs)
+
+
+async def cold(**kwargs):
+    return [record async for record in archive.cold_records(**kwargs)]
+
+
+async def test_moves_old_marks_and_keeps_recent_ones(db):
+    student = ObjectId()
+    recent = mark(student, datetime.utcnow())
+    await db["attendance"].insert_many([mark(student, OLD + timedelta(days=i)) for i in range(3)] + [recent])
+
+    result = await run(db)
+
+    assert result["days"] == 3 and result["records"] == 3 and result["done"]
+    assert [doc["_id"] async for doc in db["attendance"].find()] == [recent["_id"]]
+    assert len(await cold(student_ids=[student])) == 3
+    assert archive.manifest.stats()["segments"] == 3
+
+
+async def test_second_run_is_a_no_op(db):
+    await db["attendance"].insert_many([mark(ObjectId(), OLD) for _ in range(4)])
+    await run(db)
+    segments = list(archive.manifest.segments())
+
+    result = await run(db)
+
+    assert result["records"] == 0
+    assert archive.manifest.segments() == segments
+    assert len(await cold()) == 4
+
+
+async def test_resumed_run_does_not_duplicate_written_marks(db, monkeypatch):
+    docs = [mark(ObjectId(), OLD) for _ in range(3)]
+    await db["attendance"].insert_many(docs)
+
+    async def crash(*args):
+        raise RuntimeError("crash before delete")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(archive, "_delete_hot", crash)
+        with pytest.raises(RuntimeError):
+            await run(db)
+    assert await db["attendance"].count_documents({}) == 3
+    assert await db["locks"].count_documents({}) == 0
+
+    result = await run(db)
+
+    assert result["records"] == 0  # already in the segment
+    assert await db["attendance"].count_documents({}) == 0
+    assert sorted(record["_id"] for record in await cold()) == sorted(doc["_id"] for doc in docs)
+
+
+async def test_late_mark_for_archived_day_gets_its_own_segment(db):
+    await db["attendance"].insert_one(mark(ObjectId(), OLD))
+    await run(db)
+    await db["attendance"].insert_one(mark(ObjectId(), OLD + timedelta(hours=2)))
+
+    await run(db)
+
+    assert [s["file"].rsplit("/", 1)[1] for s in archive.manifest.segments()] == [
+        f"{OLD.date()}.1.ndjson.gz",
+        f"{OLD.date()}.2.ndjson.gz",
+    ]
+    assert len(await cold()) == 2
+
+
+async def test_bounded_runs_report_progress(db):
+    await db["attendance"].insert_many([mark(ObjectId(), OLD + timedelta(days=i)) for i in range(5)])
+
+    first = await run(db, max_days=2)
+    second = await run(db, max_days=2)
+    third = await run(db, max_days=2)
+
+    assert [r["days"] for r in (first, second, third)] == [2, 2, 1]
+    assert [r["done"] for r in (first, second, third)] == [False, False, True]
+
+
+async def test_held_lock_refuses_a_second_run(db):
+    await db["locks"].insert_one({"_id": archive.LOCK_ID, "owner": "other", "lease_until": datetime.utcnow() + timedelta(minutes=5)})
+    with pytest.raises(RuntimeError):
+        await run(db)
+
+
+async def test_history_reads_only_the_students_segments(db, monkeypatch):
+    ann, bob = ObjectId(), ObjectId()
+    await db["attendance"].insert_many(
+        [mark(ann if i % 3 == 0 else bob, OLD + timedelta(days=i)) for i in range(6)]
+    )
+    await run(db)
+    opened = []
+    read_segment = archive._read_segment
+    monkeypatch.setattr(archive, "_read_segment", lambda path, ids=None: opened.append(path) or read_segment(path, ids))
+
+    records = await cold(student_ids=[ann])
+
+    assert {record["student_id"] for record in records} == {ann}
+    assert len(opened) == 2
+
+
+class TestDailyLayout:
+    @pytest.fixture(autouse=True)
+    def daily(self, monkeypatch):
+        monkeypatch.setattr(settings, "ATTENDANCE_LAYOUT", "daily")
+
+    async def test_archives_events_and_drops_day_documents(self, db):
+        student = ObjectId()
+        for hours in (0, 2):
+            await attendance_days.push_event(db, mark(student, OLD + timedelta(hours=hours)))
+
+        result = await run(db)
+
+        assert result["records"] == 2
+        assert await db[attendance_days.DAYS].count_documents({}) == 0
+        assert len(await cold(student_ids=[student])) == 2
+
+    async def test_resumed_run_clears_day_documents_left_empty(self, db):
+        # State left by a crash between the $filter update and the delete
+        await db[attendance_days.DAYS].insert_one(
+            {"student_id": ObjectId(), "date": attendance_days.day_of(OLD), "events": [], "count": 0}
+        )
+        await attendance_days.push_event(db, mark(ObjectId(), OLD + timedelta(days=1)))
+
+        # Bounded, so a day that is never cleared fails the test instead of hanging it
+        result = await run(db, max_days=10)
+
+        assert result["done"] and result["days"] == 2 and result["records"] == 1
+        assert await db[attendance_days.DAYS].count_documents({}) == 0
@@ -0,0 +1,155 @@
+"""Daily attendance layout: $push writes, flat reads and the migration from `attendance`."""
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from app import attendance_days, stats
+from app.attendance_days import DAYS
+from app.core.config import settings
+
+pytestmark = pytest.mark.anyio
+
+T0 = datetime(2024, 5, 6, 9, 0, 0)
+
+
+@pytest.fixture
+async def days(db):
+    await db[DAYS].create_index([("student_id", 1), ("date", 1)], unique=True)
+    return db
+
+
+def mark(student_id, timestamp, status="Present"):
+    return {
+        "_id": ObjectId(),
+        "student_id": student_id,
+        "student_name": "Ann",
+        "roll": "R1",
+        "timestamp": timestamp,
+        "status": status,
+        "confidence": 0.9,
+    }
+
+
+async def test_push_event_appends_and_debounces(days):
+    student = ObjectId()
+    await attendance_days.push_event(days, mark(student, T0))
+    with pytest.raises(DuplicateKeyError):
+        await attendance_days.push_event(days, mark(student, T0 + timedelta(seconds=30)))
+    await attendance_days.push_event(days, mark(student, T0 + timedelta(minutes=5)))
+
+    day = await days[DAYS].find_one({"student_id": student})
+    assert day["date"] == datetime(2024, 5, 6)
+    assert day["count"] == 2
+    assert day["last_timestamp"] == T0 + timedelta(minutes=5)
+    assert [event["timestamp"] for event in day["events"]] == [T0, T0 + timedelta(minutes=5)]
+
+
+async def test_push_events_reports_debounced_positions(days):
+    ann, bob = ObjectId(), ObjectId()
+    docs = [
+        mark(ann, T0),
+        mark(bob, T0),
+        mark(ann, T0 + timedelta(seconds=10)),
+        mark(ann, T0 + timedelta(days=1)),
+    ]
+
+    failed = await attendance_days.push_events(days, docs)
+
+    assert failed == {2: attendance_days.DUPLICATE_KEY_ERROR}
+    assert await days[DAYS].count_documents({}) == 3
+    assert await attendance_days.count_events(days) == 3
+
+
+async def test_flat_pipeline_unwinds_to_attendance_records(days):
+    student = ObjectId()
+    first, second = mark(student, T0), mark(student, T0 + timedelta(minutes=5), status="Late")
+    await attendance_days.push_events(days, [first, second])
+
+    records = [
+        record async for record in days[DAYS].aggregate(
+            attendance_days.flat_pipeline({"student_id": student}, {"status": "Late"})
+        )
+    ]
+
+    assert records == [{
+        "_id": second["_id"],
+        "student_id": student,
+        "student_name": "Ann",
+        "roll": "R1",
+        "timestamp": second["timestamp"],
+        "status": "Late",
+        "confidence": 0.9,
+    }]
+
+
+async def test_events_by_day_walks_days_in_timestamp_order(days):
+    ann, bob = ObjectId(), ObjectId()
+    docs = [
+        mark(ann, T0 + timedelta(days=1, hours=2)),
+        mark(bob, T0 + timedelta(days=1)),
+        mark(ann, T0),
+        mark(bob, T0 + timedelta(minutes=1)),
+        mark(ann, T0 + timedelta(days=3)),
+    ]
+    await attendance_days.push_events(days, docs)
+    in_order = sorted(doc["timestamp"] for doc in docs)
+
+    forward = [record["timestamp"] async for record in attendance_days.events_by_day(days)]
+    backward = [record["timestamp"] async for record in attendance_days.events_by_day(days, descending=True)]
+    ranged = [
+        record["timestamp"]
+        async for record in attendance_days.events_by_day(
+            days, {"date": attendance_days.date_range(T0 + timedelta(days=1), datetime(2024, 5, 9))}
+        )
+    ]
+
+    assert forward == in_order
+    assert backward == in_order[::-1]
+    assert ranged == in_order[2:4]
+
+
+async def test_migrate_flat_resumes_without_duplicating_events(days, monkeypatch):
+    ann, bob = ObjectId(), ObjectId()
+    flat = [
+        mark(ann, T0),
+        mark(bob, T0),
+        mark(ann, T0 + timedelta(seconds=20)),  # inside the debounce window; still copied
+        mark(ann, T0 + timedelta(days=1)),
+        mark(bob, T0 + timedelta(days=1)),
+    ]
+    await days["attendance"].insert_many([dict(doc) for doc in flat])
+    monkeypatch.setattr("builtins.print", lambda *args, **kwargs: None)
+
+    assert await attendance_days.migrate_flat(days, batch_size=2) == (5, 3)
+    # Crash before the progress marker was saved: the whole copy runs again
+    await days["migrations"].delete_many({})
+    await attendance_days.migrate_flat(days, batch_size=2)
+    # Marks written after the first run are picked up by the next one
+    late = mark(bob, T0 + timedelta(days=2))
+    await days["attendance"].insert_one(dict(late))
+    assert await attendance_days.migrate_flat(days, batch_size=2) == (1, 1)
+
+    events = [record["_id"] async for record in days[DAYS].aggregate(attendance_days.flat_pipeline())]
+    assert sorted(events) == sorted(doc["_id"] for doc in flat + [late])
+    assert await attendance_days.count_events(days) == 6
+    day = await days[DAYS].find_one({"student_id": ann, "date": datetime(2024, 5, 6)})
+    assert day["count"] == 2
+
+
+async def test_estimated_counts_read_the_event_counter_not_the_days(days, monkeypatch):
+    monkeypatch.setattr(settings, "ATTENDANCE_LAYOUT", "daily")
+    student = ObjectId()
+    docs = [mark(student, T0), mark(student, T0 + timedelta(minutes=5)), mark(student, T0 + timedelta(days=1))]
+    await attendance_days.push_events(days, docs)
+    await stats.increment(days, "attendance_records", len(docs))
+
+    async def full_scan(db):
+        raise AssertionError("estimated counts must not aggregate every day document")
+
+    monkeypatch.setattr(attendance_days, "count_events", full_scan)
+    counts = await stats.estimated_counts(days)
+
+    assert counts["attendance_records"] == 3
+    assert counts["attendance_days"] == 2
@@ -0,0 +1,22 @@
+import pytest
+
+from app import db as dbmod
+from app.monitoring import SlowQueryListener
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_slow_query_log_watches_both_clients(monkeypatch):
+    listener = SlowQueryListener(threshold_ms=100, explain=False)
+    monkeypatch.setattr(dbmod, "slow_query_listener", listener)
+    # Restored after the test; connect_to_mongo replaces them
+    for name in ("client", "db", "analytics_client", "analytics_db"):
+        monkeypatch.setattr(dbmod, name, getattr(dbmod, name))
+
+    await dbmod.connect_to_mongo()
+    try:
+        assert listener in dbmod.client.options.event_listeners
+        assert listener in dbmod.analytics_client.options.event_listeners
+    finally:
+        dbmod.client.close()
+        dbmod.analytics_client.close()
@@ -0,0 +1,140 @@
+"""Debounce engines, alone and through the batch write path."""
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app import attendance, debounce, schemas
+from app.debounce import BucketDebouncer, MemoryDebouncer
+from app.students import student_cache
+
+T0 = datetime(2024, 5, 6, 9, 0, 0)
+
+
+def mark(student_id, timestamp):
+    return {"student_id": student_id, "student_name": "Ann", "roll": "R1", "timestamp": timestamp, "status": "Present"}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(debounce.time, "monotonic", clock)
+    return clock
+
+
+class TestMemoryDebouncer:
+    def test_repeat_inside_window_returns_first_record(self, clock):
+        engine = MemoryDebouncer(60)
+        student = ObjectId()
+        first = {**mark(student, T0), "_id": ObjectId()}
+
+        assert engine.prepare(first) is None
+        engine.accepted(first)
+        duplicate = engine.prepare(mark(student, T0 + timedelta(seconds=30)))
+
+        assert duplicate["id"] == str(first["_id"])
+        assert engine.prepare(mark(student, T0 + timedelta(seconds=61))) is None
+
+    def test_other_students_are_independent(self, clock):
+        engine = MemoryDebouncer(60)
+        assert engine.prepare(mark(ObjectId(), T0)) is None
+        assert engine.prepare(mark(ObjectId(), T0)) is None
+        assert engine.stats()["tracked"] == 2
+
+    def test_entries_are_evicted_after_the_window(self, clock):
+        engine = MemoryDebouncer(60)
+        old, recent = ObjectId(), ObjectId()
+        engine.prepare(mark(old, T0))
+        clock.now += 40
+        engine.prepare(mark(recent, T0))
+        clock.now += 30
+
+        engine.prepare(mark(ObjectId(), T0))
+
+        assert old not in engine._entries
+        assert recent in engine._entries
+
+    def test_release_frees_the_slot(self, clock):
+        engine = MemoryDebouncer(60)
+        student = ObjectId()
+        failed = mark(student, T0)
+        engine.prepare(failed)
+
+        engine.release(failed)
+
+        assert engine.prepare(mark(student, T0 + timedelta(seconds=1))) is None
+
+    def test_release_keeps_a_newer_reservation(self, clock):
+        engine = MemoryDebouncer(60)
+        student = ObjectId()
+        stale, fresh = mark(student, T0), mark(student, T0 + timedelta(seconds=90))
+        engine.prepare(stale)
+        engine.prepare(fresh)
+
+        # The stale insert failing must not free the slot the fresh mark holds
+        engine.release(stale)
+
+        assert engine.prepare(mark(student, T0 + timedelta(seconds=100))) is not None
+
+
+class TestBucketDebouncer:
+    def test_key_is_stable_within_a_bucket(self):
+        engine = BucketDebouncer(60)
+        student = ObjectId()
+        assert engine.bucket_key(student, T0) == engine.bucket_key(student, T0 + timedelta(seconds=59))
+        assert engine.bucket_key(student, T0) != engine.bucket_key(student, T0 + timedelta(seconds=60))
+        assert engine.bucket_key(student, T0) != engine.bucket_key(ObjectId(), T0)
+
+    def test_prepare_tags_the_document(self):
+        doc = mark(ObjectId(), T0)
+        assert BucketDebouncer(60).prepare(doc) is None
+        assert doc["dedup_key"].endswith(f":{int((T0 - debounce.EPOCH).total_seconds() // 60)}")
+
+
+@pytest.fixture
+async def student(db):
+    student_cache.clear()
+    result = await db["students"].insert_one({"name": "Ann", "roll": "R1", "class_name": "7A"})
+    yield result.inserted_id
+    student_cache.clear()
+
+
+@pytest.mark.anyio
+async def test_unique_dedup_key_rejects_duplicates_across_batches(db, student, monkeypatch):
+    monkeypatch.setattr(attendance, "debouncer", BucketDebouncer(60))
+    await db["attendance"].create_index(
+        "dedup_key", unique=True, partialFilterExpression={"dedup_key": {"$exists": True}}
+    )
+
+    first = await attendance.mark_events(db, [schemas.AttendanceIn(roll="R1", timestamp=T0)])
+    # Another worker would have no memory of the first mark; the index still rejects it
+    second = await attendance.mark_events(db, [
+        schemas.AttendanceIn(roll="R1", timestamp=T0 + timedelta(seconds=20)),
+        schemas.AttendanceIn(roll="R1", timestamp=T0 + timedelta(seconds=60)),
+    ])
+
+    assert first["inserted"] == 1
+    assert [result["result"] for result in second["results"]] == ["debounced", "inserted"]
+    assert await db["attendance"].count_documents({"student_id": student}) == 2
+
+
+@pytest.mark.anyio
+async def test_memory_engine_debounces_within_one_batch(db, student, monkeypatch, clock):
+    monkeypatch.setattr(attendance, "debouncer", MemoryDebouncer(60))
+
+    summary = await attendance.mark_events(db, [
+        schemas.AttendanceIn(roll="R1", timestamp=T0),
+        schemas.AttendanceIn(roll="R1", timestamp=T0 + timedelta(seconds=10)),
+        schemas.AttendanceIn(roll="R404", timestamp=T0),
+    ])
+
+    assert (summary["inserted"], summary["debounced"], summary["unknown_roll"]) == (1, 1, 1)
+    assert await db["attendance"].count_documents({}) == 1
@@ -0,0 +1,142 @@
+"""Notification dispatcher delivering through a local aiosmtpd server."""
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from app import dispatcher as dispatchmod
+from app.core.config import settings
+from app.dispatcher import DEAD_LETTERS, QUEUE, Dispatcher, enqueue
+
+pytestmark = pytest.mark.anyio
+
+BOUNCE = "bounce@school.org"
+
+
+class Inbox:
+    """aiosmtpd handler keeping delivered mail and refusing BOUNCE."""
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address == BOUNCE:
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return "250 Message accepted for delivery"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def inbox(monkeypatch):
+    handler = Inbox()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    monkeypatch.setattr(settings, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(settings, "SMTP_PORT", controller.port)
+    monkeypatch.setattr(settings, "SMTP_STARTTLS", False)
+    monkeypatch.setattr(settings, "SMTP_USERNAME", "")
+    yield handler
+    controller.stop()
+
+
+def message(to="parent@school.org", subject="Absence alert"):
+    return {"to": to, "subject": subject, "body": "Not marked present today.", "provider": "smtp"}
+
+
+async def test_queued_messages_are_sent(db, inbox):
+    await enqueue(db, [message(subject="One"), message(to="other@school.org", subject="Two")])
+    worker = Dispatcher()
+
+    assert await worker._deliver(db, "smtp") == 2
+    assert sorted(envelope.rcpt_tos[0] for envelope in inbox.messages) == ["other@school.org", "parent@school.org"]
+    assert b"Subject: One" in inbox.messages[0].content
+    assert await db[QUEUE].count_documents({"status": "sent", "claim": {"$exists": False}}) == 2
+    assert worker.sent == 2
+    # Nothing is left to claim
+    assert await worker._deliver(db, "smtp") == 0
+
+
+async def test_refused_message_is_retried_with_backoff(db, inbox):
+    await enqueue(db, [message(), message(to=BOUNCE)])
+    worker = Dispatcher()
+    before = datetime.utcnow()
+
+    await worker._deliver(db, "smtp")
+
+    assert len(inbox.messages) == 1
+    retry = await db[QUEUE].find_one({"to": BOUNCE})
+    assert retry["status"] == "pending"
+    assert retry["attempts"] == 1
+    assert "No such user" in retry["last_error"]
+    assert retry["next_attempt_at"] >= before + timedelta(seconds=settings.NOTIFY_RETRY_BASE_SECONDS * 0.8)
+    assert "claim" not in retry
+    assert worker.retried == 1
+    # Not due yet
+    assert await worker._deliver(db, "smtp") == 0
+
+
+async def test_unreachable_server_retries_the_whole_batch(db, monkeypatch):
+    monkeypatch.setattr(settings, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(settings, "SMTP_PORT", free_port())
+    await enqueue(db, [message(), message(to="other@school.org")])
+
+    await Dispatcher()._deliver(db, "smtp")
+
+    assert await db[QUEUE].count_documents({"status": "pending", "attempts": 1}) == 2
+
+
+async def test_message_is_dead_lettered_after_max_attempts(db, inbox, monkeypatch):
+    monkeypatch.setattr(settings, "NOTIFY_MAX_ATTEMPTS", 2)
+    await enqueue(db, [message(to=BOUNCE)])
+    worker = Dispatcher()
+
+    await worker._deliver(db, "smtp")
+    await db[QUEUE].update_many({}, {"$set": {"next_attempt_at": datetime.utcnow() - timedelta(seconds=1)}})
+    await worker._deliver(db, "smtp")
+
+    assert await db[QUEUE].count_documents({}) == 0
+    dead = await db[DEAD_LETTERS].find_one({"to": BOUNCE})
+    assert dead["status"] == "dead"
+    assert dead["attempts"] == 2
+    assert "lease_until" not in dead
+    assert worker.dead == 1
+
+
+async def test_expired_lease_is_reclaimed(db, inbox):
+    now = datetime.utcnow()
+    stuck = {"provider": "smtp", "status": "sending", "attempts": 0, "next_attempt_at": now, "created_at": now}
+    # A worker crashed mid-send on the first; the second is still leased to a live worker
+    await db[QUEUE].insert_many([
+        {**message(to="crashed@school.org"), **stuck, "claim": "gone", "lease_until": now - timedelta(seconds=1)},
+        {**message(to="busy@school.org"), **stuck, "claim": "alive", "lease_until": now + timedelta(minutes=5)},
+    ])
+
+    assert await Dispatcher()._deliver(db, "smtp") == 1
+
+    assert [envelope.rcpt_tos for envelope in inbox.messages] == [["crashed@school.org"]]
+    assert (await db[QUEUE].find_one({"to": "crashed@school.org"}))["status"] == "sent"
+    assert (await db[QUEUE].find_one({"to": "busy@school.org"}))["claim"] == "alive"
+
+
+async def test_duplicate_dedup_keys_are_queued_once(db, monkeypatch):
+    await db[QUEUE].create_index("dedup_key", unique=True, partialFilterExpression={"dedup_key": {"$exists": True}})
+    woken = []
+    monkeypatch.setattr(dispatchmod.dispatcher, "wake", lambda: woken.append(True))
+
+    first = await enqueue(db, [{**message(), "dedup_key": "absent:2024-05-06:s1"}])
+    again = await enqueue(db, [{**message(), "dedup_key": "absent:2024-05-06:s1"}, message(to="new@school.org")])
+
+    assert (first, again) == (1, 1)
+    assert await db[QUEUE].count_documents({}) == 2
+    assert len(woken) == 2
@@ -0,0 +1,52 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.face_index import FaceIndex, SNAPSHOT_PREFIX
+
+DIM = 4
+
+
+def index_of(*students, generation=1):
+    index = FaceIndex(DIM)
+    for student_id, roll, vector in students:
+        index._set(student_id, roll, roll.lower(), np.asarray(vector, dtype=np.float32))
+    index.generation = generation
+    return index
+
+
+def test_snapshot_round_trip_is_memory_mapped(tmp_path):
+    index_of(("a", "R1", [1, 0, 0, 0]), ("b", "R2", [0, 1, 0, 0]), generation=7).save_snapshot(str(tmp_path))
+
+    loaded = FaceIndex(DIM)
+    assert loaded.load_snapshot(str(tmp_path))
+    assert loaded.generation == 7
+    assert loaded._ids == ["a", "b"]
+    assert isinstance(loaded._matrix, np.memmap)
+    assert loaded._search(np.asarray([[0, 1, 0, 0]], np.float32), 0.5)[0]["student_id"] == "b"
+
+
+def test_later_save_wins_with_its_own_ids(tmp_path):
+    index_of(("a", "R1", [1, 0, 0, 0]), generation=1).save_snapshot(str(tmp_path))
+    index_of(("x", "R9", [0, 0, 1, 0]), ("y", "R8", [0, 0, 0, 1]), generation=2).save_snapshot(str(tmp_path))
+
+    loaded = FaceIndex(DIM)
+    assert loaded.load_snapshot(str(tmp_path))
+    assert (loaded.generation, loaded._ids, loaded._count) == (2, ["x", "y"], 2)
+
+
+def test_each_save_writes_its_own_directory(tmp_path):
+    index_of(("a", "R1", [1, 0, 0, 0])).save_snapshot(str(tmp_path))
+    index_of(("b", "R2", [0, 1, 0, 0])).save_snapshot(str(tmp_path))
+
+    snapshots = [entry for entry in os.listdir(tmp_path) if entry.startswith(SNAPSHOT_PREFIX)]
+    assert len(snapshots) == 2
+    assert not [entry for entry in os.listdir(tmp_path) if entry.endswith(".tmp")]
+
+
+@pytest.mark.parametrize("damage", ["no_pointer", "dangling_pointer"])
+def test_missing_snapshot_is_rejected(tmp_path, damage):
+    if damage == "dangling_pointer":
+        (tmp_path / "CURRENT").write_text(SNAPSHOT_PREFIX + "gone")
+    assert not FaceIndex(DIM).load_snapshot(str(tmp_path))
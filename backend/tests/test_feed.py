@@ -0,0 +1,49 @@
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.feed import AttendanceFeed
+
+
+def day_doc(*events):
+    return {"_id": ObjectId(), "student_id": ObjectId(), "student_name": "Ann", "roll": "R1", "events": list(events)}
+
+
+def event():
+    return {"_id": ObjectId(), "timestamp": datetime(2024, 5, 6, 9), "status": "Present", "confidence": 0.9}
+
+
+def update(day, updated_fields):
+    return {"operationType": "update", "fullDocument": day, "updateDescription": {"updatedFields": updated_fields}}
+
+
+def test_insert_publishes_every_event():
+    first, second = event(), event()
+    records = AttendanceFeed._pushed_events({"operationType": "insert", "fullDocument": day_doc(first, second)})
+    assert [record["_id"] for record in records] == [first["_id"], second["_id"]]
+
+
+def test_push_publishes_only_the_appended_event():
+    old, new = event(), event()
+    records = AttendanceFeed._pushed_events(
+        update(day_doc(old, new), {"events.1": new, "count": 2, "last_timestamp": new["timestamp"]})
+    )
+    assert [record["_id"] for record in records] == [new["_id"]]
+    assert records[0]["roll"] == "R1"
+
+
+def test_array_rewrite_is_not_a_new_mark():
+    kept = event()
+    assert AttendanceFeed._pushed_events(update(day_doc(kept), {"events": [kept], "count": 1})) == []
+
+
+def test_emptied_array_is_ignored():
+    assert AttendanceFeed._pushed_events(update(day_doc(), {"events": [], "count": 0})) == []
+
+
+def test_field_update_inside_an_event_is_ignored():
+    assert AttendanceFeed._pushed_events(update(day_doc(event()), {"events.0.status": "Late"})) == []
+
+
+def test_deleted_document_publishes_nothing():
+    assert AttendanceFeed._pushed_events({"operationType": "update", "fullDocument": None}) == []
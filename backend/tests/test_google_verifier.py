@@ -0,0 +1,163 @@
+"""GoogleTokenVerifier against a local stub key server standing in for Google's certs URL."""
+import datetime
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt, jwt
+
+from app.google_verifier import GoogleTokenVerifier
+
+pytestmark = pytest.mark.anyio
+
+AUDIENCE = "test-client-id"
+
+
+class KeyPair:
+    def __init__(self, kid: str):
+        self.kid = kid
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, kid)])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(minutes=5))
+            .not_valid_after(now + datetime.timedelta(days=1))
+            .sign(key, hashes.SHA256())
+        )
+        self.cert = cert.public_bytes(serialization.Encoding.PEM).decode()
+        private = key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ).decode()
+        self.signer = crypt.RSASigner.from_string(private, key_id=kid)
+
+    def token(self, **claims):
+        now = int(time.time())
+        payload = {"iss": "https://accounts.google.com", "aud": AUDIENCE, "email": "t@school.org", "iat": now, "exp": now + 300}
+        payload.update(claims)
+        return jwt.encode(self.signer, payload).decode()
+
+
+@pytest.fixture
+def key_server():
+    """Serves `server.keys` as Google-style certs JSON with `server.max_age`; counts hits."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            server.hits += 1
+            body = json.dumps({key.kid: key.cert for key in server.keys}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Cache-Control", f"public, max-age={server.max_age}")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    server.keys, server.max_age, server.hits = [], 3600, 0
+    server.url = f"http://127.0.0.1:{server.server_port}/certs"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+async def make_verifier(key_server):
+    verifiers = []
+
+    def make(**kwargs):
+        verifier = GoogleTokenVerifier(audience=AUDIENCE, certs_url=key_server.url, **kwargs)
+        verifiers.append(verifier)
+        return verifier
+
+    yield make
+    for verifier in verifiers:
+        await verifier.close()
+
+
+async def test_certs_are_cached_for_max_age(key_server, make_verifier):
+    first = KeyPair("k1")
+    key_server.keys = [first]
+    verifier = make_verifier()
+
+    assert (await verifier.verify(first.token()))["email"] == "t@school.org"
+    await verifier.verify(first.token())
+    assert key_server.hits == 1
+    assert 3500 < verifier.stats()["expires_in"] <= 3600
+
+
+async def test_expired_certs_pick_up_rotated_keys(key_server, make_verifier):
+    first, second = KeyPair("k1"), KeyPair("k2")
+    key_server.keys, key_server.max_age = [first], 0
+    verifier = make_verifier(kid_refetch_interval=3600)
+    await verifier.verify(first.token())
+
+    # Google drops k1 and publishes k2; the cache has expired, so the next call refetches
+    key_server.keys = [second]
+    await verifier.verify(second.token())
+    assert key_server.hits == 2
+    with pytest.raises(ValueError):
+        await verifier.verify(first.token())
+
+
+async def test_unknown_kid_refetches_before_max_age(key_server, make_verifier):
+    first, second = KeyPair("k1"), KeyPair("k2")
+    key_server.keys = [first]
+    verifier = make_verifier(kid_refetch_interval=0)
+    await verifier.verify(first.token())
+
+    key_server.keys = [first, second]
+    assert (await verifier.verify(second.token()))["aud"] == AUDIENCE
+    assert key_server.hits == 2
+    # Both keys are cached now
+    await verifier.verify(first.token())
+    await verifier.verify(second.token())
+    assert key_server.hits == 2
+
+
+async def test_unknown_kid_refetch_is_rate_limited(key_server, make_verifier):
+    first, stranger = KeyPair("k1"), KeyPair("forged")
+    key_server.keys = [first]
+    verifier = make_verifier(kid_refetch_interval=30)
+    await verifier.verify(first.token())
+
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            await verifier.verify(stranger.token())
+    assert key_server.hits == 1
+
+
+async def test_wrong_audience_and_issuer_are_rejected(key_server, make_verifier):
+    first = KeyPair("k1")
+    key_server.keys = [first]
+    verifier = make_verifier()
+
+    with pytest.raises(ValueError):
+        await verifier.verify(first.token(aud="someone-else"))
+    with pytest.raises(ValueError):
+        await verifier.verify(first.token(iss="https://evil.example"))
+
+
+def test_app_startup_does_not_import_the_verifier():
+    probe = "import sys, app.main; print(sorted(m for m in ('app.google_verifier', 'google.auth') if m in sys.modules))"
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", probe], cwd=backend, capture_output=True, text=True, check=True)
+
+    assert out.stdout.strip().splitlines()[-1] == "[]"
@@ -0,0 +1,43 @@
+import pytest
+
+from app import pagination
+
+
+@pytest.fixture
+def students(client, db, monkeypatch):
+    monkeypatch.setattr(pagination, "MAX_PAGE_SIZE", 3)
+    for n in range(5):
+        client.post("/api/students/", json={"name": f"Student {n}", "roll": f"R{n}", "class_name": "A"})
+    return client
+
+
+@pytest.mark.parametrize("limit", [0, 3, 50])
+def test_legacy_limit_is_clamped_not_rejected(students, limit):
+    response = students.get("/api/students/", params={"limit": limit})
+
+    assert response.status_code == 200
+    assert len(response.json()) == 3
+
+
+def test_legacy_list_keeps_smaller_limits(students):
+    assert len(students.get("/api/students/", params={"skip": 1, "limit": 2}).json()) == 2
+    assert len(students.get("/api/attendance/", params={"limit": 5000}).json()) == 0
+
+
+@pytest.mark.parametrize("path", ["/api/students/", "/api/attendance/"])
+@pytest.mark.parametrize("limit", [0, 4])
+def test_cursor_path_rejects_out_of_range_limit(students, path, limit):
+    response = students.get(path, params={"after": "", "limit": limit})
+
+    assert response.status_code == 400
+    assert "limit must be between 1 and 3" in response.json()["detail"]
+
+
+def test_cursor_pages_through_everything(students):
+    rolls, after = [], ""
+    while after is not None:
+        page = students.get("/api/students/", params={"after": after, "limit": 2}).json()
+        rolls += [item["roll"] for item in page["items"]]
+        after = page["next_cursor"]
+
+    assert rolls == [f"R{n}" for n in range(5)]
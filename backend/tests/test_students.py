@@ -0,0 +1,134 @@
+import base64
+import csv
+import io
+
+import pytest
+from PIL import Image
+
+from app.core.config import settings
+from app.students import csv_records
+
+
+@pytest.fixture
+def photo_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PHOTO_STORE", "local")
+    monkeypatch.setattr(settings, "PHOTO_STORE_PATH", str(tmp_path))
+    return tmp_path
+
+
+def photo() -> str:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), "red").save(buffer, "JPEG")
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def stored_blobs(root):
+    return sorted(path for path in root.rglob("*") if path.is_file())
+
+
+def student(roll, **fields):
+    return {"name": f"Student {roll}", "roll": roll, "class_name": "A", **fields}
+
+
+def test_duplicate_roll_on_create_is_409_and_keeps_no_photo(client, photo_store):
+    assert client.post("/api/students/", json=student("R1")).status_code == 200
+
+    response = client.post("/api/students/", json=student("R1", photo=photo()))
+
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Roll number already exists"
+    assert stored_blobs(photo_store) == []
+
+
+def test_duplicate_roll_on_update_is_409_and_keeps_no_photo(client, photo_store):
+    client.post("/api/students/", json=student("R1"))
+    other = client.post("/api/students/", json=student("R2")).json()
+
+    response = client.put(f"/api/students/{other['id']}", json=student("R1", photo=photo()))
+
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Roll number already exists"
+    assert stored_blobs(photo_store) == []
+    assert client.get(f"/api/students/{other['id']}").json()["roll"] == "R2"
+
+
+IMPORT_CSV = (
+    "\ufeffname,roll,class_name,parent_email,notes\n"
+    'Zoë Brandt,R10,7A,zoe@home.org,"likes\nfootball, and ""chess"""\n'
+    ",R11,7A,,missing name\n"
+    'Ann Lee,R12,7B,,"two\n\nparagraphs"\n'
+    "Ann Again,R12,7C,,duplicate roll\n"
+)
+
+
+async def chunked(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def parsed(data: bytes, size: int):
+    return [record async for record in csv_records(chunked(data, size))]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 16, 1 << 16])
+async def test_csv_records_match_whole_file_parse_at_any_chunk_size(size):
+    data = IMPORT_CSV.encode("utf-8")
+    expected = list(csv.reader(io.StringIO(IMPORT_CSV.lstrip("\ufeff"))))
+
+    # Chunks of 1-3 bytes also split the BOM and the two-byte "ë"
+    assert await parsed(data, size) == expected
+    assert expected[1][4] == 'likes\nfootball, and "chess"'
+
+
+@pytest.mark.anyio
+async def test_csv_records_without_trailing_newline():
+    assert await parsed(b"name,roll\nAnn,R1", 4) == [["name", "roll"], ["Ann", "R1"]]
+
+
+def test_import_reports_per_row_errors_and_keeps_good_rows(client):
+    client.post("/api/students/", json=student("R12", class_name="6A"))
+
+    response = client.post(
+        "/api/students/import", content=IMPORT_CSV.encode("utf-8"), headers={"Content-Type": "text/csv"}
+    )
+
+    report = response.json()
+    assert response.status_code == 200
+    assert (report["rows"], report["inserted"], report["updated"], report["failed"]) == (4, 1, 1, 2)
+    assert [(error["row"], error["roll"]) for error in report["errors"]] == [(3, "R11"), (5, "R12")]
+    assert "Duplicate roll" in report["errors"][1]["error"]
+    students = {item["roll"]: item for item in client.get("/api/students/").json()}
+    assert students["R10"]["name"] == "Zoë Brandt"
+    assert students["R12"]["class_name"] == "7B"
+
+
+def test_import_rejects_missing_required_columns(client):
+    response = client.post("/api/students/import", content=b"name,class_name\nAnn,7A\n")
+
+    assert response.status_code == 400
+    assert "roll" in response.json()["detail"]
+
+
+@pytest.mark.parametrize(
+    "image_format, content_type",
+    [("webp", "image/webp"), ("JPEG", "image/jpeg"), ("jpg", "image/jpeg"), ("Png", "image/png")],
+)
+def test_thumbnail_format_is_case_insensitive(client, photo_store, monkeypatch, image_format, content_type):
+    monkeypatch.setattr(settings, "THUMBNAIL_FORMAT", image_format)
+    created = client.post("/api/students/", json=student("R1", photo=photo())).json()
+
+    response = client.get(f"/api/students/{created['id']}/photo/thumbnail")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == content_type
+    assert Image.open(io.BytesIO(response.content)).size == (settings.THUMBNAIL_SIZE, settings.THUMBNAIL_SIZE)
+
+
+def test_unsupported_thumbnail_format_stores_nothing(client, photo_store, monkeypatch):
+    monkeypatch.setattr(settings, "THUMBNAIL_FORMAT", "HEIC")
+
+    response = client.post("/api/students/", json=student("R1", photo=photo()))
+
+    assert response.status_code == 500
+    assert stored_blobs(photo_store) == []
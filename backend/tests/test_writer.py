@@ -0,0 +1,75 @@
+import asyncio
+import random
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from app.writer import BufferedWriter
+
+pytestmark = pytest.mark.anyio
+
+
+class SlowCollection:
+    """insert_many that yields to the loop for a random moment, like a real round trip."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.docs = []
+
+    async def insert_many(self, docs, ordered=False):
+        await asyncio.sleep(self.rng.random() / 1000)
+        self.docs += docs
+
+    async def insert_one(self, doc):
+        self.docs.append(doc)
+
+
+@pytest.fixture(autouse=True)
+def quiet(monkeypatch):
+    monkeypatch.setattr("builtins.print", lambda *args, **kwargs: None)
+
+
+async def test_group_commit_resolves_each_caller(db):
+    writer = BufferedWriter("attendance", max_docs=10, flush_ms=5, max_queue=100)
+    docs = [{"_id": ObjectId(), "roll": f"R{n}"} for n in range(25)]
+
+    ids = await asyncio.gather(*(writer.insert(db, doc) for doc in docs))
+    await writer.close()
+
+    assert ids == [doc["_id"] for doc in docs]
+    assert await db["attendance"].count_documents({}) == 25
+    assert writer.flushes < 25
+
+
+async def test_duplicate_in_a_batch_fails_only_its_caller(db):
+    await db["attendance"].create_index("dedup_key", unique=True)
+    writer = BufferedWriter("attendance", max_docs=10, flush_ms=5, max_queue=100)
+
+    results = await asyncio.gather(
+        writer.insert(db, {"_id": ObjectId(), "dedup_key": "a"}),
+        writer.insert(db, {"_id": ObjectId(), "dedup_key": "a"}),
+        writer.insert(db, {"_id": ObjectId(), "dedup_key": "b"}),
+        return_exceptions=True,
+    )
+    await writer.close()
+
+    assert [type(result) for result in results] == [ObjectId, DuplicateKeyError, ObjectId]
+
+
+@pytest.mark.parametrize("seed", range(40))
+async def test_close_answers_inserts_blocked_on_a_full_queue(seed):
+    rng = random.Random(seed)
+    collection = SlowCollection(rng)
+    db = {"attendance": collection}
+    writer = BufferedWriter("attendance", max_docs=3, flush_ms=1, max_queue=2)
+
+    inserts = [asyncio.create_task(writer.insert(db, {"_id": ObjectId()})) for _ in range(30)]
+    await asyncio.sleep(rng.random() / 500)
+    await writer.close()
+    _, pending = await asyncio.wait(inserts, timeout=1)
+
+    for task in pending:
+        task.cancel()
+    assert not pending
+    assert len(collection.docs) == 30
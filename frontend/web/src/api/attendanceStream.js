@@ -0,0 +1,35 @@
+// Live attendance feed (Server-Sent Events) - replaces polling /api/attendance/today
+const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000';
+
+// Calls onRecord(record) for every newly accepted attendance record.
+// Returns a function that closes the stream.
+export function subscribeAttendance(onRecord) {
+  let source = null;
+  let lastEventId = null;
+  let closed = false;
+
+  const open = () => {
+    const params = new URLSearchParams();
+    const token = localStorage.getItem('token');
+    if (token) params.set('token', token);
+    // EventSource resends Last-Event-ID on its own reconnects; after an
+    // eviction we open a fresh stream, so pass the id explicitly
+    if (lastEventId) params.set('last_event_id', lastEventId);
+
+    source = new EventSource(`${API_BASE_URL}/api/attendance/stream?${params}`);
+    source.addEventListener('attendance', (event) => {
+      lastEventId = event.lastEventId;
+      onRecord(JSON.parse(event.data));
+    });
+    source.addEventListener('evicted', () => {
+      source.close();
+      if (!closed) setTimeout(open, 1000);
+    });
+  };
+
+  open();
+  return () => {
+    closed = true;
+    source?.close();
+  };
+}
@@ -1,6 +1,6 @@
 import { useState } from 'react'
 import { useNavigate } from 'react-router-dom'
-import { ArrowLeft, UserPlus, AlertCircle, CheckCircle } from 'lucide-react'
+import { ArrowLeft, UserPlus, AlertCircle, CheckCircle, Upload } from 'lucide-react'
 import axiosInstance from '../api/axios'
 
 export default function AddStudent() {
@@ -14,6 +14,9 @@ export default function AddStudent() {
   const [success, setSuccess] = useState(false)
   const [loading, setLoading] = useState(false)
 
+  const [importing, setImporting] = useState(false)
+  const [importReport, setImportReport] = useState(null)
+
   const navigate = useNavigate()
 
   const handleChange = (e) => {
@@ -61,6 +64,28 @@ export default function AddStudent() {
     }
   }
 
+  // The file is sent as the raw request body; the backend parses it as it streams in
+  const handleImport = async (e) => {
+    const file = e.target.files?.[0]
+    e.target.value = ''
+    if (!file) return
+
+    try {
+      setImporting(true)
+      setError('')
+      setImportReport(null)
+      const response = await axiosInstance.post('/api/students/import', file, {
+        headers: { 'Content-Type': 'text/csv' },
+        timeout: 120000,
+      })
+      setImportReport(response.data)
+    } catch (err) {
+      setError(err.response?.data?.detail || 'Failed to import students.')
+    } finally {
+      setImporting(false)
+    }
+  }
+
   return (
     <div className="bg-[#08091C] min-h-screen text-white p-6">
       <div className="max-w-2xl mx-auto space-y-8">
@@ -204,6 +229,45 @@ export default function AddStudent() {
           </div>
 
         </form>
+
+        {/* CSV Import */}
+        <div className="bg-slate-800/40 backdrop-blur-md border border-slate-700/60 rounded-2xl p-8 space-y-4 shadow-xl shadow-black/30">
+          <div>
+            <h2 className="text-xl font-semibold">Import from CSV</h2>
+            <p className="text-slate-400 text-sm">
+              Header row with <code>name,roll,class_name</code> and optionally <code>parent_email</code>.
+              Existing roll numbers are updated.
+            </p>
+          </div>
+
+          <label className="
+            flex items-center justify-center gap-2 w-full cursor-pointer
+            bg-slate-700/60 hover:bg-slate-600 border border-slate-600/60
+            text-white font-semibold py-3 rounded-lg transition-all
+          ">
+            <Upload className="w-5 h-5" />
+            {importing ? 'Importing...' : 'Choose CSV file'}
+            <input type="file" accept=".csv,text/csv" onChange={handleImport} disabled={importing} className="hidden" />
+          </label>
+
+          {importReport && (
+            <div className="text-sm space-y-2">
+              <p className="text-green-300">
+                {importReport.inserted} added, {importReport.updated} updated, {importReport.failed} failed
+                ({importReport.rows} rows)
+              </p>
+              {importReport.errors.length > 0 && (
+                <ul className="max-h-48 overflow-y-auto text-red-300 space-y-1">
+                  {importReport.errors.map((rowError) => (
+                    <li key={rowError.row}>
+                      Row {rowError.row}{rowError.roll ? ` (${rowError.roll})` : ''}: {rowError.error}
+                    </li>
+                  ))}
+                </ul>
+              )}
+            </div>
+          )}
+        </div>
       </div>
     </div>
   )
@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useMemo } from 'react'
 import { Clock, Filter, CheckCircle } from 'lucide-react'
 import axiosInstance from '../api/axios'
+import { subscribeAttendance } from '../api/attendanceStream'
 import DataTable from '../components/DataTable'
 import FilterBar from '../components/FilterBar'
 import StatCard from '../components/StatCard'
@@ -26,6 +27,10 @@ export default function Attendance() {
 
   useEffect(() => {
     fetchAttendance()
+    // New arrivals are pushed; no need to re-fetch the whole day
+    return subscribeAttendance((record) => {
+      setAttendance(prev => prev.some(a => a.id === record.id) ? prev : [record, ...prev])
+    })
   }, [])
 
   const fetchAttendance = async () => {
@@ -8,6 +8,7 @@ import {
   Calendar
 } from "lucide-react";
 import axiosInstance from "../api/axios";
+import { subscribeAttendance } from "../api/attendanceStream";
 import StatCard from "../components/StatCard";
 import DataTable from "../components/DataTable";
 import FilterBar from "../components/FilterBar";
@@ -21,6 +22,10 @@ export default function Dashboard() {
 
   useEffect(() => {
     fetchData();
+    // New arrivals are pushed; no need to re-fetch the whole day
+    return subscribeAttendance((record) => {
+      setAttendance((prev) => (prev.some((a) => a.id === record.id) ? prev : [record, ...prev]));
+    });
   }, []);
 
   const fetchData = async () => {
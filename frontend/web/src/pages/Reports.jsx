@@ -1,14 +1,30 @@
 import { Download } from 'lucide-react'
+import axiosInstance from '../api/axios'
 
 export default function Reports() {
-  const handleExport = (format) => {
-    alert(`${format.toUpperCase()} Export\n\nThis will call: /api/attendance/export/${format}`)
+  const handleExport = async (format) => {
+    try {
+      const response = await axiosInstance.get(`/api/attendance/export/${format}`, {
+        responseType: 'blob',
+        timeout: 0,
+      })
+      const url = window.URL.createObjectURL(response.data)
+      const link = document.createElement('a')
+      link.href = url
+      link.download = `attendance.${format}`
+      document.body.appendChild(link)
+      link.click()
+      link.remove()
+      window.URL.revokeObjectURL(url)
+    } catch (err) {
+      console.error('Error exporting attendance:', err)
+      alert(`${format.toUpperCase()} export failed`)
+    }
   }
 
   const exportOptions = [
     { format: 'csv', label: 'CSV Export' },
-    { format: 'excel', label: 'Excel Export' },
-    { format: 'pdf', label: 'PDF Export' },
+    { format: 'ndjson', label: 'NDJSON Export' },
   ]
 
   return (